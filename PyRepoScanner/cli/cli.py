@@ -1,14 +1,9 @@
 # PyRepoScanner的命令行参数及解析
-import os
-import time
-
+# 各子命令依赖的模块在子命令内部导入，避免scan等命令加载monitor所需的minio、pymongo、requests等依赖
 import click
 import json
 import logging
-from PyRepoScanner.utils.minio_utils import *
 import PyRepoScanner.utils.log_utils as prs_log
-from PyRepoScanner.scanner.pypi.scanner import PypiScanner
-from PyRepoScanner.monitor.pypi.monitor import PypiMonitor
 
 
 # 后续将所有default配置写入config.json
@@ -30,6 +25,17 @@ def cli(ctx, log_level, log_stream, log_file):
     ctx.obj["log_file"] = log_file
 
 
+def _scan_budget(file_timeout, file_max_nodes, package_timeout, max_rss):
+    """根据命令行参数创建扫描预算，均未设置时返回None"""
+    if file_timeout is None and file_max_nodes is None and package_timeout is None and max_rss is None:
+        return None
+    import PyRepoScanner.scanner.budget as prs_budget
+
+    max_rss = max_rss * 1024 * 1024 if max_rss is not None else None
+    return prs_budget.ScanBudget(file_time=file_timeout, file_nodes=file_max_nodes, file_rss=max_rss,
+                                 package_time=package_timeout, package_rss=max_rss)
+
+
 @cli.command("monitor")
 @click.option("-R", "--register", "reg_name", default="pypi", type=click.Choice(["pypi"]),
               help="name of the register you want to monitor, default to be pypi.")
@@ -57,11 +63,24 @@ def cli(ctx, log_level, log_stream, log_file):
               help="levenshtein distance threshold, default to be 1.")
 @click.option("-c", "--cover", "cover_flag", default=False, type=click.BOOL,
               help="whether to rescan and cover history analysis results.")
+@click.option("--file_timeout", "file_timeout", default=60, type=click.FloatRange(min=0),
+              help="max seconds spent on analyzing a single file, files over budget are marked partial, default to be 60.")
+@click.option("--file_max_nodes", "file_max_nodes", default=None, type=click.IntRange(min=1),
+              help="max number of AST nodes analyzed in a single file, default to be unlimited.")
+@click.option("--package_timeout", "package_timeout", default=600, type=click.FloatRange(min=0),
+              help="max seconds spent on scanning a single project, remaining files are marked partial, default to be 600.")
+@click.option("--max_rss", "max_rss", default=None, type=click.IntRange(min=1),
+              help="max resident memory of the scanning process in MiB, default to be unlimited.")
+@click.option("--isolate", "isolate_flag", is_flag=True, default=False,
+              help="analyze each file in a forked child process, which is killed when the file timeout is exceeded.")
 @click.pass_context
 def monitor_cli(ctx, reg_name, raw_interval, mongo_uri,
                 minio_host, minio_access_key, minio_secret_key,
                 rule_path, file_rule_path, file_type,
-                analyze_threshold, levenshtein_distance, cover_flag):
+                analyze_threshold, levenshtein_distance, cover_flag,
+                file_timeout, file_max_nodes, package_timeout, max_rss, isolate_flag):
+    from PyRepoScanner.monitor.pypi.monitor import PypiMonitor
+
     # 配置logger
     prs_log.config_logger(log_level=ctx.obj["log_level"],
                           stream_flag=ctx.obj["log_stream"],
@@ -94,6 +113,8 @@ def monitor_cli(ctx, reg_name, raw_interval, mongo_uri,
             analyze_threshold=analyze_threshold,
             levenshtein_distance=levenshtein_distance,
             cover_flag=cover_flag,
+            scan_budget=_scan_budget(file_timeout, file_max_nodes, package_timeout, max_rss),
+            isolate_flag=isolate_flag,
         )
         monitor.monitor()
 
@@ -107,25 +128,266 @@ def monitor_cli(ctx, reg_name, raw_interval, mongo_uri,
               help="dir path or file path of rules, default to be ./rules.")
 @click.option("-o", "--output", "output_filepath", default=None, type=click.Path(),
               help="output JSON file path.")
+@click.option("--no-prefilter", "no_prefilter", is_flag=True, default=False,
+              help="parse every selected file, even files without any sink identifier.")
+@click.option("--no-triage", "no_triage", is_flag=True, default=False,
+              help="analyze every file passing the prefilter with the AST taint engine, skipping the token-level triage.")
+@click.option("--no-package", "no_package", is_flag=True, default=False,
+              help="analyze every file in isolation, without summaries of the modules it imports from the same project.")
+@click.option("-j", "--jobs", "jobs", default=1, type=click.IntRange(min=1),
+              help="number of processes used to scan files of a project in parallel, default to be 1.")
+@click.option("--cache", "cache_path", default=None, type=click.Path(),
+              help="path of the scan result cache database, files unchanged since last scan are not analyzed again.")
+@click.option("--cache_size", "cache_size", default=256, type=click.IntRange(min=1),
+              help="max size of the scan result cache in MiB, default to be 256.")
+@click.option("--facts", "facts_path", default=None, type=click.Path(),
+              help="path of the fact database, facts of every selected file are saved by content hash "
+                   "and can be evaluated again with `prs evaluate` after rules change.")
+@click.option("--server", "socket_path", default=None, envvar="PRS_SERVER",
+              help="socket path of a running `prs serve`, scan through the server instead of loading rules locally. "
+                   "Rule, prefilter, jobs, cache and budget options of the server are used.")
+@click.option("--file_timeout", "file_timeout", default=None, type=click.FloatRange(min=0),
+              help="max seconds spent on analyzing a single file, files over budget are marked partial, default to be unlimited.")
+@click.option("--file_max_nodes", "file_max_nodes", default=None, type=click.IntRange(min=1),
+              help="max number of AST nodes analyzed in a single file, default to be unlimited.")
+@click.option("--package_timeout", "package_timeout", default=None, type=click.FloatRange(min=0),
+              help="max seconds spent on scanning a single project, remaining files are marked partial, default to be unlimited.")
+@click.option("--max_rss", "max_rss", default=None, type=click.IntRange(min=1),
+              help="max resident memory of the scanning process in MiB, default to be unlimited.")
+@click.option("--isolate", "isolate_flag", is_flag=True, default=False,
+              help="analyze each file in a forked child process, which is killed when the file timeout is exceeded.")
 @click.pass_context
-def scan_cli(ctx, file_path, file_rule_path, rule_path, output_filepath):
+def scan_cli(ctx, file_path, file_rule_path, rule_path, output_filepath, no_prefilter, no_triage, no_package, jobs,
+             cache_path, cache_size, facts_path, socket_path, file_timeout, file_max_nodes, package_timeout, max_rss,
+             isolate_flag):
+    from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
     # 配置logger
     prs_log.config_logger(log_level=ctx.obj["log_level"],
                           stream_flag=ctx.obj["log_stream"],
                           file_path=ctx.obj["log_file"])
 
-    print_flag = True
-    if output_filepath is not None:
-        print_flag = False
-    scanner = PypiScanner(rule_path=rule_path, file_rules_path=file_rule_path, print_flag=print_flag)
-    results = scanner.scan_local_file(file_path)
-    if results is None:
-        print("Something bad during scanning file, see more details in log file:", ctx.obj["log_file"])
-        exit(-1)
+    if socket_path is not None:
+        import PyRepoScanner.scanner.server as prs_server
+
+        response = prs_server.scan_local_file(socket_path, file_path)
+        if response["status"] != "ok":
+            print("Something bad during scanning file through server:", response["error"])
+            exit(-1)
+        results = response["results"]
+    else:
+        print_flag = True
+        if output_filepath is not None:
+            print_flag = False
+        scanner = PypiScanner(rule_path=rule_path, file_rules_path=file_rule_path, print_flag=print_flag,
+                              prefilter_flag=not no_prefilter, triage_flag=not no_triage, package_flag=not no_package,
+                              jobs=jobs,
+                              cache_path=cache_path, cache_size=cache_size * 1024 * 1024, facts_path=facts_path,
+                              budget=_scan_budget(file_timeout, file_max_nodes, package_timeout, max_rss),
+                              isolate_flag=isolate_flag)
+        results = scanner.scan_local_file(file_path)
+        if results is None:
+            print("Something bad during scanning file, see more details in log file:", ctx.obj["log_file"])
+            exit(-1)
 
     # 输出扫描结果
     if output_filepath is not None:
         with open(output_filepath, "w") as out_f:
             json.dump(results, out_f)
     else:
-        scanner.print_results_beautiful(results)
+        PypiScanner.print_results_beautiful(results)
+
+
+@cli.command("batch")
+@click.option("-i", "--input", "inputs", multiple=True,
+              help="dir, glob or file path of .tar.gz/.whl files to be scanned, can be given multiple times.")
+@click.option("-L", "--list", "list_files", multiple=True, type=click.Path(exists=True),
+              help="file listing one .tar.gz/.whl file path per line, can be given multiple times.")
+@click.option("-fr", "--file_rule", "file_rule_path", default="./file_rules.yml", type=click.Path(exists=True),
+              help="file path of file rules used by scanner, default to be ./file_rules.yml.")
+@click.option("-r", "--rule", "rule_path", default="./rules",
+              help="dir path or file path of rules, default to be ./rules.")
+@click.option("-o", "--output", "output_filepath", required=True, type=click.Path(),
+              help="output NDJSON file path, one record per scanned file.")
+@click.option("-j", "--jobs", "jobs", default=1, type=click.IntRange(min=1),
+              help="number of processes used to scan files in parallel, default to be 1.")
+@click.option("--resume/--no-resume", "resume", default=True,
+              help="skip files already recorded in the output file, default to be True.")
+@click.option("--cache", "cache_path", default=None, type=click.Path(),
+              help="path of the scan result cache database, files unchanged since last scan are not analyzed again.")
+@click.option("--cache_size", "cache_size", default=256, type=click.IntRange(min=1),
+              help="max size of the scan result cache in MiB, default to be 256.")
+@click.option("--facts", "facts_path", default=None, type=click.Path(),
+              help="path of the fact database, facts of every selected file are saved by content hash "
+                   "and can be evaluated again with `prs evaluate` after rules change.")
+@click.option("--file_timeout", "file_timeout", default=None, type=click.FloatRange(min=0),
+              help="max seconds spent on analyzing a single file, files over budget are marked partial, default to be unlimited.")
+@click.option("--file_max_nodes", "file_max_nodes", default=None, type=click.IntRange(min=1),
+              help="max number of AST nodes analyzed in a single file, default to be unlimited.")
+@click.option("--package_timeout", "package_timeout", default=None, type=click.FloatRange(min=0),
+              help="max seconds spent on scanning a single project, remaining files are marked partial, default to be unlimited.")
+@click.option("--max_rss", "max_rss", default=None, type=click.IntRange(min=1),
+              help="max resident memory of the scanning process in MiB, default to be unlimited.")
+@click.option("--isolate", "isolate_flag", is_flag=True, default=False,
+              help="analyze each file in a forked child process, which is killed when the file timeout is exceeded.")
+@click.pass_context
+def batch_cli(ctx, inputs, list_files, file_rule_path, rule_path, output_filepath, jobs, resume, cache_path, cache_size,
+              facts_path, file_timeout, file_max_nodes, package_timeout, max_rss, isolate_flag):
+    import PyRepoScanner.scanner.batch as prs_batch
+    from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+    # 配置logger
+    prs_log.config_logger(log_level=ctx.obj["log_level"],
+                          stream_flag=ctx.obj["log_stream"],
+                          file_path=ctx.obj["log_file"])
+
+    archives = prs_batch.collect_archives(inputs, list_files)
+    if not archives:
+        print("No .tar.gz/.whl file to be scanned.")
+        exit(-1)
+
+    # 规则只加载一次，由所有worker共享
+    scanner = PypiScanner(rule_path=rule_path, file_rules_path=file_rule_path,
+                          cache_path=cache_path, cache_size=cache_size * 1024 * 1024, facts_path=facts_path,
+                          budget=_scan_budget(file_timeout, file_max_nodes, package_timeout, max_rss),
+                          isolate_flag=isolate_flag)
+    stats = prs_batch.batch_scan(scanner, archives, output_filepath, jobs=jobs, resume=resume)
+    print("Batch scan finished, total:", stats["total"], ", skipped:", stats["skipped"],
+          ", ok:", stats["ok"], ", error:", stats["error"])
+
+
+@cli.command("compile")
+@click.option("-r", "--rule", "rule_path", default="./rules",
+              help="dir path or file path of rules, default to be ./rules.")
+@click.option("-fr", "--file_rule", "file_rule_path", default="./file_rules.yml", type=click.Path(exists=True),
+              help="file path of file rules used by scanner, default to be ./file_rules.yml.")
+@click.option("-o", "--output", "artifact_path", default=None, type=click.Path(),
+              help="output path of the compiled rules artifact, default to be <rule path>.prsc.")
+@click.pass_context
+def compile_cli(ctx, rule_path, file_rule_path, artifact_path):
+    from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+    # 配置logger
+    prs_log.config_logger(log_level=ctx.obj["log_level"],
+                          stream_flag=ctx.obj["log_stream"],
+                          file_path=ctx.obj["log_file"])
+
+    # 直接从YAML加载并校验规则，不读取已有的产物
+    scanner = PypiScanner(rule_path=rule_path, file_rules_path=file_rule_path,
+                          artifact_flag=False, artifact_path=artifact_path)
+    errors = scanner.validate_rules()
+    if errors:
+        print("Invalid rules:")
+        for error in errors:
+            print("\t" + error)
+        exit(-1)
+    if not scanner.save_rules_artifact():
+        print("Something bad during saving rules artifact, see more details in log file:", ctx.obj["log_file"])
+        exit(-1)
+    print("Compiled", len(scanner.rules), "rules to", scanner.get_artifact_path())
+
+
+@cli.command("evaluate")
+@click.option("--facts", "facts_path", required=True, type=click.Path(exists=True),
+              help="path of the fact database saved by `prs scan/batch/serve --facts`.")
+@click.option("-p", "--prefix", "path_prefix", default="",
+              help="only evaluate files whose path starts with the prefix, default to be all files.")
+@click.option("-fr", "--file_rule", "file_rule_path", default="./file_rules.yml", type=click.Path(exists=True),
+              help="file path of file rules used by scanner, default to be ./file_rules.yml.")
+@click.option("-r", "--rule", "rule_path", default="./rules",
+              help="dir path or file path of rules, default to be ./rules.")
+@click.option("-o", "--output", "output_filepath", default=None, type=click.Path(),
+              help="output JSON file path.")
+@click.option("-j", "--jobs", "jobs", default=1, type=click.IntRange(min=1),
+              help="number of processes used to evaluate files in parallel, default to be 1.")
+@click.option("--cache", "cache_path", default=None, type=click.Path(),
+              help="path of the scan result cache database, files unchanged since last scan are not evaluated again.")
+@click.option("--cache_size", "cache_size", default=256, type=click.IntRange(min=1),
+              help="max size of the scan result cache in MiB, default to be 256.")
+@click.pass_context
+def evaluate_cli(ctx, facts_path, path_prefix, file_rule_path, rule_path, output_filepath, jobs, cache_path, cache_size):
+    from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+    # 配置logger
+    prs_log.config_logger(log_level=ctx.obj["log_level"],
+                          stream_flag=ctx.obj["log_stream"],
+                          file_path=ctx.obj["log_file"])
+
+    # 不读取源码，按当前规则集对事实库中保存的事实重新求值
+    scanner = PypiScanner(rule_path=rule_path, file_rules_path=file_rule_path, jobs=jobs,
+                          cache_path=cache_path, cache_size=cache_size * 1024 * 1024, facts_path=facts_path)
+    # 检测结果按扫描时的项目分别给出: 项目根目录 -> 检测结果
+    project_results = scanner.scan_fact_store(path_prefix)
+
+    if output_filepath is not None:
+        with open(output_filepath, "w") as out_f:
+            json.dump(project_results, out_f)
+    else:
+        for project, results in project_results.items():
+            print("\nProject:", project)
+            PypiScanner.print_results_beautiful(results)
+
+
+@cli.command("serve")
+@click.option("-s", "--socket", "socket_path", default="./prs.sock", type=click.Path(),
+              help="unix domain socket path the server listens on, default to be ./prs.sock.")
+@click.option("-fr", "--file_rule", "file_rule_path", default="./file_rules.yml", type=click.Path(exists=True),
+              help="file path of file rules used by scanner, default to be ./file_rules.yml.")
+@click.option("-r", "--rule", "rule_path", default="./rules",
+              help="dir path or file path of rules, default to be ./rules.")
+@click.option("-j", "--jobs", "jobs", default=1, type=click.IntRange(min=1),
+              help="number of resident worker processes, default to be 1 (scan in the server process).")
+@click.option("--no-prefilter", "no_prefilter", is_flag=True, default=False,
+              help="parse every selected file, even files without any sink identifier.")
+@click.option("--no-triage", "no_triage", is_flag=True, default=False,
+              help="analyze every file passing the prefilter with the AST taint engine, skipping the token-level triage.")
+@click.option("--no-package", "no_package", is_flag=True, default=False,
+              help="analyze every file in isolation, without summaries of the modules it imports from the same project.")
+@click.option("--cache", "cache_path", default=None, type=click.Path(),
+              help="path of the scan result cache database, files unchanged since last scan are not analyzed again.")
+@click.option("--cache_size", "cache_size", default=256, type=click.IntRange(min=1),
+              help="max size of the scan result cache in MiB, default to be 256.")
+@click.option("--facts", "facts_path", default=None, type=click.Path(),
+              help="path of the fact database, facts of every selected file are saved by content hash "
+                   "and can be evaluated again with `prs evaluate` after rules change.")
+@click.option("--file_timeout", "file_timeout", default=None, type=click.FloatRange(min=0),
+              help="max seconds spent on analyzing a single file, files over budget are marked partial, default to be unlimited.")
+@click.option("--file_max_nodes", "file_max_nodes", default=None, type=click.IntRange(min=1),
+              help="max number of AST nodes analyzed in a single file, default to be unlimited.")
+@click.option("--package_timeout", "package_timeout", default=None, type=click.FloatRange(min=0),
+              help="max seconds spent on scanning a single project, remaining files are marked partial, default to be unlimited.")
+@click.option("--max_rss", "max_rss", default=None, type=click.IntRange(min=1),
+              help="max resident memory of the scanning process in MiB, default to be unlimited.")
+@click.option("--isolate", "isolate_flag", is_flag=True, default=False,
+              help="analyze each file in a forked child process, which is killed when the file timeout is exceeded.")
+@click.pass_context
+def serve_cli(ctx, socket_path, file_rule_path, rule_path, jobs, no_prefilter, no_triage, no_package, cache_path,
+              cache_size, facts_path, file_timeout, file_max_nodes, package_timeout, max_rss, isolate_flag):
+    import PyRepoScanner.scanner.server as prs_server
+    from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+    # 配置logger
+    prs_log.config_logger(log_level=ctx.obj["log_level"],
+                          stream_flag=ctx.obj["log_stream"],
+                          file_path=ctx.obj["log_file"])
+
+    # 常驻的scanner，规则只加载一次
+    scanner = PypiScanner(rule_path=rule_path, file_rules_path=file_rule_path,
+                          prefilter_flag=not no_prefilter, triage_flag=not no_triage, package_flag=not no_package,
+                          cache_path=cache_path, cache_size=cache_size * 1024 * 1024, facts_path=facts_path,
+                          budget=_scan_budget(file_timeout, file_max_nodes, package_timeout, max_rss),
+                          isolate_flag=isolate_flag)
+    server = prs_server.ScanServer(scanner=scanner, socket_path=socket_path, jobs=jobs)
+    try:
+        server.start()
+    except RuntimeError as e:
+        print(e)
+        exit(-1)
+    print("Scan server is listening on", socket_path)
+    # 收到SIGTERM时正常退出，关闭进程池并删除socket文件
+    import signal
+    signal.signal(signal.SIGTERM, lambda signum, frame: exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Scan server stopped")
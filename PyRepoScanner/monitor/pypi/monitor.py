@@ -19,6 +19,7 @@ import PyRepoScanner.utils.basic_tools as prs_utils
 import PyRepoScanner.utils.mongo_utils as prs_mongo
 import PyRepoScanner.utils.minio_utils as prs_minio
 import PyRepoScanner.utils.poison_detection_tools as prs_poison_detection
+import PyRepoScanner.scanner.budget as prs_budget
 from PyRepoScanner.scanner.pypi.scanner import PypiScanner
 
 
@@ -55,11 +56,14 @@ class PypiMonitor:
     file_rules_path: str = None     # 要检测的内容，默认为setup.py, __init__.py文件
     levenshtein_distance: int = 1
     cover_flag: bool = False
+    scan_budget: prs_budget.ScanBudget = None     # 检测单个文件/项目的预算，避免异常文件阻塞分析线程
+    isolate_flag: bool = False      # 是否在子进程中分析单个文件
     local_serial = None             # 本地已经维护的serial
     curr_serial = None              # 本地正在处理的serial
     popular = None
     analysis_queue_index = 0
     download_queue_index = 0
+    tier_stats = None               # 当日分级检测各级的文件数与耗时
 
     def __post_init__(self):
         self.mongo_client = prs_mongo.PRSPypiMongoClient(mongo_uri=self.mongo_uri)
@@ -71,7 +75,8 @@ class PypiMonitor:
 
         # 如果需要检测，则创建扫描器以及用于检测的优先级队列
         if self.analyze_threshold > -1:
-            self.scanner = PypiScanner(rule_path=self.rule_path, file_rules_path=self.file_rules_path)
+            self.scanner = PypiScanner(rule_path=self.rule_path, file_rules_path=self.file_rules_path,
+                                       budget=self.scan_budget, isolate_flag=self.isolate_flag)
             # 分析队列格式: (-suspicion, project_name, release_version, local_file_path, index, url)
             self.analysis_priority_queue = queue.PriorityQueue()
             analysis_thread = threading.Thread(target=self.analysis_thread_handler)
@@ -917,6 +922,21 @@ class PypiMonitor:
                 LOGGER.error(f"analyze: {task} failed with: {e}")
                 continue
 
+    def update_tier_stats(self, results):
+        """累计当日分级检测各级的文件数与耗时，日期变化时记录前一日的统计结果"""
+        today = datetime.date.today()
+        if self.tier_stats is None or self.tier_stats["date"] != today:
+            if self.tier_stats is not None:
+                LOGGER.info(f"tiered analysis stats: {self.tier_stats}")
+            self.tier_stats = {"date": today, "packages": 0, "files": 0, "prefiltered": 0, "cache_hits": 0,
+                               "triage_clean": 0, "deep": 0, "triage_time": 0.0, "deep_time": 0.0}
+        total = results["metrics"]["total"]
+        self.tier_stats["packages"] += 1
+        for key in ("files", "prefiltered", "cache_hits", "triage_clean", "deep"):
+            self.tier_stats[key] += total.get(key, 0)
+        self.tier_stats["triage_time"] += results.get("tier_time", {}).get("triage", 0.0)
+        self.tier_stats["deep_time"] += results.get("tier_time", {}).get("deep", 0.0)
+
     def analyze_save_file(self, task):
         """调用scanner检测文件，将结果存入results集合"""
         suspicion = -task[0]
@@ -939,6 +959,7 @@ class PypiMonitor:
             if results is None:
                 os.remove(local_file_path)
                 return
+            self.update_tier_stats(results)
         else:
             return
 
@@ -0,0 +1,104 @@
+"""
+压缩包成员读取
+
+直接通过tarfile/zipfile流遍历.tar.gz/.whl中的成员，不解压到磁盘:
+- 先根据成员名判断是否需要检测，只保留被选中成员的内容
+- 跨模块分析需要的模块在再次遍历时读取，不可seek的流先复制为可seek的文件对象
+- 根据成员列表解析项目的import name
+"""
+
+
+import os
+import shutil
+import tarfile
+import zipfile
+import posixpath
+import tempfile
+from typing import Callable, Iterable, List
+
+
+SPOOL_SIZE = 16 * 1024 * 1024   # 不可seek的压缩包流复制到内存中的上限，超出时写入临时文件
+
+
+def normalize_member_name(name: str):
+    """规范化成员路径，去掉开头的"/"与"./"，含".."的成员(路径穿越)返回None"""
+    name = posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+    if name in ("", ".") or name == ".." or name.startswith("../"):
+        return None
+    return name
+
+
+def iter_tar_gz_members(fileobj, select: Callable):
+    """以流模式遍历tar.gz中的普通文件成员
+
+    gzip流只能顺序解压，未被选中的成员不会被读取，只在跳过时解压
+
+    :param fileobj: 支持read的文件对象，不要求可seek
+    :param select: 以规范化后的成员路径为参数，返回是否读取该成员
+    :return: 迭代返回(规范化后的成员路径, 内容)
+    """
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            name = normalize_member_name(member.name)
+            if name is None or not select(name):
+                continue
+            yield name, tar.extractfile(member).read()
+
+
+def seekable_fileobj(fileobj):
+    """返回可以多次遍历的文件对象
+
+    可seek的文件对象直接返回，不可seek的流(压缩后的内容)复制到SpooledTemporaryFile中，调用方负责关闭复制出的文件对象
+    """
+    seekable = getattr(fileobj, "seekable", None)
+    if seekable is not None and seekable():
+        return fileobj
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    shutil.copyfileobj(fileobj, spool)
+    spool.seek(0)
+    return spool
+
+
+def list_zip_members(zip_file: zipfile.ZipFile) -> List:
+    """返回zip中全部文件成员的(规范化路径, ZipInfo)"""
+    names = []
+    for info in zip_file.infolist():
+        if info.is_dir():
+            continue
+        name = normalize_member_name(info.filename)
+        if name is not None:
+            names.append((name, info))
+    return names
+
+
+def iter_zip_members(fileobj, select: Callable):
+    """遍历zip(whl)中被选中的文件成员，未被选中的成员不会被解压
+
+    :param fileobj: 文件路径或可seek的文件对象
+    :return: 迭代返回(规范化后的成员路径, 内容)
+    """
+    with zipfile.ZipFile(fileobj, allowZip64=True) as z:
+        for name, info in list_zip_members(z):
+            if select(name):
+                yield name, z.read(info)
+
+
+def parse_import_name_from_paths(file_paths: Iterable) -> List:
+    """根据文件路径列表解析project的import name，与PypiScanner.parse_import_name对目录的处理一致
+
+    含有__init__.py的目录中，不位于已找到的最顶层包目录之下的目录名即为import name
+
+    :param file_paths: 成员映射到虚拟根目录下的文件路径
+    """
+    package_dirs = {os.path.dirname(path) for path in file_paths if os.path.basename(path) == "__init__.py"}
+    import_name = []
+    cur_top_dir_path = None
+    # 按路径分量排序，保证上级目录先于子目录，与os.walk自顶向下的顺序一致
+    for dir_path in sorted(package_dirs, key=lambda path: path.split(os.sep)):
+        if cur_top_dir_path is not None and dir_path.startswith(cur_top_dir_path):
+            continue
+        import_name.append(os.path.basename(dir_path))
+        cur_top_dir_path = dir_path
+    return import_name
@@ -0,0 +1,139 @@
+"""
+批量扫描
+
+对大量.tar.gz/.whl文件进行扫描，规则只加载一次并通过fork共享给进程池中的worker，
+每个文件扫描完成后立即以一行JSON(NDJSON)的形式写出，内存占用与文件数量无关；
+输出文件中已存在的记录会在再次运行时跳过，支持中断后继续扫描
+"""
+
+
+import os
+import glob
+import json
+import logging
+import multiprocessing
+import traceback
+from typing import Iterable, List, Set
+
+
+LOGGER = logging.getLogger()
+ARCHIVE_EXTS = (".tar.gz", ".whl")
+
+
+def is_archive(file_path: str) -> bool:
+    return file_path.endswith(ARCHIVE_EXTS)
+
+
+def collect_archives(inputs: Iterable = (), list_files: Iterable = ()) -> List:
+    """收集待扫描的文件
+
+    :param inputs: 目录(递归查找其下的.tar.gz/.whl文件)、glob表达式或文件路径
+    :param list_files: 每行一个文件路径的列表文件
+    :return: 去重并排序后的文件路径列表
+    """
+    archives = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for home, _, files in os.walk(item):
+                archives.update(os.path.join(home, name) for name in files if is_archive(name))
+        elif os.path.isfile(item):
+            archives.add(item)
+        else:
+            archives.update(path for path in glob.iglob(item, recursive=True)
+                            if os.path.isfile(path) and is_archive(path))
+    for list_file in list_files:
+        with open(list_file, "r") as f:
+            archives.update(line.strip() for line in f if line.strip())
+    return sorted(archives)
+
+
+def load_finished(output_path: str) -> Set:
+    """读取输出文件中已完成扫描的文件路径
+
+    上次运行中断时最后一行可能不完整，将其截断，保证继续写入的记录独占一行
+    """
+    finished = set()
+    if not os.path.isfile(output_path):
+        return finished
+
+    with open(output_path, "rb+") as f:
+        valid_end = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            valid_end += len(line)
+            try:
+                finished.add(json.loads(line)["archive"])
+            except (ValueError, KeyError, TypeError):
+                LOGGER.warning(f"batch scan ignores invalid record in {output_path}: {line[:100]}")
+        f.truncate(valid_end)
+    return finished
+
+
+# worker进程中使用的scanner，fork后与主进程共享已加载的规则
+_WORKER_SCANNER = None
+
+
+def _init_batch_worker(scanner):
+    global _WORKER_SCANNER
+    _WORKER_SCANNER = scanner
+
+
+def scan_archive(scanner, archive: str) -> dict:
+    """扫描单个文件并生成一条记录，扫描失败时记录错误信息而不中断整个批次"""
+    record = {"archive": archive, "status": "ok", "results": None}
+    try:
+        results = scanner.scan_local_file(archive)
+    except (Exception, SystemExit) as e:
+        LOGGER.error(f"batch scan {archive} failed with: {traceback.format_exc()}")
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+        return record
+    if results is None:
+        record["status"] = "error"
+        record["error"] = "scanner returned no results"
+    else:
+        record["results"] = results
+    return record
+
+
+def _scan_archive_in_worker(archive: str):
+    return scan_archive(_WORKER_SCANNER, archive)
+
+
+def iter_batch_scan(scanner, archives: List, jobs: int = 1):
+    """扫描文件并按完成顺序逐条返回记录
+
+    jobs大于1时使用进程池，每个worker一次只处理一个文件，结果完成即返回
+    """
+    if jobs <= 1 or len(archives) <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        for archive in archives:
+            yield scan_archive(scanner, archive)
+        return
+
+    with multiprocessing.get_context("fork").Pool(processes=min(jobs, len(archives)),
+                                                  initializer=_init_batch_worker,
+                                                  initargs=(scanner,)) as pool:
+        yield from pool.imap_unordered(_scan_archive_in_worker, archives, chunksize=1)
+
+
+def batch_scan(scanner, archives: List, output_path: str, jobs: int = 1, resume: bool = True) -> dict:
+    """批量扫描并将记录以NDJSON格式追加写入output_path
+
+    :param resume: 是否跳过output_path中已存在的文件，为False时覆盖输出文件
+    :return: 本次批量扫描的统计信息
+    """
+    if resume:
+        finished = load_finished(output_path)
+    else:
+        finished = set()
+        open(output_path, "w").close()
+    pending = [archive for archive in archives if archive not in finished]
+    stats = {"total": len(archives), "skipped": len(archives) - len(pending), "ok": 0, "error": 0}
+
+    with open(output_path, "a") as out_f:
+        for record in iter_batch_scan(scanner, pending, jobs=jobs):
+            out_f.write(json.dumps(record) + "\n")
+            out_f.flush()
+            stats[record["status"]] += 1
+    return stats
@@ -0,0 +1,262 @@
+"""
+扫描资源预算
+
+为单个文件与整个项目(package)设置耗时、AST节点数与内存(RSS)上限:
+- BudgetGuard由TaintNodeVisitor在遍历过程中定期检查，超出预算时抛出BudgetExceeded，主动中止分析
+- run_isolated在fork出的子进程中执行扫描，超时后直接结束子进程，用于ast.parse等无法主动中止的阶段；
+  在多线程的进程中fork，子进程可能因其他线程持有的锁(logging、sqlite等)死锁，
+  此时由IsolatedWorker在以forkserver启动的单线程常驻进程中执行run_isolated
+超出预算的文件/项目在检测结果中标记为partial，而不会阻塞整个流程
+"""
+
+
+import os
+import sys
+import time
+import pickle
+import select
+import signal
+import logging
+import threading
+import functools
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+
+LOGGER = logging.getLogger()
+CHECK_INTERVAL = 1024       # TaintNodeVisitor每访问CHECK_INTERVAL个节点检查一次预算
+ISOLATE_GRACE_TIME = 5      # 隔离执行时，在文件耗时预算之外额外等待的秒数
+
+
+class BudgetExceeded(Exception):
+    """扫描超出预算"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def current_rss():
+    """当前进程的常驻内存大小(字节)，无法获取时返回None"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # 退化为峰值内存，Linux单位为KiB，macOS为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass
+class ScanBudget:
+    """扫描预算，值为None表示不限制
+
+    - file_time / package_time: 单个文件 / 整个项目的耗时上限(秒)
+    - file_nodes: 单个文件的AST节点数上限
+    - file_rss / package_rss: 扫描单个文件 / 项目时进程常驻内存的上限(字节)
+    """
+    file_time: float = None
+    file_nodes: int = None
+    file_rss: int = None
+    package_time: float = None
+    package_rss: int = None
+
+    def package_guard(self):
+        return BudgetGuard(
+            deadline=time.time() + self.package_time if self.package_time is not None else None,
+            max_rss=self.package_rss,
+            scope="package",
+        )
+
+    def file_guard(self, package_guard: "BudgetGuard" = None):
+        """创建单个文件的预算检查器，截止时间不晚于项目的截止时间"""
+        deadline = time.time() + self.file_time if self.file_time is not None else None
+        scope = "file"
+        if package_guard is not None and package_guard.deadline is not None \
+                and (deadline is None or package_guard.deadline < deadline):
+            deadline = package_guard.deadline
+            scope = "package"
+        max_rss = self.file_rss
+        if package_guard is not None and package_guard.max_rss is not None \
+                and (max_rss is None or package_guard.max_rss < max_rss):
+            max_rss = package_guard.max_rss
+        return BudgetGuard(deadline=deadline, max_nodes=self.file_nodes, max_rss=max_rss, scope=scope)
+
+
+@dataclass
+class BudgetGuard:
+    """预算检查器"""
+    deadline: float = None
+    max_nodes: int = None
+    max_rss: int = None
+    scope: str = "file"         # 截止时间来源，用于生成超出预算的原因
+
+    def check(self, nodes: int = 0):
+        """检查是否超出预算，超出时抛出BudgetExceeded"""
+        if self.max_nodes is not None and nodes > self.max_nodes:
+            raise BudgetExceeded(f"file AST node budget exceeded: {nodes} > {self.max_nodes}")
+        if self.deadline is not None and time.time() > self.deadline:
+            raise BudgetExceeded(f"{self.scope} time budget exceeded")
+        if self.max_rss is not None:
+            rss = current_rss()
+            if rss is not None and rss > self.max_rss:
+                raise BudgetExceeded(f"RSS budget exceeded: {rss} > {self.max_rss}")
+
+    def remaining_time(self):
+        return None if self.deadline is None else max(0.0, self.deadline - time.time())
+
+
+def isolation_supported() -> bool:
+    return hasattr(os, "fork")
+
+
+def run_isolated(func: Callable, timeout: float = None):
+    """在fork出的子进程中执行func并返回其结果
+
+    子进程将结果pickle后通过管道传回；超时后结束子进程并抛出BudgetExceeded，
+    子进程中的异常在父进程中重新抛出。只应在单线程的进程中调用，多线程的进程使用IsolatedWorker
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # 子进程
+        os.close(read_fd)
+        status = 0
+        try:
+            try:
+                payload = pickle.dumps((True, func()), protocol=pickle.HIGHEST_PROTOCOL)
+            except BaseException as e:
+                try:
+                    payload = pickle.dumps((False, e), protocol=pickle.HIGHEST_PROTOCOL)
+                except Exception:
+                    payload = pickle.dumps((False, RuntimeError(traceback.format_exc())))
+            with os.fdopen(write_fd, "wb") as f:
+                f.write(payload)
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+
+    # 父进程，边等待边读取，避免子进程写满管道后阻塞
+    os.close(write_fd)
+    deadline = time.time() + timeout if timeout is not None else None
+    chunks = []
+    try:
+        while True:
+            wait = None if deadline is None else deadline - time.time()
+            if wait is not None and wait <= 0:
+                os.kill(pid, signal.SIGKILL)
+                raise BudgetExceeded("file time budget exceeded, isolated scan killed")
+            readable, _, _ = select.select([read_fd], [], [], wait)
+            if not readable:
+                continue
+            chunk = os.read(read_fd, 1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+
+    if not chunks:
+        raise BudgetExceeded("isolated scan exited abnormally")
+    ok, value = pickle.loads(b"".join(chunks))
+    if not ok:
+        raise value
+    return value
+
+
+def _isolated_worker_main(target, conn):
+    """隔离worker进程的主循环，依次接收(方法名, 位置参数, 关键字参数, 超时)并在fork出的子进程中执行target的方法"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        if task is None:
+            return
+        method, args, kwargs, timeout = task
+        try:
+            response = (True, run_isolated(functools.partial(getattr(target, method), *args, **kwargs),
+                                           timeout=timeout))
+        except BaseException as e:
+            response = (False, e)
+        try:
+            conn.send(response)
+        except Exception:
+            conn.send((False, RuntimeError(traceback.format_exc())))
+
+
+@dataclass
+class IsolatedWorker:
+    """多线程进程中使用的隔离worker
+
+    首次使用时以forkserver启动一个单线程的常驻进程，target(如PypiScanner)pickle后传入，只传递一次；
+    每个任务由该进程fork出子进程执行，超时后由该进程结束子进程。
+    worker超出截止时间仍未响应或异常退出时被结束，下次使用时重新启动
+    """
+    target: Any
+    _process: Any = field(default=None, repr=False)
+    _conn: Any = field(default=None, repr=False)
+    _pid: int = field(default=None, repr=False)
+    _lock: Any = field(default_factory=lambda: threading.Lock(), repr=False)
+
+    def _start(self):
+        import multiprocessing
+
+        context = multiprocessing.get_context("forkserver")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_isolated_worker_main, args=(self.target, child_conn), daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._pid = os.getpid()
+
+    def run(self, method: str, args: tuple, kwargs: dict, timeout: float = None):
+        """在隔离的子进程中执行target.method(*args, **kwargs)并返回其结果，超时抛出BudgetExceeded"""
+        with self._lock:
+            # fork出的进程(如进程池worker)中继承的worker属于父进程，需要启动自己的worker
+            if self._process is None or self._pid != os.getpid() or not self._process.is_alive():
+                self._start()
+            try:
+                self._conn.send((method, args, kwargs, timeout))
+                wait = None if timeout is None else timeout + ISOLATE_GRACE_TIME
+                if not self._conn.poll(wait):
+                    self._kill()
+                    raise BudgetExceeded("file time budget exceeded, isolated worker killed")
+                ok, value = self._conn.recv()
+            except (EOFError, OSError):
+                self._kill()
+                raise BudgetExceeded("isolated scan exited abnormally")
+        if not ok:
+            raise value
+        return value
+
+    def _kill(self):
+        if self._process is not None and self._pid == os.getpid():
+            self._process.kill()
+            self._process.join()
+            self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def close(self):
+        with self._lock:
+            if self._process is not None and self._pid == os.getpid():
+                try:
+                    self._conn.send(None)
+                except OSError:
+                    pass
+                self._process.join(ISOLATE_GRACE_TIME)
+                if self._process.is_alive():
+                    self._process.kill()
+                    self._process.join()
+                self._conn.close()
+            self._process = None
+            self._conn = None
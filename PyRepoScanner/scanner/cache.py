@@ -0,0 +1,139 @@
+"""
+扫描结果缓存
+
+以(文件内容sha256, 规则集指纹)为键，将单个文件的检测结果保存在SQLite数据库中，
+内容未变化的文件无需再次解析与分析；跨模块分析的模块摘要也保存在同一数据库中。缓存总大小有上限，超出时按最近访问时间(LRU)淘汰
+"""
+
+
+import os
+import json
+import time
+import logging
+import sqlite3
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any
+
+
+LOGGER = logging.getLogger()
+CACHE_VERSION = 7                       # 检测结果格式或分析逻辑变化时递增，使旧缓存失效
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024  # 默认缓存上限256MiB
+
+
+def ruleset_fingerprint(rules: dict) -> str:
+    """计算规则集指纹，规则内容或缓存版本变化时指纹随之变化"""
+    digest = hashlib.sha256(str(CACHE_VERSION).encode())
+    digest.update(json.dumps(rules, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class ScanCache:
+    """基于SQLite的文件检测结果缓存
+
+    缓存中只保存文件的issue列表，并将其中的file_path置空，
+    命中时替换为当前文件路径，统计数据由issue重新计算
+    """
+    path: str
+    max_size: int = DEFAULT_CACHE_SIZE
+    _conn: Any = field(default=None, repr=False)
+    _pid: int = field(default=None, repr=False)
+
+    def __post_init__(self):
+        # 使用绝对路径，进程切换工作目录后仍访问同一数据库
+        self.path = os.path.abspath(self.path)
+
+    def _connect(self):
+        """获取数据库连接，fork出的子进程使用各自的连接"""
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+        cache_dir = os.path.dirname(self.path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS results ("
+                     "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+        conn.commit()
+        self._conn = conn
+        self._pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _key(sha256: str, fingerprint: str):
+        return f"{sha256}:{fingerprint}"
+
+    def get(self, sha256: str, fingerprint: str, file_path: str):
+        """查询缓存，命中时返回issue列表并更新访问时间，未命中返回None"""
+        key = self._key(sha256, fingerprint)
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        except sqlite3.Error as e:
+            LOGGER.warning(f"scan cache {self.path} get failed with: {e}")
+            return None
+
+        issues = json.loads(row[0])
+        for issue in issues:
+            issue["file_path"] = file_path
+        return issues
+
+    def put(self, sha256: str, fingerprint: str, issues: list):
+        """保存文件的issue列表，超出缓存上限时淘汰最久未访问的记录"""
+        value = json.dumps([dict(issue, file_path=None) for issue in issues]).encode()
+        try:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO results (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                         (self._key(sha256, fingerprint), value, len(value), time.time()))
+            self._evict(conn)
+            conn.commit()
+        except sqlite3.Error as e:
+            LOGGER.warning(f"scan cache {self.path} put failed with: {e}")
+
+    def get_value(self, key: str):
+        """查询以key保存的原始数据(如模块摘要)，命中时更新访问时间，未命中返回None"""
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        except sqlite3.Error as e:
+            LOGGER.warning(f"scan cache {self.path} get failed with: {e}")
+            return None
+        return row[0]
+
+    def put_value(self, key: str, value: bytes):
+        """以key保存原始数据，与检测结果共享缓存上限"""
+        try:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO results (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                         (key, value, len(value), time.time()))
+            self._evict(conn)
+            conn.commit()
+        except sqlite3.Error as e:
+            LOGGER.warning(f"scan cache {self.path} put failed with: {e}")
+
+    def _evict(self, conn):
+        total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        while total_size > self.max_size:
+            rows = conn.execute("SELECT key, size FROM results ORDER BY last_access LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                total_size -= size
+                if total_size <= self.max_size:
+                    break
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
@@ -0,0 +1,225 @@
+"""
+常量载荷的静态解码
+
+参数均为静态值时，按纯函数的方式求出0003_decoder.yml中解码函数的结果，不执行任何被扫描的代码:
+- 只实现无副作用的解码函数，codecs.decode只支持白名单中的编码
+- 输入与输出大小受限，zlib解压以max_length限制输出，防止解压炸弹
+- 解码结果以(函数, 参数)的sha256为键缓存在进程内，重复出现的载荷只解码一次
+
+解码结果为Python源码时，由TaintNodeVisitor作为载荷(payload)抽取事实，求值时递归检测
+"""
+
+
+import ast
+import zlib
+import base64
+import codecs
+import marshal
+import hashlib
+import binascii
+from collections import OrderedDict
+
+
+MAX_INPUT_SIZE = 4 * 1024 * 1024    # 解码函数参数的最大总长度
+MAX_OUTPUT_SIZE = 4 * 1024 * 1024   # 解码结果的最大长度
+MAX_DECODE_DEPTH = 8                # 嵌套解码调用的最大层数，e.g. b64decode(b64decode(...))
+MAX_PAYLOAD_DEPTH = 4               # 载荷中再次解码出载荷的最大层数
+MEMO_SIZE = 64 * 1024 * 1024        # 进程内缓存的解码结果与载荷事实的总大小上限
+
+# codecs.decode支持的编码，名称规范化(小写，"-"替换为"_")后查找
+TEXT_CODECS = {
+    "rot13": "rot13", "rot_13": "rot13",
+    "base64": "base64", "base_64": "base64", "base64_codec": "base64",
+    "hex": "hex", "hex_codec": "hex",
+    "zlib": "zlib", "zip": "zlib", "zlib_codec": "zlib",
+    "utf_8": "utf-8", "utf8": "utf-8", "u8": "utf-8",
+    "ascii": "ascii", "us_ascii": "ascii",
+    "latin_1": "latin-1", "latin1": "latin-1", "iso_8859_1": "latin-1", "l1": "latin-1",
+    "utf_16": "utf-16", "utf_16_le": "utf-16-le", "utf_16_be": "utf-16-be",
+    "utf_32": "utf-32", "utf_32_le": "utf-32-le", "utf_32_be": "utf-32-be",
+    "unicode_escape": "unicode-escape", "raw_unicode_escape": "raw-unicode-escape",
+}
+_DECODE_ERRORS = (ValueError, TypeError, LookupError, binascii.Error, zlib.error, OverflowError, MemoryError)
+
+
+class DecodeError(ValueError):
+    """解码失败或超出大小限制"""
+
+
+class Memo:
+    """按总大小淘汰最久未使用记录的进程内缓存"""
+
+    def __init__(self, max_size: int = MEMO_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self._items = OrderedDict()     # key -> (value, size)
+
+    def get(self, key, default=None):
+        item = self._items.get(key)
+        if item is None:
+            return default
+        self._items.move_to_end(key)
+        return item[0]
+
+    def put(self, key, value, size: int):
+        if key in self._items:
+            self.size -= self._items.pop(key)[1]
+        self._items[key] = (value, size)
+        self.size += size
+        while self.size > self.max_size and len(self._items) > 1:
+            self.size -= self._items.popitem(last=False)[1][1]
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+
+def _bounded_decompress(data, wbits=zlib.MAX_WBITS, bufsize=None):
+    """zlib解压，输出超出MAX_OUTPUT_SIZE时抛出DecodeError"""
+    decompressor = zlib.decompressobj(wbits)
+    result = decompressor.decompress(data, MAX_OUTPUT_SIZE + 1)
+    if len(result) > MAX_OUTPUT_SIZE or decompressor.unconsumed_tail:
+        raise DecodeError("decompressed data too large")
+    return result
+
+
+def _codec_name(encoding, errors):
+    name = TEXT_CODECS.get(str(encoding).lower().replace("-", "_"))
+    if name is None or errors not in ("strict", "ignore", "replace"):
+        raise DecodeError(f"unsupported encoding: {encoding}")
+    return name
+
+
+def _codecs_decode(obj, encoding="utf-8", errors="strict"):
+    name = _codec_name(encoding, errors)
+    if name == "zlib":
+        return _bounded_decompress(obj)
+    return codecs.decode(obj, name, errors)
+
+
+def _str_encode(value, encoding="utf-8", errors="strict"):
+    name = _codec_name(encoding, errors)
+    if name not in ("utf-8", "ascii", "latin-1"):
+        raise DecodeError(f"unsupported encoding: {encoding}")
+    return value.encode(name, errors)
+
+
+def _bytes_only(func):
+    """只接受bytes参数的解码函数，避免str参数触发隐式编码"""
+    def decode(data, *args, **kwargs):
+        if not isinstance(data, (bytes, bytearray)):
+            raise DecodeError("argument must be bytes")
+        return func(data, *args, **kwargs)
+    return decode
+
+
+# 解码函数全称 -> 纯函数实现
+DECODERS = {
+    "base64.b64decode": base64.b64decode,
+    "base64.standard_b64decode": base64.standard_b64decode,
+    "base64.urlsafe_b64decode": base64.urlsafe_b64decode,
+    "base64.b32decode": base64.b32decode,
+    "base64.b16decode": base64.b16decode,
+    "base64.a85decode": base64.a85decode,
+    "base64.b85decode": base64.b85decode,
+    "base64.decodebytes": _bytes_only(base64.decodebytes),
+    "base64.decodestring": _bytes_only(base64.decodebytes),
+    "codecs.decode": _codecs_decode,
+    "bytes.fromhex": bytes.fromhex,
+    "binascii.a2b_hex": binascii.a2b_hex,
+    "binascii.unhexlify": binascii.unhexlify,
+    "binascii.a2b_base64": binascii.a2b_base64,
+    "binascii.a2b_qp": binascii.a2b_qp,
+    "binascii.a2b_uu": binascii.a2b_uu,
+    "codecs.escape_decode": _bytes_only(codecs.escape_decode),
+    "codecs.unicode_escape_decode": codecs.unicode_escape_decode,
+    "codecs.raw_unicode_escape_decode": codecs.raw_unicode_escape_decode,
+    "codecs.utf_8_decode": _bytes_only(codecs.utf_8_decode),
+    "codecs.latin_1_decode": _bytes_only(codecs.latin_1_decode),
+    "codecs.ascii_decode": _bytes_only(codecs.ascii_decode),
+    "zlib.decompress": _bytes_only(_bounded_decompress),
+}
+if hasattr(base64, "b32hexdecode"):
+    DECODERS["base64.b32hexdecode"] = base64.b32hexdecode
+
+# 静态值上支持的方法: 方法名 -> (接收者类型, 实现)
+METHODS = {
+    "decode": ((bytes,), _codecs_decode),
+    "encode": ((str,), _str_encode),
+}
+
+_MEMO = Memo()
+_MISSING = object()
+
+
+def _size(value) -> int:
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(_size(item) for item in value)
+    return 8
+
+
+def decode(function: str, args: tuple, keywords: tuple = ()):
+    """以静态参数求解码函数的结果
+
+    :param function: 解码函数全称或"."开头的方法名(如".decode"，接收者为args[0])
+    :param args: 位置参数的静态值
+    :param keywords: ((关键字, 静态值), ...)
+    :return: 解码结果，不支持或解码失败时返回None
+    """
+    if function.startswith("."):
+        receiver, implementation = METHODS.get(function[1:], ((), None))
+        if implementation is None or not args or not isinstance(args[0], receiver):
+            return None
+    else:
+        implementation = DECODERS.get(function)
+        if implementation is None:
+            return None
+    if _size(args) + _size(keywords) > MAX_INPUT_SIZE:
+        return None
+    try:
+        key = hashlib.sha256(marshal.dumps((function, args, keywords))).digest()
+    except ValueError:
+        return None
+    result = _MEMO.get(key, _MISSING)
+    if result is not _MISSING:
+        return result
+    try:
+        result = implementation(*args, **dict(keywords))
+    except _DECODE_ERRORS:
+        result = None
+    if isinstance(result, bytearray):
+        result = bytes(result)
+    if result is not None and _size(result) > MAX_OUTPUT_SIZE:
+        result = None
+    _MEMO.put(key, result, _size(result) + len(key))
+    return result
+
+
+def payload_source(value):
+    """解码结果可能为Python源码时返回源码文本，否则返回None"""
+    if isinstance(value, bytes):
+        try:
+            value = value.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+    if not isinstance(value, str) or not value.strip() or len(value) > MAX_OUTPUT_SIZE:
+        return None
+    return value
+
+
+def parse_payload(source: str):
+    """解析载荷源码，源码中至少需要有一个调用，否则返回None"""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        return None
+    if not any(isinstance(node, ast.Call) for node in ast.walk(tree)):
+        return None
+    return tree
+
+
+PAYLOADS = Memo()   # sha256(载荷层数, 载荷源码) -> 抽取出的prs_facts.FileFacts，不是载荷时为None
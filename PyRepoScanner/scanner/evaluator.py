@@ -0,0 +1,914 @@
+"""
+规则求值
+
+按顺序重放文件事实(prs_facts.FileFacts)，在事实上完成污点标记、污点传播与污点检测，
+求值过程只依赖事实与规则索引，不需要源码与AST。
+
+存在分支与循环的作用域按控制流图求值: 基本块入口的变量表为各前驱出口变量表的并(taint集合取并集)，
+以工作表算法迭代至不动点，只有入口变量表发生变化的基本块会被重新求值。
+taint集合有限且变量表只增不减，迭代必然收敛；作用域内的求值总次数另有与基本块数、变量数成正比的安全上限，
+超出上限时停止迭代并以FactEvaluator.partial记录原因。
+
+函数首次求值时生成函数摘要(FunctionSummary)，对文件内定义的函数的调用按摘要完成跨函数的污点传播与检测，
+调用位于函数定义之前时在调用处按需求值被调函数，每个函数只生成一次摘要。
+扫描项目时，对项目内其他模块的函数调用与变量读取通过包上下文(prs_package.PackageContext)中的模块摘要处理。
+静态解码出的载荷(FileFacts.payloads)在文件求值后独立求值，载荷中的issue报告在解码调用处
+"""
+
+
+import heapq
+import logging
+import dataclasses
+from dataclasses import dataclass, field
+from typing import Any, List, Dict, Set, Tuple
+import PyRepoScanner.scanner.budget as prs_budget
+import PyRepoScanner.scanner.facts as prs_facts
+import PyRepoScanner.scanner.rule_index as prs_rule_index
+import PyRepoScanner.scanner.scope as prs_scope
+import PyRepoScanner.utils.issue as prs_issue
+
+
+LOGGER = logging.getLogger()
+INPUT_TAINT = prs_issue.Taint(id="0000", accordance="type", type="input")
+FIXED_POINT_VISIT_FACTOR = 4    # 作用域内基本块求值总次数的安全上限为 因子 * 基本块数 * (变量数 + 1)
+MAX_SUMMARY_DEPTH = 32      # 调用处按需求值被调函数的最大嵌套深度
+_MARK_EVENTS = frozenset((prs_facts.CALL, prs_facts.NAME, prs_facts.ATTR, prs_facts.CONST, prs_facts.LITERAL))
+
+
+def _join_variables(dest: dict, src: dict):
+    """将变量表src并入dest，变量取并集，同名变量的taints取并集
+
+    变量表之间共享变量记录，taints发生变化的变量替换为新的变量记录，不修改共享的taints
+
+    :return: dest是否发生变化
+    """
+    changed = False
+    for var, variable in src.items():
+        target = dest.get(var)
+        if target is None:
+            dest[var] = variable
+            changed = True
+        elif target.taints is not variable.taints and variable.taints:
+            # dict合并使用已保存的哈希值，不再调用Taint.__hash__
+            taints = dict(target.taints)
+            taints.update(variable.taints)
+            if len(taints) != len(target.taints):
+                dest[var] = prs_scope.Variable(taints, target.value, target.variable, target.position, target.keyword)
+                changed = True
+    return changed
+
+
+@dataclass
+class FunctionSummary:
+    """函数摘要，记录函数首次求值时形参与返回值之间、形参与函数内sink之间的污点关系
+
+    形参以(position, keyword)标识，求值时形参带有accordance为param的占位taint，
+    占位taint到达sink/返回值即表示形参可以到达sink/返回值
+    - sinks: 形参 -> {sink: None}，形参可以到达的sink
+    - returns: 到达返回值的taint(不含本函数形参的占位taint与input taint)
+    - param_returns: 可以到达返回值的形参
+    """
+    sinks: Dict = field(default_factory=lambda: dict())
+    returns: Dict = field(default_factory=lambda: dict())
+    param_returns: Dict = field(default_factory=lambda: dict())
+
+
+@dataclass
+class FactEvaluator:
+    """在文件事实上应用规则"""
+    rule_index: prs_rule_index.RuleIndex
+    filepath: str = ""
+    guard: Any = None                                               # 预算检查器(prs_budget.BudgetGuard)，为None时不限制
+    package: Any = None                                             # 项目内模块摘要(prs_package.PackageContext)，为None时不进行跨模块分析
+    summarize: bool = False                                         # 是否为全部函数生成摘要并导出模块摘要
+    exports: Tuple = None                                           # 导出的(模块级变量 -> taint集合, 函数相对全称 -> FunctionSummary)
+    constants: Dict = field(default_factory=lambda: dict())         # 常量表，维护常量的taint情况
+    scope: prs_scope.Scope = None                                   # 当前作用域，仅使用变量的taints
+    # 污点传播不保证发现所有问题，结合敏感操作顺序也可以发现一些问题
+    sensitive_serial: int = 0            # 敏感行为序号
+    sensitive_info_acquisition_serial: Tuple = None
+    network_receiver_serial: Tuple = None
+    network_sender_serial: Tuple = None
+    file_operation_serial: Tuple = None
+    encoder_serial: Tuple = None
+    decoder_serial: Tuple = None
+    command_execution_serial: Tuple = None
+    issues: Dict = field(default_factory=lambda: dict())            # 以dict作为有序集合，issue -> None
+    results: List = field(default_factory=lambda: [])
+    partial: str = None                                             # 未完整求值的原因(如不动点迭代超出上限)，完整求值时为None
+    # 节点分析状态旁表，以nid为键，求值结束时释放
+    node_taints: Dict = field(default_factory=lambda: dict())       # nid -> {taint: None}，不含隐式的"*"taint
+    node_sinks: Dict = field(default_factory=lambda: dict())        # nid -> {sink: None}
+    node_args: Dict = field(default_factory=lambda: dict())         # 带有sink的调用nid -> (args, keywords)
+    node_targets: Dict = field(default_factory=lambda: dict())      # nid -> 赋值目标变量名
+    node_calls: Dict = field(default_factory=lambda: dict())        # 文件内/项目内函数的调用nid -> (摘要, 形参位置偏移, args, keywords, 是否为其他模块的函数)
+    positions: Dict = field(default_factory=lambda: dict())
+    parents: Dict = field(default_factory=lambda: dict())
+    literal_hits: Dict = field(default_factory=lambda: dict())      # 命中literal规则的字符串常量下标 -> [(taint模板, 命中的文本), ...]
+    # 控制流图，求值结束时释放
+    flows: Dict = field(default_factory=lambda: dict())             # bid -> [successor bid, ...]
+    blocks: Dict = field(default_factory=lambda: dict())            # bid -> (起始事件下标, 结束事件下标)
+    regions: Dict = field(default_factory=lambda: dict())           # 作用域起始事件下标 -> (按出现顺序排列的基本块, 结束事件下标)
+    # 函数摘要，求值结束时释放
+    definitions: Dict = field(default_factory=lambda: dict())       # 类/函数全称 -> (作用域起始事件下标, 是否为函数)
+    summaries: Dict = field(default_factory=lambda: dict())         # 函数全称 -> FunctionSummary
+    _function_names: Set = field(default_factory=lambda: set())     # 文件内定义且被调用的函数名
+    _active: Dict = field(default_factory=lambda: dict())           # 正在生成摘要的函数全称 -> FunctionSummary
+    _summary_stack: List = field(default_factory=lambda: [])        # 各层作用域正在生成摘要的函数全称，不生成时为None
+    _summarized: Set = field(default_factory=lambda: set())         # 已在调用处按需求值、顺序重放时跳过的作用域起始事件下标
+    _demand_depth: int = 0
+    _root: prs_scope.Scope = None
+    _import_aliases: Dict = field(default_factory=lambda: dict())
+    _stars: Tuple = ()                                              # "from ... import *"导入的模块
+    _events: List = field(default_factory=lambda: [])
+    _handlers: List = field(default_factory=lambda: [])
+    _replayed: int = 0                                              # 距上次预算检查重放的事件数
+    _serial: int = 0                                                # 基本块求值序号
+
+    def __post_init__(self):
+        if self.scope is None:
+            self.scope = prs_scope.Scope("")
+        self._root = self.scope
+
+    def evaluate(self, facts: prs_facts.FileFacts):
+        """按顺序重放事实，检测结果保存在self.results中
+
+        按作用域对基本块进行不动点求值，只有一个基本块的作用域顺序重放。
+        设置了guard时每处理CHECK_INTERVAL个事件检查一次预算，超出时抛出BudgetExceeded
+        """
+        # issue只能在带有sink的调用处产生，没有调用任何sink函数的文件无需重放；
+        # 进行跨模块分析或生成模块摘要时，sink可能位于其他模块，或需要导出的污点
+        functions = self.rule_index.functions
+        if self.package is None and not self.summarize and not facts.payloads and \
+                not any(functions[function].sinks for function in facts.functions if function in functions):
+            return self.results
+
+        self.positions = facts.positions
+        self.parents = facts.parents
+        handlers = [None] * (prs_facts.LITERAL + 1)
+        handlers[prs_facts.CALL] = self.mark_call
+        handlers[prs_facts.NAME] = self.mark_name
+        handlers[prs_facts.ATTR] = self.mark_attribute
+        handlers[prs_facts.CONST] = self.mark_constant
+        handlers[prs_facts.CHECK] = self.check_taint
+        handlers[prs_facts.ASSIGN] = self._assign
+        handlers[prs_facts.COPY] = self._copy
+        handlers[prs_facts.ARG] = self._arg
+        handlers[prs_facts.DEL] = self._del
+        handlers[prs_facts.SCOPE] = self._push_scope
+        handlers[prs_facts.END_SCOPE] = self._pop_scope
+        handlers[prs_facts.BLOCK] = self._enter_block
+        handlers[prs_facts.RETURN] = self._return
+        handlers[prs_facts.LITERAL] = self.mark_literal
+        try:
+            self._events = facts.events
+            self._handlers = handlers
+            self.flows = facts.flows
+            self.literal_hits = self.rule_index.match_literals(facts.literals)
+            if self.package is not None:
+                self._import_aliases = facts.import_aliases
+                self._stars = tuple(module[:-len(".*")] for module in facts.imports if module.endswith(".*"))
+            self._index_blocks(None if self.summarize else {function.rpartition(".")[2] for function in facts.functions})
+            self._solve(0)
+            if self.summarize:
+                self.exports = self._export()
+            # 同一载荷在多处解码时共享事实，只求值一次
+            payload_issues = {}
+            for nid, payload in facts.payloads:
+                issues = payload_issues.get(id(payload))
+                if issues is None:
+                    issues = payload_issues[id(payload)] = self._evaluate_payload(payload)
+                self._add_payload_issues(nid, issues)
+        finally:
+            self.release()
+        return self.results
+
+    def _evaluate_payload(self, payload: prs_facts.FileFacts):
+        """对解码出的载荷独立求值，返回载荷中的issue列表"""
+        evaluator = FactEvaluator(rule_index=self.rule_index, filepath=self.filepath, guard=self.guard)
+        evaluator.evaluate(payload)
+        if self.partial is None:
+            self.partial = evaluator.partial
+        return list(evaluator.issues)
+
+    def _add_payload_issues(self, nid, issues):
+        """添加载荷中的issue，taint与sink位置替换为解码调用nid的位置"""
+        lineno, col_offset, end_lineno, end_col_offset = self.positions[nid]
+        position = {"lineno": lineno, "col_offset": col_offset,
+                    "end_lineno": end_lineno, "end_col_offset": end_col_offset}
+        for issue in issues:
+            self.add_issue_to_result(dataclasses.replace(
+                issue,
+                taint=dataclasses.replace(issue.taint, **position),
+                sink=dataclasses.replace(issue.sink, **position),
+            ))
+
+    def release(self):
+        """释放节点分析状态旁表"""
+        self.node_taints.clear()
+        self.node_sinks.clear()
+        self.node_args.clear()
+        self.node_targets.clear()
+        self.node_calls.clear()
+        self.blocks.clear()
+        self.regions.clear()
+        self.definitions.clear()
+        self.summaries.clear()
+        self.literal_hits = {}
+        self._function_names.clear()
+        self._active.clear()
+        self._summary_stack.clear()
+        self._summarized.clear()
+        self._events = []
+        self._handlers = []
+
+    def _index_blocks(self, called_names=None):
+        """划分各作用域内的基本块，基本块的事件范围不含BLOCK事件本身，嵌套作用域的事件整体属于所在的基本块
+
+        同时登记文件内定义的类/函数，同名定义以首次出现的为准，
+        只有函数名出现在called_names中的函数生成摘要，called_names为None时全部函数生成摘要
+        """
+        blocks = self.blocks
+        # 作用域栈，元素: [起始事件下标, 基本块列表, 当前基本块, 当前基本块起始事件下标]
+        stack = [[0, [], None, 0]]
+        qualnames = [self._root.qualname]
+        for idx, event in enumerate(self._events):
+            op = event[0]
+            if op == prs_facts.BLOCK:
+                region = stack[-1]
+                if region[2] is not None:
+                    blocks[region[2]] = (region[3], idx)
+                region[1].append(event[1])
+                region[2] = event[1]
+                region[3] = idx + 1
+            elif op == prs_facts.SCOPE:
+                stack.append([idx + 1, [], None, idx + 1])
+                qualname = f"{qualnames[-1]}.{event[1]}"
+                qualnames.append(qualname)
+                self.definitions.setdefault(qualname, (idx + 1, event[2]))
+                if event[2] and (called_names is None or event[1] in called_names):
+                    self._function_names.add(event[1])
+            elif op == prs_facts.END_SCOPE and len(stack) > 1:
+                self._close_region(stack.pop(), idx)
+                qualnames.pop()
+        while stack:
+            self._close_region(stack.pop(), len(self._events))
+
+    def _export(self):
+        """导出模块级变量与模块级函数、类方法的摘要，不含形参占位taint与input taint"""
+        def exported(taints):
+            return {taint: None for taint in taints if taint.accordance != "param" and taint is not INPUT_TAINT}
+
+        variables = {}
+        for var, variable in self._root.variables.items():
+            taints = exported(variable.taints)
+            if taints:
+                variables[var] = taints
+        functions = {}
+        prefix = len(self._root.qualname) + 1
+        for key, summary in self.summaries.items():
+            parent = key.rpartition(".")[0]
+            definition = self.definitions.get(parent)
+            # 只导出模块级函数与模块级类的方法
+            if parent != self._root.qualname and (definition is None or definition[1]
+                                                  or parent.rpartition(".")[0] != self._root.qualname):
+                continue
+            returns = exported(summary.returns)
+            if summary.sinks or returns or summary.param_returns:
+                functions[key[prefix:]] = FunctionSummary(dict(summary.sinks), returns, dict(summary.param_returns))
+        return variables, functions
+
+    def _close_region(self, region, end):
+        start, bids, bid, block_start = region
+        if bid is not None:
+            self.blocks[bid] = (block_start, end)
+        self.regions[start] = (bids, end)
+
+    def _solve(self, start):
+        """对起始于start的作用域进行不动点求值，返回作用域的结束事件下标
+
+        只有一个基本块的作用域直接顺序求值；否则以基本块出现顺序为优先级维护工作表，
+        每个基本块至少求值一次，此后仅在入口变量表变化时重新求值，直到不动点。
+        求值总次数超出安全上限(见FIXED_POINT_VISIT_FACTOR)时停止迭代，记录self.partial。
+        作用域结束时的变量表为各出口基本块(没有后继)出口变量表的并。
+
+        各基本块的变量表共享未被修改的变量记录(写时复制，见_add_taint_to_var)，合并时跳过共享的变量
+        """
+        bids, end = self.regions[start]
+        # 超出预算中止抽取时作用域可能还没有开始基本块
+        if not bids:
+            return end
+        if len(bids) == 1:
+            self._replay(*self.blocks[bids[0]])
+            return end
+
+        flows = self.flows
+        scope = self.scope
+        order = {bid: idx for idx, bid in enumerate(bids)}
+        states = {bids[0]: scope.variables}     # 基本块入口变量表
+        visited = set()
+        total_visits = 0
+        width = 0       # 作用域内出现过的最大变量表大小
+        exits = []
+        worklist = list(range(len(bids)))
+        queued = set(bids)
+        while worklist:
+            if total_visits >= FIXED_POINT_VISIT_FACTOR * len(bids) * (width + 1):
+                reason = f"fixed point iteration limit exceeded in scope {scope.qualname.lstrip('.') or '<module>'}"
+                LOGGER.debug(f"{self.filepath}: {reason}")
+                if self.partial is None:
+                    self.partial = reason
+                break
+            bid = bids[heapq.heappop(worklist)]
+            queued.discard(bid)
+            total_visits += 1
+            block_start, block_end = self.blocks[bid]
+            # 重新求值前清除基本块内节点的taint，使污点重新向赋值目标传播
+            if bid in visited:
+                self._clear_node_taints(block_start, block_end)
+            visited.add(bid)
+            state = states.get(bid)
+            if state is None:
+                scope.variables = {}
+            elif bid == bids[0]:
+                scope.variables = state
+            else:
+                scope.variables = dict(state)
+            self._serial += 1
+            scope.serial = self._serial
+            self._replay(block_start, block_end)
+
+            variables = scope.variables
+            width = max(width, len(variables))
+            successors = flows.get(bid)
+            if not successors:
+                exits.append(variables)
+                continue
+            for successor in successors:
+                # 超出预算中止抽取时后继基本块可能没有开始
+                if successor not in order:
+                    continue
+                state = states.get(successor)
+                # 求值后的变量表不再被使用，首个没有入口变量表的后继可以直接使用
+                if state is None:
+                    states[successor] = variables if variables is not None else dict(scope.variables)
+                    variables = None
+                elif not _join_variables(state, scope.variables):
+                    continue
+                if successor not in queued:
+                    queued.add(successor)
+                    heapq.heappush(worklist, order[successor])
+
+        if exits:
+            variables = exits[-1]
+            for state in exits[:-1]:
+                _join_variables(variables, state)
+            scope.variables = variables
+        return end
+
+    def _replay(self, start, end):
+        """顺序重放[start, end)范围内的事件，嵌套作用域交由_solve求值"""
+        events = self._events
+        handlers = self._handlers
+        guard = self.guard
+        if guard is not None:
+            self._replayed += end - start
+            if self._replayed >= prs_budget.CHECK_INTERVAL:
+                self._replayed = 0
+                guard.check()
+        idx = start
+        while idx < end:
+            event = events[idx]
+            if event[0] == prs_facts.SCOPE:
+                # 已在调用处按需求值的函数不再重复求值
+                if idx + 1 in self._summarized:
+                    self._summarized.discard(idx + 1)
+                    idx = self.regions[idx + 1][1] + 1
+                    continue
+                self._push_scope(event)
+                idx = self._solve(idx + 1)
+                # 超出预算中止抽取时作用域可能没有结束
+                if idx < end:
+                    self._pop_scope(events[idx])
+            else:
+                handlers[event[0]](event)
+            idx += 1
+
+    def _clear_node_taints(self, start, end):
+        """清除[start, end)范围内读取/调用节点及其祖先节点的taint"""
+        node_taints = self.node_taints
+        parents = self.parents
+        cleared = set()
+        for event in self._events[start:end]:
+            if event[0] not in _MARK_EVENTS:
+                continue
+            nid = event[1]
+            while nid not in cleared:
+                cleared.add(nid)
+                node_taints.pop(nid, None)
+                link = parents.get(nid)
+                if link is None:
+                    break
+                nid = link[0]
+
+    def _enter_block(self, event):
+        """顺序重放时基本块的划分不影响求值"""
+        pass
+
+    def _assign(self, event):
+        """登记赋值目标，当赋值发生后，变量在当前命名空间之前的属性失去意义"""
+        _, nid, targets = event
+        self.node_targets[nid] = targets
+        for target in targets:
+            self.scope.variables[target] = prs_scope.Variable(serial=self.scope.serial)
+
+    def _copy(self, event):
+        """变量拷贝，按控制流图求值时源变量可能只在其他路径上存在，此时目标变量保持赋值时的初始状态"""
+        _, src, dest = event
+        scope = self.scope.lookup(src)
+        if scope is not None:
+            self.scope.variables[dest] = scope.variables[src].copy()
+
+    def _arg(self, event):
+        """形参带有input taint，生成摘要时另外带有形参的占位taint"""
+        _, var, position, keyword = event
+        self.scope.variables[var] = prs_scope.Variable(position=position, keyword=keyword, serial=self.scope.serial)
+        self._add_taint_to_var(var, INPUT_TAINT)
+        key = self._summary_stack[-1] if self._summary_stack else None
+        if key is not None:
+            self._add_taint_to_var(var, prs_issue.Taint(id="0000", accordance="param", function=key,
+                                                        position=position, keyword=keyword))
+
+    def _del(self, event):
+        var = event[1]
+        scope = self.scope.lookup(var)
+        if scope is not None:
+            del scope.variables[var]
+
+    def _push_scope(self, event):
+        """进入子作用域，函数首次求值时开始生成摘要"""
+        self.scope = self.scope.child(event[1])
+        key = None
+        if event[2] and event[1] in self._function_names and self.scope.qualname not in self.summaries:
+            key = self.scope.qualname
+            self.summaries[key] = self._active[key] = FunctionSummary()
+        self._summary_stack.append(key)
+
+    def _pop_scope(self, event):
+        key = self._summary_stack.pop()
+        if key is not None:
+            del self._active[key]
+        self.scope = self.scope.parent
+
+    def _return(self, event):
+        """函数返回，将到达返回值的taint与形参记录到摘要中"""
+        key = self._summary_stack[-1] if self._summary_stack else None
+        taints = self.node_taints.get(event[1])
+        if key is None or not taints:
+            return
+        summary = self._active[key]
+        for taint in taints:
+            if taint.accordance == "param" and taint.function == key:
+                summary.param_returns.setdefault((taint.position, taint.keyword))
+            elif taint is not INPUT_TAINT:
+                summary.returns.setdefault(taint)
+
+    def _resolve_function(self, function):
+        """将调用的函数全称解析为文件内定义的函数，沿作用域链查找，self/cls的方法在外层类中查找
+
+        :return: (函数全称, 形参位置偏移) / None，通过self/cls调用方法时实参位置比形参位置少1
+        """
+        head, _, name = function.rpartition(".")
+        if name not in self._function_names:
+            return None
+        definitions = self.definitions
+        scope = self.scope
+        if head in ("self", "cls"):
+            while scope is not None:
+                definition = definitions.get(scope.qualname)
+                if definition is not None and not definition[1]:
+                    break
+                scope = scope.parent
+            else:
+                return None
+            key = f"{scope.qualname}.{name}"
+            shift = 1
+        else:
+            while scope is not None:
+                key = f"{scope.qualname}.{function}"
+                if key in definitions:
+                    break
+                scope = scope.parent
+            else:
+                return None
+            shift = 0
+        definition = definitions.get(key)
+        if definition is None or not definition[1]:
+            return None
+        return key, shift
+
+    def _get_summary(self, key):
+        """获取函数摘要，函数尚未求值时在当前位置按需求值，递归调用(摘要尚在生成中)时返回None"""
+        summary = self.summaries.get(key)
+        if summary is not None:
+            return None if key in self._active else summary
+        if self._demand_depth >= MAX_SUMMARY_DEPTH:
+            return None
+
+        start = self.definitions[key][0]
+        saved = self.scope
+        scope = self._root
+        for name in key[len(scope.qualname) + 1:].split(".")[:-1]:
+            scope = scope.child(name)
+        self.scope = scope
+        self._demand_depth += 1
+        try:
+            self._push_scope(self._events[start - 1])
+            self._solve(start)
+            self._pop_scope(None)
+        finally:
+            self._demand_depth -= 1
+            self.scope = saved
+        self._summarized.add(start)
+        return self.summaries[key]
+
+    def _new_taint(self, template, nid):
+        lineno, col_offset, end_lineno, end_col_offset = self.positions[nid]
+        return prs_issue.Taint(**template, lineno=lineno, col_offset=col_offset,
+                               end_lineno=end_lineno, end_col_offset=end_col_offset)
+
+    def mark_call(self, event):
+        """调用的污点标记
+
+        根据规则索引获取函数对应的taint和sink: 污染返回值的taint标记到节点，
+        污染参数的taint标记到参数对应的变量/常量上
+        """
+        _, nid, function, args, keywords = event
+        entry = self.rule_index.functions.get(function)
+        # 文件内定义的函数，根据摘要将到达返回值的taint标记到节点，形参相关的部分在污点检测时处理
+        summary = None
+        resolved = self._resolve_function(function) if self._function_names else None
+        if resolved is not None:
+            summary = self._get_summary(resolved[0])
+            if summary is not None:
+                self.node_calls[nid] = (summary, resolved[1], args, keywords, False)
+        elif self.package is not None:
+            summary = self.package.function(function, self._stars)
+            if summary is not None:
+                self.node_calls[nid] = (summary, 0, args, keywords, True)
+        if summary is not None:
+            for taint in summary.returns:
+                self._add_taint_to_node(nid, taint)
+        if entry is None:
+            if summary is not None:
+                self.spread_taint(nid)
+            return
+        # 检查taint规则
+        for taint_template in entry.taints:
+            taint = self._new_taint(taint_template, nid)
+
+            # 根据type标记敏感函数调用顺序
+            if taint.type != "":
+                self._add_sensitive_operation(taint.type, taint)
+
+            # 污染函数的返回值，将taint标记到节点
+            if taint.position == "ret":
+                self._add_taint_to_node(nid, taint)
+            # 污染函数的参数，将taint标记到参数对应的变量/常量上
+            else:
+                source = self._get_call_arg(args, keywords, taint.position, taint.keyword)
+                if source is not None:
+                    if source[1] == prs_facts.SOURCE_VAR:
+                        self._add_taint_to_var(source[2], taint)
+                    elif source[1] == prs_facts.SOURCE_CONST:
+                        self._add_taint_to_constant(source[2], taint)
+        # 检查sink规则
+        if entry.sinks:
+            self.node_args[nid] = (args, keywords)
+            for sink_template in entry.sinks:
+                lineno, col_offset, end_lineno, end_col_offset = self.positions[nid]
+                self.node_sinks.setdefault(nid, {}).setdefault(prs_issue.Sink(
+                    **sink_template, lineno=lineno, col_offset=col_offset,
+                    end_lineno=end_lineno, end_col_offset=end_col_offset))
+        self.spread_taint(nid)
+
+    def mark_name(self, event):
+        """根据变量表将污点传播到变量读取节点"""
+        _, nid, var = event
+        scope = self.scope.lookup(var)
+        if scope is None:
+            # 从项目内其他模块导入的变量
+            if self.package is not None:
+                taints = self.package.taints(self._import_aliases.get(var, var), self._stars)
+                if taints:
+                    for taint in taints:
+                        self._add_taint_to_node(nid, taint)
+                    self.spread_taint(nid)
+            return
+        taints = scope.variables[var].taints
+        if taints:
+            for taint in taints:
+                self._add_taint_to_node(nid, taint)
+            self.spread_taint(nid)
+
+    def mark_attribute(self, event):
+        """根据变量表以及attribute实际值将污点传播到属性读取节点"""
+        _, nid, attribute = event
+        # 如果变量表中有变量记录，将变量taint mark到节点
+        scope = self.scope.lookup(attribute)
+        if scope is not None:
+            for taint in scope.variables[attribute].taints:
+                self._add_taint_to_node(nid, taint)
+        # 项目内其他模块的模块级变量
+        elif self.package is not None:
+            for taint in self.package.taints(attribute, self._stars):
+                self._add_taint_to_node(nid, taint)
+
+        # 根据规则索引获取attribute对应的taint
+        entry = self.rule_index.attributes.get(attribute)
+        if entry is not None:
+            for taint_template in entry.taints:
+                self._add_taint_to_node(nid, self._new_taint(taint_template, nid))
+        self.spread_taint(nid)
+
+    def mark_constant(self, event):
+        """根据常量表将污点传播到常量节点"""
+        _, nid, value = event
+        if value in self.constants:
+            for taint in self.constants[value]["taints"]:
+                self._add_taint_to_node(nid, taint)
+        self.spread_taint(nid)
+
+    def mark_literal(self, event):
+        """将字符串常量命中的literal taint标记到常量节点"""
+        _, nid, index = event
+        hits = self.literal_hits.get(index)
+        if hits is None:
+            return
+        lineno, col_offset, end_lineno, end_col_offset = self.positions[nid]
+        for template, text in hits:
+            self._add_taint_to_node(nid, prs_issue.Taint(**template, literal=text, lineno=lineno, col_offset=col_offset,
+                                                         end_lineno=end_lineno, end_col_offset=end_col_offset))
+        self.spread_taint(nid)
+
+    def spread_taint(self, nid):
+        """污点传播
+
+        沿父节点链迭代向父节点进行污点传播，不传播"*"taint，对以下情况进行处理:
+
+        - 父节点为ast.Module，停止污点传播
+        - 父节点发生命名空间切换，停止污点传播
+        - 节点带有赋值目标(ast.Assign/ast.withitem)，向赋值变量进行污点传播
+
+        祖先节点已有的taint在其到达时已被传播过，因此每一层只向上传播本次新加入的taint，
+        没有新taint时提前结束，每个taint在每条父子边上至多传播一次
+        """
+        taints = list(self.node_taints.get(nid, ()))
+        while taints:
+            # 根据赋值目标将taint传播到变量表
+            targets = self.node_targets.get(nid)
+            if targets is not None:
+                for taint in taints:
+                    if taint.accordance == "type" and taint.type == "*":
+                        continue
+                    for target in targets:
+                        self._add_taint_to_var(target, taint)
+
+            # 切换到父命名空间/到达根节点结束传播
+            link = self.parents.get(nid)
+            if link is None:
+                return
+
+            # 向父节点传播污点，仅保留父节点新加入的taint继续向上传播
+            parent, lineno = link
+            parent_taints = self.node_taints.get(parent)
+            new_taints = []
+            for taint in taints:
+                if taint.accordance == "type" and taint.type == "*":
+                    continue
+                # 函数参数引入的taint不应在本行被传播，字符串常量上的literal taint即为常量的值，正常传播
+                elif (taint.position != "ret" or taint.keyword is not None) and taint.lineno == lineno \
+                        and taint.accordance != "literal":
+                    continue
+                if parent_taints is None or taint not in parent_taints:
+                    self._add_taint_to_node(parent, taint)
+                    parent_taints = self.node_taints[parent]
+                    new_taints.append(taint)
+
+            nid = parent
+            taints = new_taints
+
+    def check_taint(self, event):
+        """污点检测
+
+        调用可能抵达sink，根据规则检查sink参数携带的taint是否构成安全问题；
+        调用文件内定义的函数时根据摘要检查实参是否经形参到达函数内的sink
+        """
+        nid = event[1]
+        call = self.node_calls.get(nid)
+        if call is not None:
+            self._apply_summary(nid, *call)
+        sinks = self.node_sinks.get(nid)
+        if not sinks:
+            return
+        args, keywords = self.node_args[nid]
+        sinks = list(sinks)
+        taints = list()
+        for sink in sinks:
+            # 根据sink的实际参数位置检查该参数是否被污染
+            source = self._get_call_arg(args, keywords, sink.position, sink.keyword)
+            taints.append(self.get_node_taints(source[0]) if source is not None else None)
+        self._check_sinks(sinks, taints)
+
+    def _apply_summary(self, nid, summary, shift, args, keywords, external):
+        """根据摘要处理对文件内/项目内函数的调用
+
+        - 到达返回值的形参: 将对应实参的taint标记到调用节点并传播
+        - 到达sink的形参: 以对应实参的taint对函数内的sink进行检测，不检测实参隐式带有的"*"taint，
+            其他模块(external)中的sink以调用位置作为sink位置
+        """
+        added = False
+        for position, keyword in summary.param_returns:
+            source = self._get_call_arg(args, keywords, self._shift_position(position, shift), keyword)
+            if source is not None:
+                for taint in list(self.node_taints.get(source[0], ())):
+                    self._add_taint_to_node(nid, taint)
+                    added = True
+        for (position, keyword), sinks in summary.sinks.items():
+            source = self._get_call_arg(args, keywords, self._shift_position(position, shift), keyword)
+            if source is None:
+                continue
+            taints = list(self.node_taints.get(source[0], ()))
+            if taints:
+                if external:
+                    lineno, col_offset, end_lineno, end_col_offset = self.positions[nid]
+                    sinks = [dataclasses.replace(sink, lineno=lineno, col_offset=col_offset, end_lineno=end_lineno,
+                                                 end_col_offset=end_col_offset) for sink in sinks]
+                self._check_sinks(list(sinks), [taints] * len(sinks))
+        if added:
+            self.spread_taint(nid)
+
+    @staticmethod
+    def _shift_position(position, shift):
+        """形参位置转换为实参位置，通过self/cls调用方法时self/cls形参没有对应的实参"""
+        if position is None or position < shift:
+            return None
+        return position - shift
+
+    def _check_sinks(self, sinks, taints):
+        """根据规则检查sink参数携带的taint是否构成安全问题
+
+        taints[i]为sinks[i]参数携带的taint列表，参数不存在时为None。
+        参数带有正在生成摘要的函数的形参占位taint时，将sink记录到该函数的摘要中
+        """
+        # 根据匹配计划找出与节点sink相关的组合规则，按规则、sink规则、节点sink的顺序排列
+        sink_list = list()
+        for sink_idx, sink in enumerate(sinks):
+            for accordance in self.rule_index.sink_accordances:
+                for plan_sink in self.rule_index.composite_sinks.get((accordance, getattr(sink, accordance, None)), ()):
+                    sink_list.append((plan_sink.rule.order, plan_sink.sink_order, sink_idx, plan_sink, sink))
+        sink_list.sort(key=lambda s: s[:3])
+
+        if self._active:
+            for sink_idx in {s[2] for s in sink_list}:
+                for t in taints[sink_idx] or ():
+                    if t.accordance == "param" and t.function in self._active:
+                        self._active[t.function].sinks.setdefault((t.position, t.keyword), {}).setdefault(sinks[sink_idx])
+
+        # 根据函数的实际sink参数位置匹配taint规则
+        for _, sink_order, sink_idx, plan_sink, sink in sink_list:
+            rule = plan_sink.rule
+            node_taints = taints[sink_idx]
+            if node_taints is None:
+                continue
+
+            # 从节点属性中发现与规则匹配的taint，按taint规则、节点taint的顺序排列
+            taint_table = rule.matches[sink_order]
+            taint_list = list()
+            for taint_idx, t in enumerate(node_taints):
+                for accordance in rule.taint_accordances:
+                    for taint_order, severity, confidence in taint_table.get((accordance, getattr(t, accordance, None)), ()):
+                        taint_list.append((taint_order, taint_idx, severity, confidence, t))
+            taint_list.sort(key=lambda t: t[:2])
+
+            for _, _, severity, confidence, t in taint_list:
+                self.add_issue_to_result(
+                    prs_issue.Issue(
+                        id=rule.id,
+                        name=rule.name,
+                        taint=t,
+                        sink=sink,
+                        severity=severity,
+                        confidence=confidence,
+                        msg=rule.template.replace(
+                            "{SINK}", getattr(sink, sink.accordance)
+                        ).replace(
+                            "{TAINT}", getattr(t, t.accordance)
+                        ),
+                        file_path=self.filepath
+                    )
+                )
+
+        # TODO: 根据敏感函数顺序判断问题
+
+    def get_node_taints(self, nid):
+        """返回节点携带的全部taint
+
+        第一个为节点隐式带有的*(任意内容)taint，其后为self.node_taints中登记的taint
+        """
+        lineno, col_offset, end_lineno, end_col_offset = self.positions.get(nid, (-1, -1, -1, -1))
+        taints = [prs_issue.Taint(
+            id="0000",
+            accordance="type",
+            type="*",
+            lineno=lineno,
+            col_offset=col_offset,
+            end_lineno=end_lineno,
+            end_col_offset=end_col_offset,
+        )]
+        taints.extend(self.node_taints.get(nid, ()))
+        return taints
+
+    @staticmethod
+    def _get_call_arg(args, keywords, position, keyword):
+        """根据position, keyword获取调用参数的来源"""
+        if position is not None:
+            if len(args) > position:
+                return args[position]
+        if keyword is not None:
+            for k, source in keywords:
+                if k == keyword:
+                    return source
+        return None
+
+    def _add_taint_to_node(self, nid, taint: prs_issue.Taint):
+        """向self.node_taints中节点对应的taint集合添加taint"""
+        self.node_taints.setdefault(nid, {}).setdefault(taint)
+
+    def _add_taint_to_var(self, var, taint: prs_issue.Taint):
+        """向变量添加taint
+
+        从当前namespace开始向上遍历命名空间，向第一次遇到的variable中添加taint。
+        变量的taints与其他变量表共享时先复制，并使作用域内共享同一taints的变量(变量拷贝)继续共享复制结果
+        """
+        scope = self.scope.lookup(var)
+        if scope is None:
+            return
+        variables = scope.variables
+        variable = variables[var]
+        if variable.serial != scope.serial:
+            if taint in variable.taints:
+                return
+            shared = variable.taints
+            taints = dict(shared)
+            for name, item in variables.items():
+                if item.taints is shared:
+                    variables[name] = prs_scope.Variable(taints, item.value, item.variable, item.position, item.keyword,
+                                                         scope.serial)
+            variable = variables[var]
+        variable.taints.setdefault(taint)
+
+    def _add_taint_to_constant(self, constant, taint: prs_issue.Taint):
+        """向常量添加taint"""
+        self.constants.setdefault(constant, {"taints": {}})["taints"].setdefault(taint)
+
+    def _add_sensitive_operation(self, sensitive_type: str, taint: prs_issue.Taint):
+        """根据污点标记时发现的敏感行为类型标记顺序"""
+        if sensitive_type == "command-execution":
+            if self.command_execution_serial is None:
+                self.command_execution_serial = (self.sensitive_serial, taint)
+                self.sensitive_serial += 1
+        elif sensitive_type == "encoder":
+            if self.encoder_serial is None:
+                self.encoder_serial = (self.sensitive_serial, taint)
+                self.sensitive_serial += 1
+        elif sensitive_type == "decoder":
+            if self.decoder_serial is None:
+                self.decoder_serial = (self.sensitive_serial, taint)
+                self.sensitive_serial += 1
+        elif sensitive_type == "network-receiver":
+            if self.network_receiver_serial is None:
+                self.network_receiver_serial = (self.sensitive_serial, taint)
+                self.sensitive_serial += 1
+        elif sensitive_type == "network-sender":
+            if self.network_sender_serial is None:
+                self.network_sender_serial = (self.sensitive_serial, taint)
+                self.sensitive_serial += 1
+        elif sensitive_type == "sensitive-info-acquisition":
+            if self.sensitive_info_acquisition_serial is None:
+                self.sensitive_info_acquisition_serial = (self.sensitive_serial, taint)
+                self.sensitive_serial += 1
+        elif sensitive_type == "file-operation":
+            if self.file_operation_serial is None:
+                self.file_operation_serial = (self.sensitive_serial, taint)
+                self.sensitive_serial += 1
+
+    def add_issue_to_result(self, issue: prs_issue.Issue):
+        """向self.results中添加一条issue dict
+
+        以self.issues作为有序集合去重
+        """
+        if issue in self.issues:
+            return
+        self.issues[issue] = None
+        self.results.append(issue.dict())
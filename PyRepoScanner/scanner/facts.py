@@ -0,0 +1,184 @@
+"""
+文件事实
+
+TaintNodeVisitor遍历AST时不再直接应用规则，而是按访问顺序输出与规则无关的事实序列(FileFacts.events):
+- 调用: 解析出的函数全称及各参数的来源(变量名/属性全称/常量值)
+- 赋值: 赋值目标、变量拷贝、形参与del语句引起的变量表变化
+- 读取: 变量、属性全称与可能携带taint的常量，以及全部可能被literal规则匹配的字符串常量
+- 结构: 节点的父节点链与作用域的切换，用于污点沿父节点传播
+- 返回: 函数返回值对应的节点，用于生成函数摘要
+- 控制流: 各作用域内的基本块划分及基本块之间的控制流边，用于按控制流图进行不动点求值
+- 载荷: 参数均为静态值的解码调用解码出的Python源码的事实，见prs_decoder
+import信息另行记录。规则在单独的求值阶段(prs_evaluator.FactEvaluator)中作用于事实，
+事实以文件内容sha256为键保存在FactStore中，规则集变化后只需对保存的事实重新求值，无需重新读取与解析源码
+"""
+
+
+import os
+import time
+import zlib
+import marshal
+import logging
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Set
+
+
+LOGGER = logging.getLogger()
+FACTS_VERSION = 6       # 事实格式或抽取逻辑变化时递增，使旧事实失效
+
+# 事实序列中各事件的操作码，事件为以操作码开头的tuple
+CALL = 0        # (CALL, nid, function, args, keywords)     调用，args为参数来源，keywords为((keyword, 参数来源), ...)
+NAME = 1        # (NAME, nid, var)                 读取变量表中存在的变量
+ATTR = 2        # (ATTR, nid, attribute)           读取属性
+CONST = 3       # (CONST, nid, value)              读取曾作为调用参数的常量
+CHECK = 4       # (CHECK, nid)                     父节点离开时对调用进行污点检测
+ASSIGN = 5      # (ASSIGN, nid, targets)           节点(ast.Assign/ast.withitem)的赋值目标，目标变量被重置
+COPY = 6        # (COPY, src, dest)                变量拷贝，拷贝结果与原变量共享taints
+ARG = 7         # (ARG, var, position, keyword)    函数形参，带有input taint
+DEL = 8         # (DEL, var)                       删除变量
+SCOPE = 9       # (SCOPE, name, function)          进入子作用域，function表示子作用域是否为函数
+END_SCOPE = 10  # (END_SCOPE,)                     回到父作用域
+BLOCK = 11      # (BLOCK, bid)                     开始作用域内的基本块，直到下一个基本块/作用域结束，每个作用域以基本块开始
+RETURN = 12     # (RETURN, nid)                    函数返回，nid为ast.Return节点，返回值的taint传播到该节点
+LITERAL = 13    # (LITERAL, nid, index)            读取字符串常量，index为常量在FileFacts.literals中的下标
+
+# 调用参数来源的类型，参数来源为(nid, 类型, 值)
+SOURCE_OTHER = 0    # 其他表达式
+SOURCE_VAR = 1      # 变量名/属性全称
+SOURCE_CONST = 2    # 常量值
+
+
+@dataclass
+class FileFacts:
+    """单个文件的事实
+
+    节点以nid标识，只有读取/调用节点、调用参数节点及其祖先节点分配nid:
+    - parents: 读取/调用节点及其祖先节点 -> (父节点nid, 节点lineno)，污点沿此链向父节点传播，
+        父节点为ast.Module或发生命名空间切换时为None，表示停止传播
+    - positions: 调用、属性及调用参数节点的位置，用于生成taint/sink
+    - functions: 文件中解析出的全部函数调用全称
+    - flows: 基本块 -> 后继基本块列表，只包含分支、循环、异常处理等引起的控制流边，没有后继的基本块为作用域的出口
+    - literals: 文件中出现的字符串常量(不含文档字符串)，去重后按出现顺序排列，求值时一次性匹配literal规则
+    - payloads: (解码调用nid, 载荷的FileFacts)列表，载荷中的issue报告在解码调用处
+    """
+    events: List = field(default_factory=lambda: [])
+    functions: Set = field(default_factory=lambda: set())
+    parents: Dict = field(default_factory=lambda: dict())       # nid -> (parent nid, lineno) / None
+    positions: Dict = field(default_factory=lambda: dict())     # nid -> (lineno, col_offset, end_lineno, end_col_offset)
+    flows: Dict = field(default_factory=lambda: dict())         # bid -> [successor bid, ...]
+    imports: List = field(default_factory=lambda: [])
+    import_aliases: Dict = field(default_factory=lambda: dict())
+    literals: List = field(default_factory=lambda: [])
+    payloads: List = field(default_factory=lambda: [])          # [(nid, FileFacts), ...]
+
+    def to_bytes(self) -> bytes:
+        payloads = [(nid, payload.to_bytes()) for nid, payload in self.payloads]
+        return zlib.compress(marshal.dumps((FACTS_VERSION, self.events, self.functions, self.parents, self.positions,
+                                            self.flows, self.imports, self.import_aliases, self.literals, payloads)))
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """反序列化事实，格式版本不一致时返回None"""
+        version, *values = marshal.loads(zlib.decompress(data))
+        if version != FACTS_VERSION:
+            return None
+        events, functions, parents, positions, flows, imports, import_aliases, literals, payloads = values
+        return cls(events=events, functions=functions, parents=parents, positions=positions, flows=flows,
+                   imports=imports, import_aliases=import_aliases, literals=literals,
+                   payloads=[(nid, cls.from_bytes(payload)) for nid, payload in payloads])
+
+
+@dataclass
+class FactStore:
+    """基于SQLite的事实库
+
+    - facts: 文件内容sha256 -> 序列化的FileFacts，只保存完整抽取的事实
+    - files: 文件路径 -> (sha256, 有效代码行数, 项目)，记录最近一次扫描时文件对应的内容，用于不读取源码的重新求值；
+        项目为扫描时的项目根目录(目录或压缩包的虚拟根目录)，单独扫描的文件为其自身路径，跨模块分析只在同一项目内进行
+    """
+    path: str
+    _conn: Any = field(default=None, repr=False)
+    _pid: int = field(default=None, repr=False)
+
+    def __post_init__(self):
+        # 使用绝对路径，进程切换工作目录后仍访问同一数据库
+        self.path = os.path.abspath(self.path)
+
+    def _connect(self):
+        """获取数据库连接，fork出的子进程使用各自的连接"""
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+        store_dir = os.path.dirname(self.path)
+        if store_dir and not os.path.exists(store_dir):
+            os.makedirs(store_dir, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS facts ("
+                     "sha256 TEXT PRIMARY KEY, version INTEGER NOT NULL, value BLOB NOT NULL, created REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS files ("
+                     "path TEXT PRIMARY KEY, sha256 TEXT NOT NULL, lines INTEGER NOT NULL, scanned REAL NOT NULL, "
+                     "project TEXT NOT NULL DEFAULT '')")
+        # 旧版本的事实库没有project列，其中的文件记录的项目为空
+        if "project" not in {row[1] for row in conn.execute("PRAGMA table_info(files)")}:
+            conn.execute("ALTER TABLE files ADD COLUMN project TEXT NOT NULL DEFAULT ''")
+        conn.commit()
+        self._conn = conn
+        self._pid = os.getpid()
+        return conn
+
+    def get(self, sha256: str):
+        """查询文件内容对应的事实，不存在时返回None"""
+        try:
+            row = self._connect().execute("SELECT value FROM facts WHERE sha256 = ? AND version = ?",
+                                          (sha256, FACTS_VERSION)).fetchone()
+        except sqlite3.Error as e:
+            LOGGER.warning(f"fact store {self.path} get failed with: {e}")
+            return None
+        if row is None:
+            return None
+        return FileFacts.from_bytes(row[0])
+
+    def put(self, sha256: str, facts: FileFacts):
+        try:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO facts (sha256, version, value, created) VALUES (?, ?, ?, ?)",
+                         (sha256, FACTS_VERSION, facts.to_bytes(), time.time()))
+            conn.commit()
+        except sqlite3.Error as e:
+            LOGGER.warning(f"fact store {self.path} put failed with: {e}")
+
+    def record_file(self, file_path: str, sha256: str, lines: int, project: str = None):
+        """记录文件路径最近一次扫描时的内容sha256及所属项目，project为None时文件自成一个项目"""
+        try:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO files (path, sha256, lines, scanned, project) VALUES (?, ?, ?, ?, ?)",
+                         (file_path, sha256, lines, time.time(), file_path if project is None else project))
+            conn.commit()
+        except sqlite3.Error as e:
+            LOGGER.warning(f"fact store {self.path} record file failed with: {e}")
+
+    def iter_files(self, path_prefix: str = ""):
+        """按路径顺序返回以path_prefix开头的文件记录: (path, sha256, lines)"""
+        # 使用范围查询代替LIKE，路径中的"%"、"_"无需转义
+        rows = self._connect().execute(
+            "SELECT path, sha256, lines FROM files WHERE path >= ? AND path < ? ORDER BY path",
+            (path_prefix, path_prefix + "\U0010ffff")).fetchall()
+        return rows
+
+    def iter_projects(self, path_prefix: str = ""):
+        """按项目分组返回以path_prefix开头的文件记录: [(项目, [(path, sha256, lines), ...]), ...]
+
+        项目按首个文件的路径排序，项目为空的旧记录各自成为一个项目
+        """
+        projects = {}
+        for path, sha256, lines, project in self._connect().execute(
+                "SELECT path, sha256, lines, project FROM files WHERE path >= ? AND path < ? ORDER BY path",
+                (path_prefix, path_prefix + "\U0010ffff")):
+            projects.setdefault(project or path, []).append((path, sha256, lines))
+        return list(projects.items())
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
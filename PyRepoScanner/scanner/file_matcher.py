@@ -0,0 +1,121 @@
+"""
+文件选择规则匹配
+
+将file_rules中的规则编译为:
+- 精确匹配(match)使用集合查找
+- 正则匹配(regex)合并为每个位置一个组合正则表达式
+并缓存目录级别的判定结果，遍历目录时可以整体跳过不可能命中规则的子目录
+"""
+
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Set
+
+
+LOCATIONS = ("file_dir", "file_name", "file_path")
+
+
+def combine_regexes(regexes: List) -> List:
+    """将多个已编译的正则表达式合并
+
+    无分组且无额外flag的正则表达式合并为一个组合正则表达式，
+    含分组(可能存在反向引用/重名分组)或inline flag的正则表达式保持独立，以保证语义不变
+
+    :return: 合并后的正则表达式列表
+    """
+    simple = []
+    others = []
+    default_flags = re.compile("").flags
+    for regex in regexes:
+        if regex.groups == 0 and regex.flags == default_flags:
+            simple.append(regex.pattern)
+        else:
+            others.append(regex)
+    if len(simple) > 1:
+        return [re.compile("|".join(f"(?:{pattern})" for pattern in simple))] + others
+    if simple:
+        return [re.compile(simple[0])] + others
+    return others
+
+
+@dataclass
+class CompiledLocation:
+    """单个位置(file_dir/file_name/file_path)编译后的规则"""
+    match: Set = field(default_factory=lambda: set())
+    regex: List = field(default_factory=lambda: [])
+
+    def __call__(self, value: str) -> bool:
+        if value in self.match:
+            return True
+        for regex in self.regex:
+            if regex.search(value):
+                return True
+        return False
+
+    def __bool__(self):
+        return bool(self.match or self.regex)
+
+
+@dataclass
+class FileRuleMatcher:
+    """编译后的文件选择规则"""
+    file_dir: CompiledLocation = field(default_factory=lambda: CompiledLocation())
+    file_name: CompiledLocation = field(default_factory=lambda: CompiledLocation())
+    file_path: CompiledLocation = field(default_factory=lambda: CompiledLocation())
+    _dir_cache: Dict = field(default_factory=lambda: dict(), repr=False)        # 目录 -> 是否命中file_dir规则
+    _prune_cache: Dict = field(default_factory=lambda: dict(), repr=False)      # 目录 -> 是否可能存在需要检测的文件
+
+    @classmethod
+    def compile(cls, file_rules: dict):
+        """由PypiScanner.file_rules结构编译匹配器"""
+        return cls(**{
+            location: CompiledLocation(
+                match=set(file_rules[location]["match"]),
+                regex=combine_regexes(file_rules[location]["regex"]),
+            )
+            for location in LOCATIONS if location in file_rules
+        })
+
+    def clear_cache(self):
+        """清空目录判定缓存，每次扫描目录前调用，避免长期运行时缓存无限增长"""
+        self._dir_cache.clear()
+        self._prune_cache.clear()
+
+    def dir_selected(self, file_dir: str) -> bool:
+        """目录本身是否命中file_dir规则，命中时目录下所有.py文件都需要检测"""
+        decision = self._dir_cache.get(file_dir)
+        if decision is None:
+            decision = self._dir_cache[file_dir] = self.file_dir(file_dir)
+        return decision
+
+    def dir_may_match(self, dir_path: str) -> bool:
+        """目录及其子目录下是否可能存在需要检测的文件
+
+        存在file_name规则或正则规则时无法对目录做出判断，只能保守地返回True；
+        仅有精确匹配的file_dir/file_path规则时，目录需要是某条规则的目录本身或其上级目录
+        """
+        if self.file_name or self.file_dir.regex or self.file_path.regex:
+            return True
+        decision = self._prune_cache.get(dir_path)
+        if decision is None:
+            prefix = dir_path if dir_path.endswith(os.sep) else dir_path + os.sep
+            decision = self._prune_cache[dir_path] = \
+                any(match == dir_path or match.startswith(prefix) for match in self.file_dir.match) or \
+                any(match.startswith(prefix) for match in self.file_path.match)
+        return decision
+
+    def prune_dirs(self, home: str, dirs: List):
+        """原地移除os.walk中不可能命中规则的子目录"""
+        dirs[:] = [name for name in dirs if self.dir_may_match(os.path.join(home, name))]
+
+    def need_scan(self, file_dir: str, file_name: str) -> bool:
+        """检查文件是否需要被检测"""
+        if not file_name.endswith(".py"):
+            return False
+        if self.dir_selected(file_dir) or self.file_name(file_name):
+            return True
+        if self.file_path:
+            return self.file_path(os.path.join(file_dir, file_name))
+        return False
@@ -0,0 +1,97 @@
+"""
+文件读取阶段
+
+每个待检测文件只读取一次，在一次遍历中计算内容哈希、行数/有效代码行数以及预过滤命中，
+随后将结果交给AST解析阶段使用
+"""
+
+
+import mmap
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Set
+
+
+MMAP_THRESHOLD = 1 << 20        # 超过1MiB的文件使用mmap读取
+# 匹配一整行(含行尾换行符)，行首缩进后的第一个字符既非空白也非"#"时group(1)存在，即有效代码行
+# 换行符与bytes.splitlines一致: \r\n, \r, \n
+LINE_REGEX = re.compile(rb"[ \t\x0b\x0c]*([^\s#])?[^\r\n]*(?:\r\n|\r|\n|\Z)")
+
+
+@dataclass
+class FileIngestion:
+    """单个文件的读取结果"""
+    file_path: str
+    data: Any = None                # bytes / mmap.mmap，可直接交给ast.parse
+    size: int = 0
+    sha256: str = ""
+    lines: int = 0                  # 总行数
+    code_lines: int = 0             # 有效代码行数(非空且非注释)
+    prefilter_hits: Set = None      # 预过滤命中的标识符，未进行预过滤时为None
+    _mmap: Any = field(default=None, repr=False)
+
+    def close(self):
+        """释放文件内容，使用mmap读取时关闭映射"""
+        self.data = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+
+def count_lines(data):
+    """一次遍历统计总行数与有效代码行数
+
+    :param data: bytes或支持buffer协议的对象(如mmap)
+    :return: (lines, code_lines)
+    """
+    lines = 0
+    code_lines = 0
+    for m in LINE_REGEX.finditer(data):
+        # 文件末尾的空匹配不计为一行
+        if m.end() == m.start():
+            continue
+        lines += 1
+        if m.start(1) >= 0:
+            code_lines += 1
+    return lines, code_lines
+
+
+def ingest_bytes(file_path: str, data, prefilter: Callable = None) -> FileIngestion:
+    """对已在内存中的文件内容进行读取阶段的处理
+
+    :param file_path: 文件路径，仅用于标识
+    :param data: 文件内容
+    :param prefilter: 预过滤器，以文件内容为参数，返回命中的标识符集合
+    """
+    lines, code_lines = count_lines(data)
+    return FileIngestion(
+        file_path=file_path,
+        data=data,
+        size=len(data),
+        sha256=hashlib.sha256(data).hexdigest(),
+        lines=lines,
+        code_lines=code_lines,
+        prefilter_hits=prefilter(data) if prefilter is not None else None,
+    )
+
+
+def ingest_file(file_path: str, prefilter: Callable = None) -> FileIngestion:
+    """读取本地文件并完成读取阶段的处理
+
+    大文件使用mmap映射，避免复制整个文件内容，使用完毕后需调用FileIngestion.close()
+    """
+    with open(file_path, "rb") as f:
+        size = f.seek(0, 2)
+        f.seek(0)
+        if size < MMAP_THRESHOLD:
+            return ingest_bytes(file_path, f.read(), prefilter)
+
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        ingestion = ingest_bytes(file_path, m, prefilter)
+    except Exception:
+        m.close()
+        raise
+    ingestion._mmap = m
+    return ingestion
@@ -1,79 +1,107 @@
 import ast
+import hashlib
 import logging
-import astpretty
 from dataclasses import dataclass, field
-from typing import List, Set, Dict, Tuple
-import PyRepoScanner.utils.issue as prs_issue
+from typing import Any, List, Set, Dict
+import PyRepoScanner.scanner.budget as prs_budget
+import PyRepoScanner.scanner.decoder as prs_decoder
+import PyRepoScanner.scanner.evaluator as prs_evaluator
+import PyRepoScanner.scanner.facts as prs_facts
+import PyRepoScanner.scanner.rule_index as prs_rule_index
+import PyRepoScanner.scanner.scope as prs_scope
 
 
 LOGGER = logging.getLogger()
+_MISSING = object()
+_NO_MARKS = {}
+_DISPATCH_TABLES = {}       # visitor类 -> {ast节点类: visit方法}
+# 上下文与运算符节点没有子节点，也不产生任何事实，遍历时只计数
+_SKIPPED_NODE_CLASSES = frozenset(
+    cls for base in (ast.expr_context, ast.operator, ast.unaryop, ast.cmpop, ast.boolop)
+    for cls in base.__subclasses__()
+)
 
 
 @dataclass
 class TaintNodeVisitor:
-    """实现ast.NodeVisitor的Taint Analysis版"""
+    """实现ast.NodeVisitor的Taint Analysis版
+
+    遍历AST时只完成与规则无关的名称解析，按访问顺序输出文件事实(prs_facts.FileFacts)，
+    随后由prs_evaluator.FactEvaluator在事实上应用规则
+    """
     rules: dict = None
+    rule_index: prs_rule_index.RuleIndex = None     # 规则索引，由scanner按规则集构建一次后传入
     filepath: str = ""
+    guard: Any = None                                               # 预算检查器(prs_budget.BudgetGuard)，为None时不限制
+    package: Any = None                                             # 项目内模块摘要(prs_package.PackageContext)，为None时不进行跨模块分析
+    payload_depth: int = 0                                          # 载荷层数，遍历文件本身时为0，遍历解码出的载荷时递增
+    visited_nodes: int = 0                                          # 已访问的节点数
     imports: Set = field(default_factory=lambda: set())             # set(module)
     import_aliases: Dict = field(default_factory=lambda: dict())    # [from] import as alias -> module, function, class, variable, ...
-    variables: Dict = field(default_factory=lambda: dict())         # 变量表，以namespace为key维护命名空间内的变量
-    constants: Dict = field(default_factory=lambda: dict())         # 常量表，维护常量的taint情况
+    variables: Dict = field(default_factory=lambda: dict())         # 变量表，以namespace全称为key索引各作用域内的变量
     context: Dict = field(default_factory=lambda: dict())           # 用于在函数间传递信息
     depth: int = 0
-    namespace: str = None
-    namespace_list: List = field(default_factory=lambda: [])
-    # 污点传播不保证发现所有问题，结合敏感操作顺序也可以发现一些问题
-    sensitive_serial: int = 0            # 敏感行为序号
-    sensitive_info_acquisition_serial: Tuple = None
-    network_receiver_serial: Tuple = None
-    network_sender_serial: Tuple = None
-    file_operation_serial: Tuple = None
-    encoder_serial: Tuple = None
-    decoder_serial: Tuple = None
-    command_execution_serial: Tuple = None
+    scope: prs_scope.Scope = None                                   # 当前作用域，通过parent指针组成作用域链
+    facts: prs_facts.FileFacts = None                               # 抽取出的文件事实
+    evaluator: prs_evaluator.FactEvaluator = None
+    issues: Dict = field(default_factory=lambda: dict())            # 以dict作为有序集合，issue -> None
     results: List = field(default_factory=lambda: [])
+    # 抽取状态，文件遍历结束时释放
+    _module: bool = True                                            # 遍历的起始节点是否为ast.Module
+    _nid_count: int = 0
+    _arg_nids: Dict = field(default_factory=lambda: dict())         # 尚未访问的调用参数节点 -> 预先分配的nid
+    _arg_constants: Set = field(default_factory=lambda: set())      # 曾作为调用参数的常量值
+    _literal_indexes: Dict = field(default_factory=lambda: dict())  # 字符串常量 -> 在facts.literals中的下标
+    _stack: List = field(default_factory=lambda: [])                # 遍历栈，栈帧: [节点, 子节点列表, 下标, 作用域, nid, 子调用nid列表, 控制流动作]
+    # 控制流状态，进入子作用域时保存，回到父作用域时恢复
+    _block: int = None                                              # 当前基本块
+    _block_count: int = 0
+    _loops: List = field(default_factory=lambda: [])                # 循环栈: (循环头基本块, 循环之后的基本块)
+    _try_blocks: List = field(default_factory=lambda: [])           # try语句体内开始的基本块，每层try语句一个列表
+    _flow_stack: List = field(default_factory=lambda: [])           # 外层作用域的(_block, _loops, _try_blocks)
 
     def __post_init__(self):
+        # 未传入规则索引时根据rules自行构建
+        if self.rule_index is None:
+            self.rule_index = prs_rule_index.RuleIndex(self.rules)
         # 初始化namespace
-        self._add_name_to_namespace(self._get_namespace_from_filename(self.filepath))
+        self._push_scope(self._get_namespace_from_filename(self.filepath))
 
     def pre_visit(self, node):
+        """进入节点
+
+        每个节点初始都隐式带有*(任意内容)taint，不进行传播，仅在污点检测时按需生成，见prs_evaluator.FactEvaluator.get_node_taints
+        """
         self.depth += 1
-        node._prs_taints = []
-        node._prs_sinks = []
-        node._prs_namespace = self.namespace
-
-        # 每个节点初始都被赋予*(任意内容)taint
-        self._add_taint_to_node(node, prs_issue.Taint(
-            id="0000",
-            accordance="type",
-            type="*",
-            lineno=node.lineno if hasattr(node, "lineno") else -1,
-            col_offset=node.col_offset if hasattr(node, "col_offset") else -1,
-            end_lineno=node.end_lineno if hasattr(node, "end_lineno") else -1,
-            end_col_offset=node.end_col_offset if hasattr(node, "end_col_offset") else -1
-        ))
 
     def visit(self, node):
-        """visit指定node，根据node类型决定具体的visit方法"""
-        # print(self.depth)
-        # print(ast.dump(node))
-        name = node.__class__.__name__
-        method = "visit_" + name
-        visitor = getattr(self, method, None)
+        """visit指定node，根据node类型从分派表中获取具体的visit方法"""
+        visitor = self._get_dispatch_table().get(node.__class__, _MISSING)
+        if visitor is _MISSING:
+            visitor = self._add_to_dispatch_table(node.__class__)
         if visitor is not None:
-            visitor(node)
+            visitor(self, node)
         else:
-            # print(f"not support access node {id(node)} type {name} temporarily")
-            LOGGER.debug(f"not support access node {id(node)} type {name} temporarily")
-            # self.update_scores(self.tester.run_tests(self.context, name))
-            # astpretty.pprint(node, show_offsets=False)
+            LOGGER.debug("not support access node %s type %s temporarily", id(node), node.__class__.__name__)
+
+    def _get_dispatch_table(self):
+        """获取当前visitor类的分派表: ast节点类 -> visit方法(未实现时为None)
+
+        分派表按visitor类缓存，每个ast节点类只解析一次visit方法
+        """
+        return _DISPATCH_TABLES.setdefault(self.__class__, {})
+
+    def _add_to_dispatch_table(self, node_class):
+        """解析ast节点类对应的visit方法并加入分派表"""
+        visitor = getattr(self.__class__, "visit_" + node_class.__name__, None)
+        self._get_dispatch_table()[node_class] = visitor
+        return visitor
 
     def post_visit(self, node):
         self.depth -= 1
         # 检查并消掉本层namespace
         if isinstance(node, (ast.ClassDef, ast.FunctionDef)):
-            self._pop_name_from_namespace()
+            self._pop_scope()
 
     def visit_Import(self, node):
         """访问ast.Import节点"""
@@ -101,7 +129,7 @@ class TaintNodeVisitor:
 
         将class name添加到namespace
         """
-        self._add_name_to_namespace(node.name)
+        self._push_scope(node.name)
 
     def visit_FunctionDef(self, node):
         """访问ast.FunctionDef节点
@@ -110,7 +138,7 @@ class TaintNodeVisitor:
         分析函数体内部的数据流，对函数传入参数/内部执行过程/返回内容做
         """
         self.context["function_def"] = node
-        self._add_name_to_namespace(node.name)
+        self._push_scope(node.name, function=True)
 
         # 处理函数的形参
         self._handle_functiondef_arguments(node)
@@ -123,29 +151,30 @@ class TaintNodeVisitor:
         self.context["assign"] = node
         targets = self.get_assign_targets(node)
         self.context["assign_targets"] = targets
-        # 将targets附加在node上
-        node._prs_assign_targets = targets
+        # 记录赋值目标，用于污点传播时向变量传播
+        if targets:
+            self._add_event(prs_facts.ASSIGN, self._get_nid(self._stack[-1]), tuple(targets))
 
         # 当赋值发生后，变量在当前命名空间之前的属性失去意义
-        for target_name in node._prs_assign_targets:
-            self.variables[self.namespace][target_name] = {"taints": []}
+        for target_name in targets:
+            self.scope.variables[target_name] = prs_scope.Variable()
 
         # 根据等号右侧(node.value)节点类型做出相应改变
         # 常量赋值直接记录到表
         if isinstance(node.value, ast.Constant):
             value = node.value.value
-            for target_name in node._prs_assign_targets:
-                self.variables[self.namespace][target_name]["value"] = value
+            for target_name in targets:
+                self.scope.variables[target_name].value = value
         # 变量赋值尝试get常量/指向的根variable 记录到表
         elif isinstance(node.value, ast.Name):
             value = self._get_value_by_var_id(node.value.id)
             if value is not None:
-                for target_name in node._prs_assign_targets:
-                    self.variables[self.namespace][target_name]["value"] = value
+                for target_name in targets:
+                    self.scope.variables[target_name].value = value
             else:
                 # node.value(等号右侧变量)无value记录，检查是否存在，如果存在进行硬拷贝
                 copy_flag = True
-                for target_name in node._prs_assign_targets:
+                for target_name in targets:
                     if not self._copy_var_to_var(node.value.id, target_name):
                         copy_flag = False
                         break
@@ -153,13 +182,20 @@ class TaintNodeVisitor:
                 if not copy_flag:
                     variable = self._get_variable_by_var_id(node.value.id)
                     if variable is not None:
-                        for target_name in node._prs_assign_targets:
-                            self.variables[self.namespace][target_name]["variable"] = variable
+                        for target_name in targets:
+                            self.scope.variables[target_name].variable = variable
         # attribute赋值尝试获取attribute的完整值，记录到表variable内容
         elif isinstance(node.value, ast.Attribute):
             attribute = self._get_attr_real_name(node.value)
-            for target_name in node._prs_assign_targets:
-                self.variables[self.namespace][target_name]["variable"] = attribute
+            for target_name in targets:
+                self.scope.variables[target_name].variable = attribute
+        # 解码调用、拼接、下标等表达式尝试静态求值，记录到表，不对解包赋值求值
+        elif isinstance(node.value, (ast.Call, ast.BinOp, ast.Subscript)) and \
+                all(isinstance(target, ast.Name) for target in node.targets):
+            value = self._get_static_value(node.value)
+            if value is not None:
+                for target_name in targets:
+                    self.scope.variables[target_name].value = value
 
     def visit_Call(self, node):
         """访问ast.Call节点
@@ -170,26 +206,44 @@ class TaintNodeVisitor:
         # astpretty.pprint(node, show_offsets=False)
         self.context["call"] = node
         real_call = self.get_real_call(node)
-
-        node._prs_call_func = real_call
         self.context["call_func"] = real_call
+        if not real_call:
+            return
 
-        self.mark_spread_taint(node)
+        # 记录调用及各参数的来源，参数节点在访问前预先分配nid
+        nid = self._link_parents()
+        self._add_position(nid, node)
+        args = tuple(self._get_arg_source(arg) for arg in node.args)
+        keywords = tuple((keyword.arg, self._get_arg_source(keyword.value)) for keyword in node.keywords)
+        self._add_event(prs_facts.CALL, nid, real_call, args, keywords)
+        self.facts.functions.add(real_call)
+        # 父节点离开时对调用进行污点检测
+        self._stack[-2][5].append(nid)
+        # 参数均为静态值的解码调用，解码出的Python源码作为载荷抽取事实
+        if real_call in prs_decoder.DECODERS and self.payload_depth < prs_decoder.MAX_PAYLOAD_DEPTH:
+            self._add_payload(nid, node)
 
     def visit_Subscript(self, node):
-        """访问ast.Subscript节点"""
-        if isinstance(node.value, ast.Attribute):
-            target = self._get_attr_real_name(node.value)
-            node._prs_subscript_target = target
-        elif isinstance(node.value, ast.Name):
-            node._prs_subscript_target = node.value.id
+        """在其他节点中处理"""
+        pass
 
     def visit_Constant(self, node):
         """访问ast.Constant节点
 
-        从常量表中获取taint添加到节点
+        只有曾作为调用参数的常量可能被规则污染，记录对这些常量的读取；
+        字符串常量另行记录，求值时由literal规则匹配，文档字符串等单独成句的常量不会流向任何位置，不记录
         """
-        self.mark_spread_taint(node)
+        value = node.value
+        if value in self._arg_constants:
+            self._add_event(prs_facts.CONST, self._link_parents(), value)
+        if value.__class__ is str and value and not isinstance(self._stack[-2][0], ast.Expr):
+            nid = self._link_parents()
+            self._add_position(nid, node)
+            index = self._literal_indexes.get(value)
+            if index is None:
+                index = self._literal_indexes[value] = len(self.facts.literals)
+                self.facts.literals.append(value)
+            self._add_event(prs_facts.LITERAL, nid, index)
 
     def visit_Tuple(self, node):
         """在其他节点中处理"""
@@ -212,12 +266,16 @@ class TaintNodeVisitor:
 
         根据node.ctx不同，进行不同处理:
 
-        - ast.Load: 根据变量表中记载，将变量taint附加到节点上
+        - ast.Load: 变量存在于变量表中(或位于循环中)时记录读取，求值时将变量taint附加到节点上；
+            从其他模块导入的名称同样记录读取，扫描项目时由项目内模块的摘要提供taint
         - ast.Store: 不进行任何操作
         - ast.Del: 将变量从变量表中删除
         """
         if isinstance(node.ctx, ast.Load):
-            self.mark_spread_taint(node)
+            # 循环中的变量可能在之后的语句中才被赋值，经循环回边流入
+            if self.scope.lookup(node.id) is not None or self._loops or node.id in self.import_aliases \
+                    or "*" in self.import_aliases:
+                self._add_event(prs_facts.NAME, self._link_parents(), node.id)
         elif isinstance(node.ctx, ast.Store):
             pass
         elif isinstance(node.ctx, ast.Del):
@@ -250,12 +308,12 @@ class TaintNodeVisitor:
     def visit_Attribute(self, node):
         """访问ast.Attribute节点
 
-        解析Attribute全称，赋值到_prs_attribute
+        解析Attribute全称，记录读取
         """
-        node._prs_attribute = self._get_attr_real_name(node)
-
         if isinstance(node.ctx, ast.Load):
-            self.mark_spread_taint(node)
+            nid = self._link_parents()
+            self._add_position(nid, node)
+            self._add_event(prs_facts.ATTR, nid, self._get_attr_real_name(node))
 
     def visit_arguments(self, node):
         """"""
@@ -270,15 +328,168 @@ class TaintNodeVisitor:
 
         将optional_vars加入变量表
         """
-        node._prs_withitem_target = None
         if isinstance(node.optional_vars, ast.Name):
             if isinstance(node.optional_vars.ctx, ast.Store):
-                self.variables[self.namespace][node.optional_vars.id] = {"taints": []}
-                node._prs_withitem_target = node.optional_vars.id
+                self._add_event(prs_facts.ASSIGN, self._get_nid(self._stack[-1]), (node.optional_vars.id,))
+                self.scope.variables[node.optional_vars.id] = prs_scope.Variable()
 
     def visit_If(self, node):
-        """在其他节点中处理"""
-        pass
+        """访问ast.If节点
+
+        条件所在的基本块分别流向条件为真/假的分支，两个分支在语句之后汇合
+        """
+        test = body = None
+
+        def enter_body():
+            nonlocal test
+            test = self._end_test()
+            self._start_block((test,))
+
+        def enter_orelse():
+            nonlocal body
+            body = self._block
+            self._start_block((test,))
+
+        def leave():
+            self._start_block((body, self._block) if node.orelse else (self._block, test))
+
+        marks = {1: enter_body}
+        if node.orelse:
+            marks[1 + len(node.body)] = enter_orelse
+        self._stack[-1][6] = (marks, leave)
+
+    def visit_While(self, node):
+        """访问ast.While节点，见_set_loop_flow"""
+        self._set_loop_flow(node, 1)
+
+    def visit_For(self, node):
+        """访问ast.For节点，见_set_loop_flow"""
+        self._set_loop_flow(node, 2)
+
+    visit_AsyncFor = visit_For
+
+    def visit_Try(self, node):
+        """访问ast.Try节点
+
+        try语句体内的每条语句单独开始基本块，任何基本块都可能流向各except分支，语句体正常结束时进入else分支；
+        有finally时各分支及未被捕获的异常都流向finally，最后在语句之后汇合
+        """
+        section = None
+        raising = ends = ()
+        body = None
+
+        def close_section():
+            nonlocal raising, ends, body
+            if section == "body":
+                raising = self._try_blocks.pop()
+                # 内层try语句体内的异常也可能被外层try捕获
+                if self._try_blocks:
+                    self._try_blocks[-1].extend(raising)
+                body = self._block
+                ends = [] if node.orelse else [body]
+            elif section is not None:
+                ends.append(self._block)
+
+        def enter_body():
+            nonlocal section
+            section = "body"
+            self._try_blocks.append([self._block])
+            self._start_block((self._block,))
+
+        def enter_statement():
+            self._start_block((self._block,))
+
+        def enter_handler():
+            nonlocal section
+            close_section()
+            section = "handler"
+            self._start_block(raising)
+
+        def enter_orelse():
+            nonlocal section
+            close_section()
+            section = "orelse"
+            self._start_block((body,))
+
+        def enter_finalbody():
+            nonlocal section
+            close_section()
+            section = "finalbody"
+            self._start_block(tuple(ends) + tuple(raising))
+
+        def leave():
+            if section != "finalbody":
+                close_section()
+                self._start_block(ends)
+            else:
+                self._start_block((self._block,))
+
+        marks = {0: enter_body}
+        for idx in range(1, len(node.body)):
+            marks[idx] = enter_statement
+        idx = len(node.body)
+        for _ in node.handlers:
+            marks[idx] = enter_handler
+            idx += 1
+        if node.orelse:
+            marks[idx] = enter_orelse
+            idx += len(node.orelse)
+        if node.finalbody:
+            marks[idx] = enter_finalbody
+        self._stack[-1][6] = (marks, leave)
+
+    visit_TryStar = visit_Try
+
+    def visit_Match(self, node):
+        """访问ast.Match节点
+
+        匹配对象所在的基本块流向各case分支，未匹配任何case时直接流向语句之后
+        """
+        subject = None
+        ends = []
+
+        def enter_case():
+            nonlocal subject
+            if subject is None:
+                subject = self._end_test()
+            else:
+                ends.append(self._block)
+            self._start_block((subject,))
+
+        def leave():
+            ends.append(self._block)
+            ends.append(subject)
+            self._start_block(ends)
+
+        self._stack[-1][6] = ({1 + idx: enter_case for idx in range(len(node.cases))}, leave)
+
+    def visit_Return(self, node):
+        """访问ast.Return节点，返回值求值后记录返回，控制流离开作用域，之后的代码不可达"""
+        frame = self._stack[-1]
+
+        def leave():
+            # 返回值中存在读取/调用时节点才会分配nid，否则返回值不可能携带taint
+            if frame[4] is not None:
+                self._add_event(prs_facts.RETURN, frame[4])
+            self._end_block()
+
+        frame[6] = (_NO_MARKS, leave)
+
+    def visit_Raise(self, node):
+        """访问ast.Raise节点，控制流离开作用域，之后的代码不可达"""
+        self._stack[-1][6] = (_NO_MARKS, self._end_block)
+
+    def visit_Break(self, node):
+        """访问ast.Break节点，流向循环之后的基本块"""
+        if self._loops:
+            self._add_flow(self._block, self._loops[-1][1])
+        self._end_block()
+
+    def visit_Continue(self, node):
+        """访问ast.Continue节点，流向循环头"""
+        if self._loops:
+            self._add_flow(self._block, self._loops[-1][0])
+        self._end_block()
 
     def visit_Compare(self, node):
         """在其他节点中处理"""
@@ -289,37 +500,358 @@ class TaintNodeVisitor:
         pass
 
     def generic_visit(self, node):
-        """驱动visitor递归访问所有ast节点
+        """驱动visitor访问所有ast节点，抽取文件事实并按规则求值，检测结果保存在self.results中
 
-        从ast.parse返回的第一个ast.Module节点开始
+        超出预算中止抽取时，对已抽取的事实进行求值后再抛出BudgetExceeded，保留中止前可以发现的issue
         """
-        # 第一轮访问
-        # 进行污点标记和污点传播
-        for field, value in ast.iter_fields(node):
-            if isinstance(value, list):
-                for idx, item in enumerate(value):
-                    if isinstance(item, ast.AST):
-                        self.pre_visit(item)
-                        item._prs_parent = node
-                        self.visit(item)
-                        self.generic_visit(item)
-                        self.post_visit(item)
-            elif isinstance(value, ast.AST):
-                self.pre_visit(value)
-                value._prs_parent = node
-                self.visit(value)
-                self.generic_visit(value)
-                self.post_visit(value)
-
-        # 第二轮访问
-        # 进行污点分析，taint-sink匹配
-        for field, value in ast.iter_fields(node):
+        try:
+            self.extract(node)
+        except prs_budget.BudgetExceeded:
+            self.evaluate(guard=None)
+            raise
+        self.evaluate(guard=self.guard)
+
+    def extract(self, node):
+        """遍历AST，抽取与规则无关的文件事实
+
+        从ast.parse返回的第一个ast.Module节点开始，以显式栈代替递归，可处理任意嵌套深度:
+
+        - 进入节点: pre_visit，入栈(栈帧记录节点所属作用域)，调用对应的visit方法
+        - 离开节点: 为其子节点中的调用记录CHECK事件，随后post_visit
+
+        分支、循环等复合语句在visit方法中为栈帧登记控制流动作，在进入特定子节点前及离开节点时划分基本块。
+
+        节点的父节点即栈中的上一帧，遍历结束后释放抽取状态。
+        设置了guard时每访问CHECK_INTERVAL个节点检查一次预算，超出时抛出BudgetExceeded，已抽取的事实保留在self.facts中
+
+        :return: prs_facts.FileFacts
+        """
+        self.facts = prs_facts.FileFacts()
+        events = self.facts.events
+        dispatch_table = self._get_dispatch_table()
+        stack = self._stack
+        stack.append([node, self._get_child_nodes(node), 0, self.scope, None, [], None])
+        self._module = isinstance(node, ast.Module)
+        self._start_block(())
+        guard = self.guard
+        try:
+            while stack:
+                frame = stack[-1]
+                parent, children, idx, _, _, calls, flow = frame
+                # 进入下一个子节点
+                if idx < len(children):
+                    frame[2] = idx + 1
+                    if flow is not None and idx in flow[0]:
+                        flow[0][idx]()
+                    item = children[idx]
+                    self.visited_nodes += 1
+                    if guard is not None and self.visited_nodes % prs_budget.CHECK_INTERVAL == 0:
+                        guard.check(self.visited_nodes)
+                    if item.__class__ in _SKIPPED_NODE_CLASSES:
+                        continue
+                    self.pre_visit(item)
+                    stack.append([item, self._get_child_nodes(item), 0, self.scope,
+                                  self._arg_nids.pop(item, None) if self._arg_nids else None, [], None])
+                    visitor = dispatch_table.get(item.__class__, _MISSING)
+                    if visitor is _MISSING:
+                        visitor = self._add_to_dispatch_table(item.__class__)
+                    if visitor is not None:
+                        visitor(self, item)
+                    else:
+                        LOGGER.debug("not support access node %s type %s temporarily", id(item), item.__class__.__name__)
+                # 子节点全部访问完毕，离开当前节点
+                else:
+                    stack.pop()
+                    for nid in calls:
+                        events.append((prs_facts.CHECK, nid))
+                    if flow is not None:
+                        flow[1]()
+                    # 起始节点不经过pre_visit，也不进行post_visit
+                    if stack:
+                        self.post_visit(parent)
+        finally:
+            self.facts.imports = sorted(self.imports)
+            self.facts.import_aliases = dict(self.import_aliases)
+            self.release()
+        return self.facts
+
+    def evaluate(self, guard: prs_budget.BudgetGuard = None):
+        """使用规则索引对抽取出的事实求值
+
+        :return: issue列表
+        """
+        self.evaluator = prs_evaluator.FactEvaluator(rule_index=self.rule_index, filepath=self.filepath, guard=guard,
+                                                     package=self.package, issues=self.issues, results=self.results)
+        return self.evaluator.evaluate(self.facts)
+
+    def release(self):
+        """释放抽取状态，解除对ast节点的引用"""
+        self._arg_nids.clear()
+        self._arg_constants.clear()
+        self._literal_indexes.clear()
+        self._stack.clear()
+        self._loops.clear()
+        self._try_blocks.clear()
+        self._flow_stack.clear()
+        for key in ("function_def", "assign", "call"):
+            self.context.pop(key, None)
+
+    def _new_nid(self):
+        self._nid_count += 1
+        return self._nid_count
+
+    def _get_nid(self, frame):
+        """获取栈帧对应节点的nid，首次获取时分配"""
+        nid = frame[4]
+        if nid is None:
+            nid = frame[4] = self._new_nid()
+        return nid
+
+    def _link_parents(self):
+        """为当前节点登记到传播终点的父节点链，返回当前节点的nid
+
+        父节点为ast.Module(或遍历的起始节点)、父节点发生命名空间切换时停止传播，登记为None；
+        已登记的节点其祖先也已登记，每个节点只登记一次
+        """
+        stack = self._stack
+        parents = self.facts.parents
+        nid = self._get_nid(stack[-1])
+        level = len(stack) - 1
+        child = nid
+        while level > 0 and child not in parents:
+            frame = stack[level]
+            parent_frame = stack[level - 1]
+            if level == 1 and self._module or frame[3] is not parent_frame[3]:
+                parents[child] = None
+                break
+            parent = self._get_nid(parent_frame)
+            parents[child] = (parent, getattr(frame[0], "lineno", None))
+            child = parent
+            level -= 1
+        return nid
+
+    def _new_block(self):
+        self._block_count += 1
+        return self._block_count
+
+    def _start_block(self, preds, bid=None):
+        """结束当前基本块，开始新的基本块
+
+        :param preds: 新基本块的前驱基本块，为空时新基本块不可达(或为作用域入口)
+        :param bid: 预先分配的基本块，为None时分配新的基本块
+        """
+        if bid is None:
+            bid = self._new_block()
+        for pred in preds:
+            self._add_flow(pred, bid)
+        if self._try_blocks:
+            self._try_blocks[-1].append(bid)
+        self._add_event(prs_facts.BLOCK, bid)
+        self._block = bid
+        return bid
+
+    def _end_block(self):
+        """控制流离开当前基本块后(return/raise/break/continue)，开始没有前驱的基本块"""
+        self._start_block(())
+
+    def _add_flow(self, src, dest):
+        successors = self.facts.flows.setdefault(src, [])
+        if dest not in successors:
+            successors.append(dest)
+
+    def _end_test(self):
+        """结束条件/匹配对象所在的基本块并返回该基本块
+
+        其中的调用在进入分支前完成污点检测，使污点检测与调用位于同一基本块
+        """
+        frame = self._stack[-1]
+        for nid in frame[5]:
+            self._add_event(prs_facts.CHECK, nid)
+        frame[5].clear()
+        return self._block
+
+    def _set_loop_flow(self, node, body_idx):
+        """为循环语句(ast.While/ast.For)登记控制流
+
+        条件/迭代对象位于单独的循环头基本块，循环体结束及continue时回到循环头，
+        循环头流向else分支(没有else时流向循环之后)，break流向循环之后
+
+        :param body_idx: 循环体第一条语句在子节点中的下标
+        """
+        header = after = None
+
+        def enter_header():
+            nonlocal header, after
+            header = self._start_block((self._block,))
+            after = self._new_block()
+
+        def enter_body():
+            self._end_test()
+            self._loops.append((header, after))
+            self._start_block((header,))
+
+        def enter_orelse():
+            self._add_flow(self._block, header)
+            self._loops.pop()
+            self._start_block((header,))
+
+        def leave():
+            if node.orelse:
+                self._start_block((self._block,), after)
+            else:
+                self._add_flow(self._block, header)
+                self._loops.pop()
+                self._start_block((header,), after)
+
+        marks = {0: enter_header, body_idx: enter_body}
+        if node.orelse:
+            marks[body_idx + len(node.body)] = enter_orelse
+        self._stack[-1][6] = (marks, leave)
+
+    def _add_event(self, *event):
+        self.facts.events.append(event)
+
+    def _add_position(self, nid, node):
+        """记录节点位置，用于生成taint/sink"""
+        self.facts.positions[nid] = (getattr(node, "lineno", -1), getattr(node, "col_offset", -1),
+                                     getattr(node, "end_lineno", -1), getattr(node, "end_col_offset", -1))
+
+    def _get_arg_source(self, node):
+        """返回调用参数的来源(nid, 类型, 值)
+
+        - ast.Name: 变量名
+        - ast.Attribute: 属性全称
+        - ast.Constant: 常量值
+        """
+        nid = self._new_nid()
+        self._arg_nids[node] = nid
+        self._add_position(nid, node)
+        if isinstance(node, ast.Name):
+            return nid, prs_facts.SOURCE_VAR, node.id
+        elif isinstance(node, ast.Attribute):
+            return nid, prs_facts.SOURCE_VAR, self._get_attr_real_name(node)
+        elif isinstance(node, ast.Constant):
+            self._arg_constants.add(node.value)
+            return nid, prs_facts.SOURCE_CONST, node.value
+        return nid, prs_facts.SOURCE_OTHER, None
+
+    def _add_payload(self, nid, node):
+        """静态解码ast.Call节点，结果为Python源码时抽取载荷的事实，登记到解码调用nid下
+
+        载荷事实与规则无关，以sha256(载荷层数, 载荷源码)为键缓存在prs_decoder.PAYLOADS中，
+        同一载荷在进程内只解析、抽取一次，多处出现时共享事实；抽取超出预算时不缓存
+        """
+        source = prs_decoder.payload_source(self._get_static_value(node))
+        if source is None:
+            return
+        key = hashlib.sha256(f"{self.payload_depth}:{source}".encode("utf-8", "surrogatepass")).digest()
+        facts = prs_decoder.PAYLOADS.get(key, _MISSING)
+        if facts is _MISSING:
+            facts = None
+            tree = prs_decoder.parse_payload(source)
+            if tree is not None:
+                visitor = TaintNodeVisitor(rule_index=self.rule_index, filepath=self.filepath, guard=self.guard,
+                                           payload_depth=self.payload_depth + 1)
+                try:
+                    facts = visitor.extract(tree)
+                finally:
+                    self.visited_nodes += visitor.visited_nodes
+            prs_decoder.PAYLOADS.put(key, facts, len(source))
+        if facts is not None:
+            self.facts.payloads.append((nid, facts))
+
+    def _get_static_value(self, node, depth=0):
+        """对表达式静态求值，无法求值时返回None，不执行任何被扫描的代码
+
+        - ast.Constant/ast.Name: 常量值/变量表中记录的静态值
+        - ast.UnaryOp: 整数取负
+        - ast.BinOp: 同类型str/bytes的拼接
+        - ast.Subscript: 以静态下标/切片索引str/bytes/tuple, e.g. "..."[::-1]
+        - ast.Call: 参数均为静态值的解码函数调用及bytes.decode/str.encode，见prs_decoder.decode
+
+        :return: 静态值(基本数据类型)/None
+        """
+        if isinstance(node, ast.Constant):
+            return node.value
+        elif isinstance(node, ast.Name):
+            return self._get_value_by_var_id(node.id)
+        if depth >= prs_decoder.MAX_DECODE_DEPTH:
+            return None
+        depth += 1
+        if isinstance(node, ast.UnaryOp):
+            value = self._get_static_value(node.operand, depth)
+            if isinstance(node.op, ast.USub) and type(value) is int:
+                return -value
+        elif isinstance(node, ast.BinOp):
+            if not isinstance(node.op, ast.Add):
+                return None
+            left = self._get_static_value(node.left, depth)
+            right = self._get_static_value(node.right, depth)
+            if isinstance(left, (str, bytes)) and type(left) is type(right) \
+                    and len(left) + len(right) <= prs_decoder.MAX_INPUT_SIZE:
+                return left + right
+        elif isinstance(node, ast.Subscript):
+            value = self._get_static_value(node.value, depth)
+            if not isinstance(value, (str, bytes, tuple)):
+                return None
+            if isinstance(node.slice, ast.Slice):
+                bounds = []
+                for item in (node.slice.lower, node.slice.upper, node.slice.step):
+                    bound = None if item is None else self._get_static_value(item, depth)
+                    if item is not None and type(bound) is not int:
+                        return None
+                    bounds.append(bound)
+                index = slice(*bounds)
+            else:
+                index = self._get_static_value(node.slice, depth)
+                if type(index) is not int:
+                    return None
+            try:
+                return value[index]
+            except (IndexError, ValueError):
+                return None
+        elif isinstance(node, ast.Call):
+            if any(isinstance(arg, ast.Starred) for arg in node.args) or \
+                    any(keyword.arg is None for keyword in node.keywords):
+                return None
+            function = self.get_real_call(node)
+            args = ()
+            if function not in prs_decoder.DECODERS:
+                # 静态值上的方法调用，接收者作为第一个参数
+                if not isinstance(node.func, ast.Attribute) or node.func.attr not in prs_decoder.METHODS:
+                    return None
+                function = "." + node.func.attr
+                receiver = self._get_static_value(node.func.value, depth)
+                if receiver is None:
+                    return None
+                args = (receiver,)
+            for arg in node.args:
+                value = self._get_static_value(arg, depth)
+                if value is None:
+                    return None
+                args += (value,)
+            keywords = ()
+            for keyword in node.keywords:
+                value = self._get_static_value(keyword.value, depth)
+                if value is None:
+                    return None
+                keywords += ((keyword.arg, value),)
+            return prs_decoder.decode(function, args, keywords)
+        return None
+
+    @staticmethod
+    def _get_child_nodes(node):
+        """按字段顺序返回节点的全部直接子节点"""
+        children = []
+        for name in node._fields:
+            value = getattr(node, name, None)
             if isinstance(value, list):
-                for idx, item in enumerate(value):
+                for item in value:
                     if isinstance(item, ast.AST):
-                        self.check_taint(item)
+                        children.append(item)
             elif isinstance(value, ast.AST):
-                self.check_taint(value)
+                children.append(value)
+        return children
 
     def analyze(self, node):
         self.generic_visit(node)
@@ -328,41 +860,26 @@ class TaintNodeVisitor:
         """处理ast.FunctionDef节点的形参
 
         将形参加入当前namespace的变量表，并添加相关信息，
-        目前仅处理posonlyargs, args, kwonlyargs
+        目前仅处理posonlyargs, args, kwonlyargs，形参带有input taint
         """
         arguments = node.args
         pos = 0
         # 仅凭位置传递的参数
         # def test_func(a, b, /, c) => a,b仅可以通过位置传递
         for arg in arguments.posonlyargs:
-            self.variables[self.namespace][arg.arg] = {"taints": [], "position": pos}
+            self.scope.variables[arg.arg] = prs_scope.Variable(position=pos)
+            self._add_event(prs_facts.ARG, arg.arg, pos, None)
             pos += 1
-            self._add_taint_to_var(
-                arg.arg,
-                prs_issue.Taint(
-                    id="0000", accordance="type", type="input"
-                )
-            )
         # 位置/关键字均可传递的参数
         for arg in arguments.args:
-            self.variables[self.namespace][arg.arg] = {"taints": [], "position": pos, "keyword": arg.arg}
+            self.scope.variables[arg.arg] = prs_scope.Variable(position=pos, keyword=arg.arg)
+            self._add_event(prs_facts.ARG, arg.arg, pos, arg.arg)
             pos += 1
-            self._add_taint_to_var(
-                arg.arg,
-                prs_issue.Taint(
-                    id="0000", accordance="type", type="input"
-                )
-            )
         # 仅凭关键字传递的参数
         # def test_func(a, *args, b, c, **kwargs) => b,c仅可以通过关键字传递
         for arg in arguments.kwonlyargs:
-            self.variables[self.namespace][arg.arg] = {"taints": [], "keyword": arg.arg}
-            self._add_taint_to_var(
-                arg.arg,
-                prs_issue.Taint(
-                    id="0000", accordance="type", type="input"
-                )
-            )
+            self.scope.variables[arg.arg] = prs_scope.Variable(keyword=arg.arg)
+            self._add_event(prs_facts.ARG, arg.arg, None, arg.arg)
 
     def get_assign_targets(self, node):
         """分析并返回ast.Assign节点的赋值目标
@@ -377,20 +894,23 @@ class TaintNodeVisitor:
     def _get_assign_single_target_list(self, node) -> list:
         """解析ast.Assign.targets中的单个节点
 
+        以显式栈展开嵌套的tuple/list，保持从左到右的顺序
         :return 节点中所有变量的名称（targets中的节点可以是tuple/list）
         """
         target_list = []
 
-        if isinstance(node.ctx, ast.Store):
-            if isinstance(node, ast.Name):
-                target_list.append(node.id)
-            elif isinstance(node, ast.Tuple) or isinstance(node, ast.List):
-                for tuple_elem in node.elts:
-                    target_list.extend(self._get_assign_single_target_list(tuple_elem))
-            elif isinstance(node, ast.Attribute):
-                target_list.append(self._get_attr_real_name(node))
-        else:
-            LOGGER.debug("ast.Assign.targets not load as ast.Store:", ast.dump(node))
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node.ctx, ast.Store):
+                if isinstance(node, ast.Name):
+                    target_list.append(node.id)
+                elif isinstance(node, ast.Tuple) or isinstance(node, ast.List):
+                    stack.extend(reversed(node.elts))
+                elif isinstance(node, ast.Attribute):
+                    target_list.append(self._get_attr_real_name(node))
+            else:
+                LOGGER.debug("ast.Assign.targets not load as ast.Store: %s", ast.dump(node))
 
         return target_list
 
@@ -419,41 +939,65 @@ class TaintNodeVisitor:
             return ""
 
     def _get_attr_real_name(self, node):
-        """递归分析ast.Attribute节点的实际内容
+        """分析ast.Attribute节点的实际内容
 
         会深入解析出函数调用链条中由函数导入的模块中包含的函数的调用行为
         - ast.Name:
             检查self.variables和self.import_aliases字典中是否包含node.id，
             如果包含，返回其值
         - ast.Attribute:
-            递归解析ast.Attribute节点内容(向上递归)
+            沿node.value向上解析ast.Attribute节点内容
         - ast.Call:
             三种函数__import__, importlib.__import__, importlib.import_module的调用，
             相当于模块的引入，解析出真实的模块名并返回。e.g. __import__("base64").b64decode -> base64.b64decode
+
+        属性链与调用链先向上收集，再自根向下拼接，不受链长度的递归深度限制
         :return: str: ast.Attribute属性全称, e.g. a.b.c
         """
+        # 收集链上的属性名及以ast.Attribute为func的ast.Call节点
+        chain = []
+        while True:
+            if isinstance(node, ast.Attribute):
+                chain.append(node.attr)
+                node = node.value
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+                chain.append(node)
+                node = node.func
+            else:
+                break
+
+        # 解析链的根节点
+        real_name = None
         if isinstance(node, ast.Name):
             name = node.id
             variable = self._get_variable_by_var_id(name)
             if variable is not None:
-                return variable
+                real_name = variable
             elif name in self.import_aliases:
-                return self.import_aliases[name]
-            return name
+                real_name = self.import_aliases[name]
+            else:
+                real_name = name
+        elif isinstance(node, ast.Call):
+            real_name = self._get_imported_module_from_call(node, self.get_real_call(node))
 
-        elif isinstance(node, ast.Attribute):
-            upper_func = self._get_attr_real_name(node.value)
-            return f"{upper_func}.{node.attr}" if upper_func is not None else node.attr
+        # 自根向下拼接，ast.Call节点的func全称即为当前已拼接的内容
+        for item in reversed(chain):
+            if isinstance(item, str):
+                real_name = f"{real_name}.{item}" if real_name is not None else item
+            else:
+                real_name = self._get_imported_module_from_call(item, real_name)
 
-        elif isinstance(node, ast.Call):
-            upstream_func_name = self.get_real_call(node)
-            if upstream_func_name == "__import__" or upstream_func_name == "importlib.__import__"\
-                    or upstream_func_name == "importlib.import_module":
-                return self.get_imported_module_from_function_call(node, upstream_func_name)
+        return real_name
+
+    def _get_imported_module_from_call(self, node, upstream_func_name):
+        """如果ast.Call节点调用的是模块导入函数，返回导入的模块名，否则返回None
 
-            # deprecated: 不需要函数调用链，对Call主要关注__import__函数即可
-            # Call返回函数调用链，对函数名后加()
-            # return f"{self._get_real_call(node)}()"
+        不需要函数调用链，对Call主要关注__import__函数即可
+        """
+        if upstream_func_name == "__import__" or upstream_func_name == "importlib.__import__"\
+                or upstream_func_name == "importlib.import_module":
+            return self.get_imported_module_from_function_call(node, upstream_func_name)
+        return None
 
     def get_imported_module_from_function_call(self, node, func):
         """解析由函数调用引入的模块/函数
@@ -487,55 +1031,61 @@ class TaintNodeVisitor:
         return None
 
     def _get_namespace_from_filename(self, filename):
-        """TODO: 根据完整的文件路径filename解析module的namespace
+        """根据完整的文件路径filename解析module的namespace
 
-        TODO: 后续可以做个初始namespace将多个文件的数据流串接
+        模块作用域统一使用空的namespace，事实与文件路径无关；
+        多个文件间的数据流由prs_package按项目内部导入图生成的模块摘要串接
         """
         return ""
 
-    def _add_name_to_namespace(self, name):
-        self.namespace_list.append(name)
-        self._update_namespace()
-
-    def _pop_name_from_namespace(self, ):
-        self.namespace_list.pop()
-        self._update_namespace()
-
-    def _update_namespace(self):
-        """根据namespace_list更新当前namespace
+    def _push_scope(self, name, function=False):
+        """进入名为name的子作用域，function表示作用域是否为函数
 
-        为初次访问的namespace在variables中开辟存储字典空间
+        初次访问的作用域会被创建，并以namespace全称登记到self.variables
         """
-        self.namespace = ".".join(self.namespace_list)
-        self.variables.setdefault(self.namespace, {})
+        if self.scope is None:
+            self.scope = prs_scope.Scope(name)
+        else:
+            self.scope = self.scope.child(name)
+            self._add_event(prs_facts.SCOPE, name, function)
+            # 子作用域拥有独立的控制流图，以入口基本块开始
+            self._flow_stack.append((self._block, self._loops, self._try_blocks))
+            self._loops = []
+            self._try_blocks = []
+            self._start_block(())
+        self.variables.setdefault(self.scope.qualname, self.scope.variables)
+
+    def _pop_scope(self):
+        """回到父作用域"""
+        self.scope = self.scope.parent
+        self._add_event(prs_facts.END_SCOPE)
+        self._block, self._loops, self._try_blocks = self._flow_stack.pop()
 
     def get_node_value(self, node):
-        """获取ast.Constant/ast.Name节点的真实value
+        """获取节点的真实value
 
         - ast.Constant
             节点记录的常量值
         - ast.Name
             当前namespace及父辈namespace中记录的变量值
+        - 其他
+            可静态求值的表达式的值，见self._get_static_value
 
         :return: 节点值(基本数据类型)/None
         """
-        if isinstance(node, ast.Constant):
-            return node.value
-        elif isinstance(node, ast.Name):
-            return self._get_value_by_var_id(node.id)
-        else:
-            return None
+        return self._get_static_value(node)
 
     def _copy_var_to_var(self, src_var, dest_var):
         """在当前namespace下将src变量信息硬拷贝到dest变量中
 
         :return: True: 成功 / False: src_var不存在
         """
-        namespace = self._get_namespace_by_var(src_var)
-        if namespace is None:
+        scope = self.scope.lookup(src_var)
+        if scope is None:
             return False
 
-        self.variables[self.namespace][dest_var] = self.variables[namespace][src_var].copy()
+        self.scope.variables[dest_var] = scope.variables[src_var].copy()
+        self._add_event(prs_facts.COPY, src_var, dest_var)
         return True
 
     def _get_variable_by_var_id(self, var):
@@ -546,8 +1096,8 @@ class TaintNodeVisitor:
         否则返回None。
         :return: str: var的variable内容 / None
         """
-        namespace = self._get_namespace_by_var(var)
-        if namespace is None:
+        scope = self.scope.lookup(var)
+        if scope is None:
             if var in self.import_aliases:
                 return self.import_aliases[var]
             elif var in self.imports:
@@ -555,9 +1105,7 @@ class TaintNodeVisitor:
             else:
                 return None
 
-        if "variable" in self.variables[namespace][var]:
-            return self.variables[namespace][var]["variable"]
-        return None
+        return scope.variables[var].variable
 
     def _get_value_by_var_id(self, var):
         """获取变量对应的静态值
@@ -568,336 +1116,18 @@ class TaintNodeVisitor:
 
         :return: 变量静态值(基本数据类型)，None(其他赋值类型)
         """
-        #
-        namespace = self._get_namespace_by_var(var)
-        if namespace is None:
+        scope = self.scope.lookup(var)
+        if scope is None:
             return
 
-        if "value" in self.variables[namespace][var]:
-            return self.variables[namespace][var]["value"]
-        else:
-            return None
-
-    def _get_namespace_by_var(self, var):
-        """定位变量所在的namespace
-
-        根据变量名从当前namespace开始迭代向父namespace查找
-        :return: str: namespace
-        """
-        if var in self.variables[self.namespace]:
-            return self.namespace
-        for i in list(range(len(self.namespace_list)))[::-1]:
-            namespace = ".".join(self.namespace_list[:i])
-            if var in self.variables[namespace]:
-                return namespace
-        return None
+        return scope.variables[var].value
 
     def _del_var_from_variables(self, var):
         """从变量表中删除指定变量"""
-        namespace = self._get_namespace_by_var(var)
-        if namespace is None:
+        scope = self.scope.lookup(var)
+        if scope is None:
             return
 
-        del self.variables[namespace][var]
+        del scope.variables[var]
+        self._add_event(prs_facts.DEL, var)
         return
-
-    def mark_spread_taint(self, node):
-        """对节点进行污点分析，包括污点标记、污点传播"""
-        self.mark_taint(node)
-        self.spread_taint(node)
-
-    def mark_taint(self, node):
-        """污点标记，标记taints和sinks
-
-        根据规则检查:
-        - ast.Call节点调用的函数，如果函数引入taint，
-            则向对应node._prs_tainted_by中添加taint信息
-        """
-        # 对于ast.Call节点，根据规则集中sinks下的function
-        if isinstance(node, ast.Call):
-            # 遍历每个文件(id)对应的规则集
-            for _id, rule in self.rules.items():
-                # 检查taint规则
-                if "taints" in rule:
-                    for taint_rule in rule["taints"]:
-                        if taint_rule["accordance"] == "function":
-                            if taint_rule["function"] == node._prs_call_func:
-                                taint = prs_issue.Taint(
-                                    id=_id,
-                                    accordance=taint_rule["accordance"],
-                                    type=rule["type"] if "type" in rule else "",
-                                    function=taint_rule["function"],
-                                    position=taint_rule["position"] if "position" in taint_rule else None,
-                                    keyword=taint_rule["keyword"] if "keyword" in taint_rule else None,
-                                    lineno=node.lineno,
-                                    col_offset=node.col_offset,
-                                    end_lineno=node.end_lineno,
-                                    end_col_offset=node.end_col_offset,
-                                )
-
-                                # 根据type标记敏感函数调用顺序
-                                taint_type = rule["type"] if "type" in rule else ""
-                                if taint_type != "":
-                                    self._add_sensitive_operation(taint_type, taint)
-
-                                # 污染函数的返回值，将taint标记到节点
-                                if taint_rule["position"] == "ret":
-                                    self._add_taint_to_node(node, taint)
-                                # 污染函数的参数，将taint标记到参数对应的变量/常量上
-                                else:
-                                    expected_node = self._get_call_arg_node(
-                                        node,
-                                        position=taint_rule["position"] if "position" in taint_rule else None,
-                                        keyword=taint_rule["keyword"] if "keyword" in taint_rule else None
-                                    )
-                                    if expected_node is not None:
-                                        if isinstance(expected_node, ast.Name):
-                                            self._add_taint_to_var(expected_node.id, taint)
-                                        elif isinstance(expected_node, ast.Attribute):
-                                            self._add_taint_to_var(self._get_attr_real_name(expected_node), taint)
-                                        elif isinstance(expected_node, ast.Constant):
-                                            self._add_taint_to_constant(expected_node.value, taint)
-                # 检查sink规则
-                if "sinks" in rule:
-                    for sink in rule["sinks"]:
-                        if sink["accordance"] == "function":
-                            if sink["function"] == node._prs_call_func:
-                                self._add_sink_to_node(node, prs_issue.Sink(
-                                    id=_id,
-                                    accordance=sink["accordance"],
-                                    function=sink["function"],
-                                    type=rule["type"] if "type" in rule else "",
-                                    position=sink["position"] if "position" in sink else None,
-                                    keyword=sink["keyword"] if "keyword" in sink else None,
-                                    lineno=node.lineno,
-                                    col_offset=node.col_offset,
-                                    end_lineno=node.end_lineno,
-                                    end_col_offset=node.end_col_offset
-                                ))
-        # 根据变量表将污点传播到ast.Name节点
-        elif isinstance(node, ast.Name):
-            var = node.id
-            namespace = self._get_namespace_by_var(var)
-            if namespace is None:
-                return
-            for taint_rule in self.variables[namespace][var]["taints"]:
-                self._add_taint_to_node(node, taint_rule)
-        # 根据常量表将污点传播到ast.Constant节点
-        elif isinstance(node, ast.Constant):
-            if node.value in self.constants:
-                for taint in self.constants[node.value]["taints"]:
-                    self._add_taint_to_node(node, taint)
-        # 根据变量表以及attribute实际值将污点传播到ast.Attribute节点
-        elif isinstance(node, ast.Attribute):
-            # 如果变量表中有变量记录，将变量taint mark到节点
-            var = node._prs_attribute
-            namespace = self._get_namespace_by_var(var)
-            if namespace is not None:
-                for taint_rule in self.variables[namespace][var]["taints"]:
-                    self._add_taint_to_node(node, taint_rule)
-
-            # 遍历每个文件(id)对应的规则集
-            for _id, rule in self.rules.items():
-                # 检查taint规则
-                if "taints" in rule:
-                    for taint_rule in rule["taints"]:
-                        if taint_rule["accordance"] == "attribute":
-                            if taint_rule["attribute"] == node._prs_attribute:
-                                if taint_rule["position"] == "ret":
-                                    self._add_taint_to_node(node, prs_issue.Taint(
-                                        id=_id,
-                                        accordance="attribute",
-                                        type=rule["type"] if "type" in rule else "",
-                                        attribute=taint_rule["attribute"],
-                                        position="ret",
-                                        lineno=node.lineno,
-                                        col_offset=node.col_offset,
-                                        end_lineno=node.end_lineno,
-                                        end_col_offset=node.end_col_offset,
-                                    ))
-
-    def spread_taint(self, node):
-        """污点传播
-
-        迭代向父节点进行污点传播，不传播"*"taint，对以下情况进行处理:
-
-        - 父节点为ast.Module，停止污点传播
-        - 父节点发生命名空间切换，停止污点传播
-        - 父节点为ast.Assign，向赋值变量进行污点传播
-        """
-
-        # 根据ast.Assign赋值目标将taint传播到变量表
-        if isinstance(node, ast.Assign):
-            for taint in node._prs_taints:
-                if taint.accordance == "type" and taint.type == "*":
-                    continue
-                for target in node._prs_assign_targets:
-                    self._add_taint_to_var(target, taint)
-        # 根据ast.withitem将taint传播到optional_vars属性的变量上
-        elif isinstance(node, ast.withitem):
-            if node._prs_withitem_target is not None:
-                for taint in node._prs_taints:
-                    if taint.accordance == "type" and taint.type == "*":
-                        continue
-                    self._add_taint_to_var(node._prs_withitem_target, taint)
-
-        # 切换到父命名空间/到达根节点结束传播
-        if not hasattr(node, "_prs_parent") or \
-                isinstance(node._prs_parent, ast.Module) or \
-                node._prs_namespace != node._prs_parent._prs_namespace:
-            return
-
-        # 向父节点传播污点
-        for taint in node._prs_taints:
-            if taint.accordance == "type" and taint.type == "*":
-                continue
-            # 函数参数引入的taint不应在本行被传播
-            elif (taint.position != "ret" or taint.keyword is not None) and \
-                    hasattr(node, "lineno") and taint.lineno == node.lineno:
-                continue
-            self._add_taint_to_node(node._prs_parent, taint)
-
-        self.spread_taint(node._prs_parent)
-    
-    def check_taint(self, node):
-        """污点检测
-
-        - ast.Call: 可能抵达sink，根据规则检查是否存在安全问题;
-            对于taint=input的变量传入函数参数的行为，将当前
-            FunctionDef声明的函数注册到self.rules中
-        """
-        if isinstance(node, ast.Call):
-            for _id, rule in self.rules.items():
-                # 00开头的规则预留给敏感函数分类规则，不用于污点检测的taint-sink匹配部分
-                if _id.startswith("00"):
-                    continue
-
-                taint_list = list()
-                sink_list = list()
-
-                # 从节点属性中发现与规则匹配的sink放入集合
-                for sink_rule in rule["sinks"]:
-                    accordance = sink_rule["accordance"]
-                    for s in node._prs_sinks:
-                        if sink_rule[accordance] == getattr(s, accordance):
-                            sink_list.append((sink_rule, s))
-
-                # 根据函数的实际sink参数位置匹配taint规则
-                for s in sink_list:
-                    sink = s[1]
-                    # 根据sink的实际参数位置检查该参数是否被污染
-                    expected_tainted_node = self._get_call_arg_node(node, sink.position, sink.keyword)
-
-                    # 从节点属性中发现与规则匹配的taint放入集合
-                    if expected_tainted_node is not None:
-                        for taint_rule in rule["taints"]:
-                            accordance = taint_rule["accordance"]
-                            for t in expected_tainted_node._prs_taints:
-                                if taint_rule[accordance] == getattr(t, accordance):
-                                    self.add_issue_to_result(
-                                        prs_issue.Issue(
-                                            id=_id,
-                                            name=rule["name"],
-                                            taint=t,
-                                            sink=sink,
-                                            severity=taint_rule["severity"] if taint_rule["severity"] > s[0]["severity"] else s[0]["severity"],
-                                            confidence=taint_rule["confidence"] if taint_rule["confidence"] > s[0][
-                                                "confidence"] else s[0]["confidence"],
-                                            msg=rule["template"].replace(
-                                                "{SINK}", getattr(sink, sink.accordance)
-                                            ).replace(
-                                                "{TAINT}", getattr(t, t.accordance)
-                                            ),
-                                            file_path=self.filepath
-                                        )
-                                    )
-
-        # TODO: 根据敏感函数顺序判断问题
-
-    @staticmethod
-    def _add_taint_to_node(node, taint: prs_issue.Taint):
-        """向node._prs_taints添加taint"""
-        for t in node._prs_taints:
-            if t == taint:
-                return
-        node._prs_taints.append(taint)
-
-    def _add_taint_to_var(self, var, taint: prs_issue.Taint):
-        """向变量添加taint
-
-        从当前namespace开始向上遍历命名空间，向第一次遇到的variable中添加taint
-        """
-        namespace = self._get_namespace_by_var(var)
-        if namespace is None:
-            return
-        for t in self.variables[namespace][var]["taints"]:
-            if t == taint:
-                return
-        self.variables[namespace][var]["taints"].append(taint)
-
-    def _add_taint_to_constant(self, constant, taint: prs_issue.Taint):
-        """向常量添加taint"""
-        self.constants.setdefault(constant, {"taints": []})
-        for t in self.constants[constant]["taints"]:
-            if t == taint:
-                return
-        self.constants[constant]["taints"].append(taint)
-
-    @staticmethod
-    def _add_sink_to_node(node, sink: prs_issue.Sink):
-        """向node._prs_sinks添加sink"""
-        for s in node._prs_sinks:
-            if s == sink:
-                return
-        node._prs_sinks.append(sink)
-
-    def _add_sensitive_operation(self, sensitive_type: str, taint: prs_issue.Taint):
-        """根据污点标记时发现的敏感行为类型标记顺序"""
-        if sensitive_type == "command-execution":
-            if self.command_execution_serial is None:
-                self.command_execution_serial = (self.sensitive_serial, taint)
-                self.sensitive_serial += 1
-        elif sensitive_type == "encoder":
-            if self.encoder_serial is None:
-                self.encoder_serial = (self.sensitive_serial, taint)
-                self.sensitive_serial += 1
-        elif sensitive_type == "decoder":
-            if self.decoder_serial is None:
-                self.decoder_serial = (self.sensitive_serial, taint)
-                self.sensitive_serial += 1
-        elif sensitive_type == "network-receiver":
-            if self.network_receiver_serial is None:
-                self.network_receiver_serial = (self.sensitive_serial, taint)
-                self.sensitive_serial += 1
-        elif sensitive_type == "network-sender":
-            if self.network_sender_serial is None:
-                self.network_sender_serial = (self.sensitive_serial, taint)
-                self.sensitive_serial += 1
-        elif sensitive_type == "sensitive-info-acquisition":
-            if self.sensitive_info_acquisition_serial is None:
-                self.sensitive_info_acquisition_serial = (self.sensitive_serial, taint)
-                self.sensitive_serial += 1
-        elif sensitive_type == "file-operation":
-            if self.file_operation_serial is None:
-                self.file_operation_serial = (self.sensitive_serial, taint)
-                self.sensitive_serial += 1
-
-    @staticmethod
-    def _get_call_arg_node(node, position, keyword):
-        """根据position, keyword获取ast.Call调用函数的参数节点"""
-        if isinstance(node, ast.Call):
-            if position is not None:
-                if len(node.args) > position:
-                    return node.args[position]
-            if keyword is not None:
-                for k in node.keywords:
-                    if k.arg == keyword:
-                        return k.value
-        return None
-
-    def add_issue_to_result(self, issue: prs_issue.Issue):
-        """向self.results中添加一条issue dict"""
-        for i in self.results:
-            if issue == i:
-                return
-        self.results.append(issue.dict())
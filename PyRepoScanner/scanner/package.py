@@ -0,0 +1,462 @@
+"""
+跨模块分析
+
+扫描项目时，被项目内其他文件导入的模块先生成导出摘要(ModuleSummary):
+- 模块级变量携带的taint
+- 模块级函数/类方法的函数摘要(prs_evaluator.FunctionSummary)
+- 从其他模块导入、可以经本模块访问的名称(再导出)
+
+各模块按项目内部导入图的拓扑顺序生成摘要，生成时其依赖模块的摘要已经可用；导入图中存在环时，
+环上后生成的模块使用先生成的模块的摘要。摘要以(文件内容sha256, 规则集指纹, 依赖模块摘要的摘要值)为键
+保存在扫描结果缓存中，内容与依赖均未变化的模块在新版本中无需重新生成摘要。
+
+待检测文件求值时通过PackageContext解析对项目内模块的调用与变量读取
+"""
+
+
+import os
+import re
+import zlib
+import marshal
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Set, Tuple
+import PyRepoScanner.scanner.budget as prs_budget
+import PyRepoScanner.scanner.evaluator as prs_evaluator
+import PyRepoScanner.scanner.facts as prs_facts
+import PyRepoScanner.utils.issue as prs_issue
+
+
+LOGGER = logging.getLogger()
+MAX_EXPORT_DEPTH = 8        # 解析再导出名称的最大跳转次数
+# 行首的import语句，from ... import (...)的括号内可以跨行
+IMPORT_REGEX = re.compile(rb"^[ \t]*(?:from[ \t]+\.*([\w.]*)[ \t]+import[ \t]+(?:\(([^)]*)\)|([^#;\r\n]*))"
+                          rb"|import[ \t]+([^#;\r\n]+))", re.M)
+COMMENT_REGEX = re.compile(rb"#[^\r\n]*")
+NAME_REGEX = re.compile(rb"[\w.]+|\*")
+
+
+def scan_imports(data) -> Tuple[List[str], Dict[str, str]]:
+    """从源码中提取导入引用与导入别名，相对导入省略开头的"."，用于在不解析AST的情况下构建导入图
+
+    与TaintNodeVisitor记录的imports/import_aliases一致:
+    - 引用为导入的模块/成员全称: import a.b -> a.b，from a import b -> a、a.b，from . import b -> b
+    - 别名: import a.b as c -> c: a.b，from a import b -> b: a.b，from a import * -> *: a.*
+
+    :return: (引用列表, 别名 -> 全称)
+    """
+    references = []
+    aliases = {}
+    for m in IMPORT_REGEX.finditer(data):
+        if m.group(4) is not None:
+            module, names = b"", m.group(4)
+        else:
+            module, names = m.group(1), m.group(2) if m.group(2) is not None else m.group(3)
+        if module:
+            references.append(module.decode("latin-1"))
+        for item in COMMENT_REGEX.sub(b"", names).split(b","):
+            parts = item.replace(b"\\", b" ").split()
+            if not parts or NAME_REGEX.fullmatch(parts[0]) is None:
+                continue
+            name = (module + b"." + parts[0] if module else parts[0]).decode("latin-1")
+            if parts[0] != b"*":
+                references.append(name)
+            if len(parts) == 3 and parts[1] == b"as":
+                aliases[parts[2].decode("latin-1")] = name
+            elif module:
+                aliases[parts[0].decode("latin-1")] = name
+    return references, aliases
+
+
+def module_names(paths: List[str]) -> Dict[str, str]:
+    """根据项目中全部python文件的路径计算模块名
+
+    文件所在目录及其上级目录中连续含有__init__.py的部分作为包名，__init__.py以所在包作为模块名
+
+    :return: 文件路径 -> 模块名
+    """
+    packages = {os.path.dirname(path) for path in paths if os.path.basename(path) == "__init__.py"}
+    names = {}
+    for path in paths:
+        directory, file_name = os.path.split(path)
+        parts = [] if file_name == "__init__.py" else [file_name[:-len(".py")]]
+        while directory in packages:
+            directory, name = os.path.split(directory)
+            parts.append(name)
+        if parts:
+            names[path] = ".".join(reversed(parts))
+    return names
+
+
+def _taint_tuple(taint):
+    return tuple(getattr(taint, name) for name in taint.__slots__)
+
+
+@dataclass
+class ModuleSummary:
+    """模块导出摘要
+
+    - globals: 模块级变量 -> {taint: None}
+    - functions: 函数相对于模块的全称(函数名/类名.方法名) -> prs_evaluator.FunctionSummary
+    - exports: 从其他模块导入的名称 -> 导入的全称
+    - partial: 模块未完整求值的原因，这样的摘要不写入缓存，也不序列化
+    """
+    globals: Dict = field(default_factory=lambda: dict())
+    functions: Dict = field(default_factory=lambda: dict())
+    exports: Dict = field(default_factory=lambda: dict())
+    digest: str = ""
+    partial: str = None
+
+    def __post_init__(self):
+        if not self.digest:
+            self.digest = hashlib.sha256(self.to_bytes()).hexdigest()
+
+    def __bool__(self):
+        return bool(self.globals or self.functions or self.exports)
+
+    def to_bytes(self) -> bytes:
+        functions = {
+            name: (
+                [(position, keyword, [_taint_tuple(sink) for sink in sinks])
+                 for (position, keyword), sinks in summary.sinks.items()],
+                [_taint_tuple(taint) for taint in summary.returns],
+                list(summary.param_returns),
+            )
+            for name, summary in self.functions.items()
+        }
+        return zlib.compress(marshal.dumps((
+            prs_facts.FACTS_VERSION,
+            {name: [_taint_tuple(taint) for taint in taints] for name, taints in self.globals.items()},
+            functions,
+            self.exports,
+        )))
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """反序列化摘要，格式版本不一致时返回None"""
+        version, globals_, functions, exports = marshal.loads(zlib.decompress(data))
+        if version != prs_facts.FACTS_VERSION:
+            return None
+        return cls(
+            globals={name: dict.fromkeys(prs_issue.Taint(*taint) for taint in taints)
+                     for name, taints in globals_.items()},
+            functions={
+                name: prs_evaluator.FunctionSummary(
+                    sinks={(position, keyword): dict.fromkeys(prs_issue.Sink(*sink) for sink in sinks)
+                           for position, keyword, sinks in sink_list},
+                    returns=dict.fromkeys(prs_issue.Taint(*taint) for taint in returns),
+                    param_returns=dict.fromkeys(tuple(param) for param in param_returns),
+                )
+                for name, (sink_list, returns, param_returns) in functions.items()
+            },
+            exports=exports,
+            digest=hashlib.sha256(data).hexdigest(),
+        )
+
+
+def summarize_module(rule_index, facts: prs_facts.FileFacts, file_path: str = "", context=None,
+                     guard=None) -> ModuleSummary:
+    """对模块的事实求值，生成导出摘要，context为模块依赖的项目内模块(PackageContext)"""
+    evaluator = prs_evaluator.FactEvaluator(rule_index=rule_index, filepath=file_path, guard=guard,
+                                            package=context, summarize=True)
+    evaluator.evaluate(facts)
+    variables, functions = evaluator.exports
+    return ModuleSummary(globals=variables, functions=functions, exports=dict(facts.import_aliases),
+                         partial=evaluator.partial)
+
+
+@dataclass
+class PackageContext:
+    """待检测文件可见的项目内模块摘要
+
+    - summaries: 模块名 -> ModuleSummary，包含文件直接或间接导入的全部项目内模块
+    - packages: 模块名 -> 模块所在的包，用于解析省略了"."的相对导入
+    - module: 待检测文件的模块名
+    - digest: 全部可见摘要的摘要值，检测结果依赖于此，作为缓存键的一部分
+    - sink_names: 可见的、函数内存在sink的函数名(末级标识符)，文件中未出现这些名称时只能在自身的sink处产生issue，
+        预过滤与分诊仍然有效
+    """
+    summaries: Dict = field(default_factory=lambda: dict())
+    packages: Dict = field(default_factory=lambda: dict())
+    module: str = ""
+    digest: str = ""
+    sink_names: Set = field(default_factory=lambda: set())
+    _resolved: Dict = field(default_factory=lambda: dict(), repr=False)    # (全称, stars) -> resolve的结果
+
+    def __post_init__(self):
+        self.sink_names = {name.rpartition(".")[2] for module in self.summaries.values() if module is not None
+                           for name, summary in module.functions.items() if summary.sinks}
+        if not self.digest:
+            digest = hashlib.sha256()
+            for name in sorted(self.summaries):
+                digest.update(f"{name}:{self.summaries[name].digest};".encode())
+            self.digest = digest.hexdigest()
+
+    def split(self, name: str, importer: str = None):
+        """将importer模块中出现的全称拆分为(项目内模块名, 成员名)
+
+        依次在importer所在的包及其上级包中查找(相对导入)，最后按绝对导入查找，取最长的模块名前缀
+
+        :return: (模块名, 成员名) / None，name即为模块本身时成员名为""
+        """
+        parts = name.split(".")
+        package = self.packages.get(self.module if importer is None else importer, "")
+        while True:
+            prefix = package.split(".") if package else []
+            for idx in range(len(parts), 0, -1):
+                module = ".".join(prefix + parts[:idx])
+                if module in self.summaries:
+                    return module, ".".join(parts[idx:])
+            if not package:
+                return None
+            package = package.rpartition(".")[0]
+
+    def resolve(self, name: str, stars=(), importer: str = None, depth: int = 0):
+        """解析全称对应的模块摘要与成员，成员不是模块内定义的函数/变量时沿再导出继续解析
+
+        :param stars: importer中"from ... import *"导入的模块，name无法解析时在这些模块中查找
+        :return: (ModuleSummary, 成员名) / None
+        """
+        split = self.split(name, importer)
+        if split is None:
+            for star in stars:
+                resolved = self.resolve(f"{star}.{name}", (), importer, depth)
+                if resolved is not None:
+                    return resolved
+            return None
+        module, member = split
+        summary = self.summaries[module]
+        if member and member not in summary.functions and member not in summary.globals:
+            head, _, rest = member.partition(".")
+            target = summary.exports.get(head)
+            if depth < MAX_EXPORT_DEPTH:
+                if target is not None:
+                    return self.resolve(f"{target}.{rest}" if rest else target, (), module, depth + 1)
+                # from ... import *再导出的名称
+                if "*" in summary.exports:
+                    return self.resolve(f"{summary.exports['*'][:-len('.*')]}.{member}", (), module, depth + 1)
+        return summary, member
+
+    def _lookup(self, name: str, stars: tuple):
+        """带缓存的resolve，同一文件中的名称会被反复查询"""
+        key = (name, stars)
+        if key not in self._resolved:
+            self._resolved[key] = self.resolve(name, stars)
+        return self._resolved[key]
+
+    def function(self, name: str, stars: tuple = ()):
+        """获取全称对应的项目内函数的摘要，不存在时返回None"""
+        resolved = self._lookup(name, stars)
+        if resolved is None:
+            return None
+        return resolved[0].functions.get(resolved[1])
+
+    def taints(self, name: str, stars: tuple = ()):
+        """获取全称对应的项目内模块级变量携带的taint"""
+        resolved = self._lookup(name, stars)
+        if resolved is None:
+            return ()
+        return resolved[0].globals.get(resolved[1], ())
+
+
+@dataclass
+class ImportGraph:
+    """项目内部导入图
+
+    - names: 文件路径 -> 模块名
+    - paths: 模块名 -> 文件路径，同名模块以路径排序在前的为准
+    - packages: 模块名 -> 模块所在的包
+    - deps: 已读取的模块名 -> 依赖的项目内模块名列表
+    - order: 待检测文件直接或间接导入的模块，按依赖在前的顺序排列
+    """
+    names: Dict = field(default_factory=lambda: dict())
+    paths: Dict = field(default_factory=lambda: dict())
+    packages: Dict = field(default_factory=lambda: dict())
+    deps: Dict = field(default_factory=lambda: dict())
+    order: List = field(default_factory=lambda: [])
+
+
+def import_graph(module_paths: List[str], file_paths: List[str], read_references: Callable) -> ImportGraph:
+    """从待检测文件出发构建项目内部导入图，只读取待检测文件与其直接或间接导入的模块
+
+    :param module_paths: 项目中全部python文件的路径
+    :param file_paths: 待检测文件的路径
+    :param read_references: 文件路径 -> 导入引用列表，读取失败时返回None
+    """
+    graph = ImportGraph(names=module_names(module_paths))
+    names, paths, deps = graph.names, graph.paths, graph.deps
+    for path in sorted(names):
+        paths.setdefault(names[path], path)
+    graph.packages = {name: name if path.endswith("__init__.py") else name.rpartition(".")[0]
+                      for name, path in paths.items()}
+    # 用于解析导入引用的上下文，只需要模块名
+    index = PackageContext(summaries=dict.fromkeys(paths), packages=graph.packages, digest="-")
+
+    def read(path):
+        name = names.get(path)
+        if name in deps or paths.get(name) != path:
+            return
+        references = read_references(path)
+        if references is None:
+            deps[name] = ()
+            return
+        modules = set()
+        for reference in references:
+            split = index.split(reference, name)
+            if split is not None and split[0] != name:
+                modules.add(split[0])
+        deps[name] = sorted(modules)
+
+    for path in file_paths:
+        read(path)
+    # 只有被待检测文件直接或间接导入的模块需要生成摘要
+    roots = sorted({module for path in file_paths for module in deps.get(names.get(path), ())})
+    graph.order = _topological_order(roots, deps, lambda name: read(paths[name]))
+    return graph
+
+
+def _topological_order(roots: List[str], deps: Dict, read: Callable) -> List[str]:
+    """从roots出发按依赖在前的顺序排列可达模块，read在首次访问模块时读取其依赖
+
+    以显式栈进行后序遍历，环上的回边被忽略
+    """
+    order = []
+    visited = set()
+    for root in roots:
+        if root in visited:
+            continue
+        read(root)
+        visited.add(root)
+        stack = [(root, iter(deps.get(root, ())))]
+        while stack:
+            name, children = stack[-1]
+            for child in children:
+                if child in visited:
+                    continue
+                read(child)
+                visited.add(child)
+                stack.append((child, iter(deps.get(child, ()))))
+                break
+            else:
+                stack.pop()
+                order.append(name)
+    return order
+
+
+@dataclass
+class PackageBuilder:
+    """按项目内部导入图生成模块摘要，并为导入了项目内模块的待检测文件构建PackageContext
+
+    - read_module: 文件路径 -> (内容sha256, 导入引用列表, 导入别名, 是否可能产生非空摘要)，读取失败时返回None，
+        不可能产生非空摘要(未出现任何规则函数/属性)且依赖模块的摘要均不含taint与函数的模块不进行解析，只导出导入别名
+    - load_facts: 文件路径 -> (FileFacts, 未完整抽取的原因)，事实不可用时FileFacts为None
+    - cache: 扫描结果缓存(prs_cache.ScanCache)，为None时不缓存摘要
+    - guard: 返回单个模块求值预算检查器的函数，为None时不限制
+    """
+    rule_index: object
+    fingerprint: str
+    read_module: Callable
+    load_facts: Callable
+    cache: object = None
+    guard: Callable = None
+    summary_hits: int = 0
+    summary_misses: int = 0
+
+    def build(self, module_paths: List[str], file_paths: List[str], package_guard=None) -> Dict[str, PackageContext]:
+        """生成file_paths直接或间接导入的项目内模块的摘要
+
+        :param module_paths: 项目中全部python文件的路径
+        :param file_paths: 待检测文件的路径
+        :param package_guard: 项目预算检查器，超出时停止生成摘要，已生成的摘要仍然可用
+        :return: 待检测文件路径 -> PackageContext，只包含可见摘要非空的文件
+        """
+        infos = {}
+
+        def read_references(path):
+            info = self.read_module(path)
+            if info is None:
+                return None
+            infos[path] = info
+            return info[1]
+
+        graph = import_graph(module_paths, file_paths, read_references)
+        names, paths, packages, deps = graph.names, graph.paths, graph.packages, graph.deps
+
+        summaries = {}
+        visible = {}
+        try:
+            for name in graph.order:
+                if package_guard is not None:
+                    package_guard.check()
+                context = self._context(name, deps, summaries, visible, packages)
+                if paths[name] not in infos:
+                    continue
+                sha256, _, aliases, relevant = infos[paths[name]]
+                if relevant or any(summary.globals or summary.functions for summary in context.summaries.values()):
+                    summary = self._summarize(paths[name], sha256, context)
+                else:
+                    summary = ModuleSummary(exports=aliases)
+                if summary:
+                    summaries[name] = summary
+        except prs_budget.BudgetExceeded as e:
+            LOGGER.warning(f"{e.reason}, stop summarizing modules")
+
+        contexts = {}
+        visible.clear()
+        for path in file_paths:
+            name = names.get(path)
+            if name in deps:
+                context = self._context(name, deps, summaries, visible, packages)
+                if context.summaries:
+                    contexts[path] = context
+        return contexts
+
+    @staticmethod
+    def _context(name: str, deps: Dict, summaries: Dict, visible: Dict, packages: Dict) -> PackageContext:
+        """构建模块name可见的摘要: 直接或间接依赖的、已生成非空摘要的模块"""
+        reachable = visible.get(name)
+        if reachable is None:
+            reachable = set()
+            stack = list(deps.get(name, ()))
+            while stack:
+                module = stack.pop()
+                if module in reachable or module == name:
+                    continue
+                reachable.add(module)
+                stack.extend(deps.get(module, ()))
+            visible[name] = reachable
+        return PackageContext(summaries={module: summaries[module] for module in sorted(reachable) if module in summaries},
+                              packages=packages, module=name)
+
+    def _summarize(self, path: str, sha256: str, context: PackageContext):
+        """生成单个模块的摘要，摘要以文件内容、规则集与可见摘要为键缓存"""
+        key = f"summary:{sha256}:{self.fingerprint}:{context.digest}"
+        if self.cache is not None:
+            data = self.cache.get_value(key)
+            if data is not None:
+                summary = ModuleSummary.from_bytes(data)
+                if summary is not None:
+                    self.summary_hits += 1
+                    return summary
+        self.summary_misses += 1
+
+        facts, reason = self.load_facts(path)
+        if facts is None:
+            return None
+        try:
+            summary = summarize_module(self.rule_index, facts, path, context if context.summaries else None,
+                                       self.guard() if self.guard is not None else None)
+        except prs_budget.BudgetExceeded as e:
+            LOGGER.warning(f"module {path} not summarized: {e.reason}")
+            return None
+        except MemoryError:
+            LOGGER.warning(f"module {path} not summarized: MemoryError")
+            return None
+        # 只缓存完整抽取与求值的事实生成的摘要
+        if summary.partial is not None:
+            LOGGER.warning(f"module {path} partially summarized: {summary.partial}")
+        if self.cache is not None and reason is None and summary.partial is None:
+            self.cache.put_value(key, summary.to_bytes())
+        return summary
+
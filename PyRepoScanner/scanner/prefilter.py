@@ -0,0 +1,79 @@
+"""
+符号预过滤
+
+规则加载时根据全部sink函数与解码函数的末级标识符(如os.system -> system)构建一个组合匹配自动机，
+文件内容中没有出现任何sink或解码函数标识符时不可能产生issue，可以跳过AST解析与污点分析。
+解码出的常量载荷在求值时递归检测，即使文件中没有sink也可能产生issue，因此解码函数同样作为命中
+"""
+
+
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Set
+
+import PyRepoScanner.scanner.decoder as prs_decoder
+import PyRepoScanner.scanner.rule_index as prs_rule_index
+
+
+NON_ASCII_REGEX = re.compile(rb"[\x80-\xff]")
+
+
+def build_trie_pattern(words) -> str:
+    """将一组标识符按公共前缀合并为字典树形式的正则表达式
+
+    e.g. ["check_call", "check_output", "call"] -> (?:c(?:all|heck_(?:call|output)))
+    生成的正则表达式在匹配时逐字符沿字典树前进，等价于一个组合自动机，不会对每个标识符分别尝试
+    """
+    trie = {}
+    for word in sorted(set(words)):
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def to_pattern(node):
+        if "" in node and len(node) == 1:
+            return ""
+        optional = "" in node
+        branches = [re.escape(char) + to_pattern(child) for char, child in sorted(node.items()) if char != ""]
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        pattern = "(?:" + "|".join(branches) + ")"
+        return pattern + "?" if optional else pattern
+
+    return to_pattern(trie)
+
+
+@dataclass
+class SymbolPrefilter:
+    """sink标识符预过滤器
+
+    以文件内容为参数调用，返回文件中出现的sink标识符集合，集合为空说明文件不可能命中任何规则
+    """
+    symbols: Set = field(default_factory=lambda: set())
+
+    def __post_init__(self):
+        pattern = build_trie_pattern(self.symbols) if self.symbols else None
+        self._bytes_regex = re.compile(rb"\b" + pattern.encode() + rb"\b") if pattern else None
+        self._str_regex = re.compile(r"\b" + pattern + r"\b", re.ASCII) if pattern else None
+
+    @classmethod
+    def from_rule_index(cls, rule_index: prs_rule_index.RuleIndex):
+        """从规则索引中收集全部sink函数的末级标识符，以及静态解码函数的末级标识符"""
+        functions = {function for function, entry in rule_index.functions.items() if entry.sinks}
+        functions.update(prs_decoder.DECODERS)
+        return cls(symbols={function.rsplit(".", 1)[-1] for function in functions})
+
+    def __call__(self, data) -> Set:
+        """返回文件内容中出现的sink标识符
+
+        Python会对标识符做NFKC规范化(如全角的ｅｘｅｃ等同于exec)，
+        因此含非ASCII字节的文件先解码并规范化后再匹配
+        """
+        if self._bytes_regex is None:
+            return set()
+        if NON_ASCII_REGEX.search(data) is None:
+            return {m.decode() for m in self._bytes_regex.findall(data)}
+        text = unicodedata.normalize("NFKC", bytes(data).decode("utf-8", errors="ignore"))
+        return set(self._str_regex.findall(text))
@@ -1,17 +1,29 @@
 import os
 import re
 import ast
+import io
 import json
 import time
-import yaml
+import hashlib
 import logging
-import shutil
-import astpretty
+import threading
 from dataclasses import dataclass, field
-from typing import List
+from typing import Iterable, List, Tuple
 
 import PyRepoScanner.scanner.metrics as prs_metrics
+import PyRepoScanner.scanner.archive as prs_archive
+import PyRepoScanner.scanner.budget as prs_budget
+import PyRepoScanner.scanner.cache as prs_cache
+import PyRepoScanner.scanner.evaluator as prs_evaluator
+import PyRepoScanner.scanner.facts as prs_facts
+import PyRepoScanner.scanner.file_matcher as prs_file_matcher
+import PyRepoScanner.scanner.ingestion as prs_ingestion
 import PyRepoScanner.scanner.node_visitor as prs_node_visitor
+import PyRepoScanner.scanner.package as prs_package
+import PyRepoScanner.scanner.prefilter as prs_prefilter
+import PyRepoScanner.scanner.rule_index as prs_rule_index
+import PyRepoScanner.scanner.ruleset as prs_ruleset
+import PyRepoScanner.scanner.triage as prs_triage
 import PyRepoScanner.utils.basic_tools as prs_utils
 import PyRepoScanner.utils.issue as prs_issue
 
@@ -24,19 +36,119 @@ class PypiScanner:
     rule_path: str
     file_rules_path: str = None
     print_flag: bool = False
+    prefilter_flag: bool = True     # 是否使用符号预过滤跳过不可能命中规则的文件
+    triage_flag: bool = True        # 是否使用词法级分诊跳过确定无问题的文件
+    jobs: int = 1                   # 扫描目录时使用的进程数，大于1时启用并行扫描
+    cache_path: str = None          # 检测结果缓存数据库路径，为None时不使用缓存
+    cache_size: int = prs_cache.DEFAULT_CACHE_SIZE
+    artifact_flag: bool = True      # 是否读取由prs compile生成的规则集编译产物，构造scanner时不会生成产物
+    artifact_path: str = None       # 规则集编译产物路径，为None时使用rule_path同级的默认路径
+    budget: prs_budget.ScanBudget = None    # 文件/项目的耗时、AST节点数与内存预算，为None时不限制
+    isolate_flag: bool = False      # 是否在fork出的子进程中分析单个文件，超时后可强制结束
+    facts_path: str = None          # 事实库数据库路径，设置时保存全部被选中文件的事实，为None时不使用事实库
+    package_flag: bool = True       # 扫描项目时是否通过项目内模块的导出摘要进行跨模块分析
     file_rules = {}
+    file_matcher = None
     rules = {}
+    rule_index = None
+    rules_fingerprint = None
+    prefilter = None
+    triage = None
+    module_triage = None            # 判断项目内模块能否产生非空导出摘要的词法级分诊器
+    cache = None
+    fact_store = None
+    _package_guard = None
+    _project_root = None            # 扫描项目期间的项目根目录，与文件一同记录到事实库中
+    _isolated_worker = None         # 多线程进程中隔离执行单个文件分析的常驻worker
+    _package_contexts = None        # 扫描项目期间，待检测文件路径 -> prs_package.PackageContext
+    _package_facts = None           # 扫描项目期间，生成摘要时抽取的待检测文件的事实，路径 -> (sha256, 事实, 未完整抽取的原因)
 
     def __post_init__(self):
         if self.print_flag:
             print("\nLoading pypi scanner rules...")
-        self.load_rules()
-        self.load_file_rules()
+        if not (self.artifact_flag and self.load_rules_artifact()):
+            self.load_rules()
+            self.load_file_rules()
+        if self.cache_path is not None:
+            self.cache = prs_cache.ScanCache(self.cache_path, max_size=self.cache_size)
+        if self.facts_path is not None:
+            self.fact_store = prs_facts.FactStore(self.facts_path)
+
+    def __getstate__(self):
+        """pickle时(传给隔离worker)带上类属性中累积的规则，不包含数据库连接、隔离worker与扫描项目期间的状态"""
+        state = dict(self.__dict__, rules=self.rules)
+        for name in ("cache", "fact_store", "_isolated_worker", "_package_contexts", "_package_facts"):
+            state.pop(name, None)
+        return state
+
+    def get_artifact_path(self):
+        """规则集编译产物路径"""
+        return self.artifact_path if self.artifact_path is not None \
+            else prs_ruleset.default_artifact_path(self.rule_path)
+
+    def load_rules_artifact(self):
+        """源规则未变化时从编译产物中恢复规则集及加载后的结构
+
+        :return: 是否成功从产物加载
+        """
+        if not os.path.exists(self.rule_path):
+            return False
+        artifact_path = self.get_artifact_path()
+        data = prs_ruleset.load_artifact(artifact_path, prs_ruleset.source_digest(self.rule_path, self.file_rules_path))
+        if data is None:
+            return False
+
+        self.rules.update(data["rules"])
+        if self.rules == data["rules"]:
+            self.rule_index = data["rule_index"]
+            self.prefilter = data["prefilter"]
+            self.triage = data["triage"]
+            self.module_triage = data["module_triage"]
+            # 规则集指纹包含CACHE_VERSION，分析逻辑变化时产物本身不一定失效，指纹不保存在产物中而是每次重新计算
+            self.rules_fingerprint = prs_cache.ruleset_fingerprint(self.rules)
+        else:
+            # self.rules中存在其他来源的规则，需要重新构建索引
+            self._build_rule_index()
+        self.file_rules = data["file_rules"]
+        self.file_matcher = data["file_matcher"]
+        LOGGER.debug(f"pypi scanner loaded rules artifact: {artifact_path}")
+        return True
+
+    def save_rules_artifact(self):
+        """校验规则并写入编译产物，由prs compile调用，校验失败或写入失败时只记录日志"""
+        errors = self.validate_rules()
+        if errors:
+            LOGGER.warning("pypi scanner rules artifact is not saved, rules are invalid: " + "; ".join(errors))
+            return False
+        artifact_path = self.get_artifact_path()
+        try:
+            prs_ruleset.save_artifact(artifact_path, prs_ruleset.source_digest(self.rule_path, self.file_rules_path), {
+                "rules": self.rules,
+                "rule_index": self.rule_index,
+                "prefilter": self.prefilter,
+                "triage": self.triage,
+                "module_triage": self.module_triage,
+                "file_rules": self.file_rules,
+                "file_matcher": self.file_matcher,
+            })
+        except Exception as e:
+            LOGGER.warning(f"pypi scanner save rules artifact {artifact_path} failed with: {e}")
+            return False
+        return True
+
+    def validate_rules(self):
+        """校验规则集与文件规则
+
+        :return: 错误信息列表，为空说明校验通过
+        """
+        return prs_ruleset.validate_rules(self.rules) + prs_ruleset.validate_file_rules(self.file_rules_path)
 
     def load_rules(self):
         """加载规则文件
 
-        如果rule_path是目录，则遍历尝试加载其内文件；如果是文件，配置Scanner规则self.rules
+        如果rule_path是目录，则遍历尝试加载其内文件；如果是文件，配置Scanner规则self.rules，
+        加载完成后为规则集构建索引self.rule_index、符号预过滤器self.prefilter、词法级分诊器self.triage，
+        并计算缓存使用的规则集指纹
         """
         if os.path.isdir(self.rule_path):
             for file_name in os.listdir(self.rule_path):
@@ -49,9 +161,20 @@ class PypiScanner:
             LOGGER.error("invalid rule path, rule path needs to be a directory or file")
             print("invalid rule path, rule path needs to be a directory or file")
             exit(-1)
+        self._build_rule_index()
+
+    def _build_rule_index(self):
+        self.rule_index = prs_rule_index.RuleIndex(self.rules)
+        self.prefilter = prs_prefilter.SymbolPrefilter.from_rule_index(self.rule_index)
+        self.triage = prs_triage.TokenTriage.from_rule_index(self.rule_index)
+        self.module_triage = prs_triage.TokenTriage.from_rule_index(self.rule_index, taints=True)
+        self.rules_fingerprint = prs_cache.ruleset_fingerprint(self.rules)
 
     def load_rule(self, rule_path):
         """加载特定的文件"""
+        # 使用规则集编译产物时无需解析YAML，yaml在此处延迟导入
+        import yaml
+
         with open(rule_path, "r") as f:
             rule = yaml.safe_load(f.read())
         if "id" not in rule:
@@ -69,6 +192,7 @@ class PypiScanner:
             - match: "__init__.py"
         支持三种位置：file_dir, file_name, file_path
         支持两种规则：match, regex
+        加载完成后编译为self.file_matcher: match使用集合查找，每个位置的regex合并为一个组合正则表达式
         """
         self.file_rules = {
             "file_dir": {"match": [], "regex": []},
@@ -77,6 +201,8 @@ class PypiScanner:
         }
         if self.file_rules_path is not None:
             if os.path.isfile(self.file_rules_path):
+                import yaml
+
                 try:
                     with open(self.file_rules_path, "r") as f:
                         rules = yaml.safe_load(f.read())
@@ -118,6 +244,7 @@ class PypiScanner:
                 exit(-1)
         else:
             self.file_rules["file_name"]["match"].extend(["setup.py", "__init__.py"])
+        self.file_matcher = prs_file_matcher.FileRuleMatcher.compile(self.file_rules)
 
     def scan_local_file(self, file_path: str):
         """扫描本地文件"""
@@ -141,107 +268,434 @@ class PypiScanner:
 
     def scan_local_tar_gz_file(self, file_path: str):
         """扫描本地的tar.gz文件"""
+        _, file_name = os.path.split(file_path)
+        with open(file_path, "rb") as f:
+            return self.scan_fileobj(f, file_name)
 
+    def scan_local_whl_file(self, file_path: str):
+        """扫描本地的whl文件"""
         _, file_name = os.path.split(file_path)
-        file_base_name, _ = os.path.splitext(file_name)
-        file_base_name, _ = os.path.splitext(file_base_name)
-        tgz_root_dir = os.path.join(prs_utils.TMP_PATH, file_base_name)
+        with open(file_path, "rb") as f:
+            return self.scan_fileobj(f, file_name)
 
-        try:
-            tgz_root_dir = prs_utils.extract_tar_gz_to_dir(file_path, prs_utils.TMP_PATH)
-        except Exception as e:
-            LOGGER.error(f"scanner extract tgz file {file_path} failed with: {e}")
-            try:
-                shutil.rmtree(tgz_root_dir)
-            except Exception as e2:
-                return None
-            return None
+    def scan_bytes(self, data: bytes, file_name: str):
+        """扫描内存中的文件内容
 
-        results = self.scan_local_dir(tgz_root_dir)
-        # 检测后删除解压出的内容
-        shutil.rmtree(tgz_root_dir)
+        :param data: .tar.gz/.whl/.py文件的内容
+        :param file_name: 文件名，用于判断文件类型，并作为结果中的文件标识
+        """
+        if file_name.endswith(".py"):
+            return self.scan_py_bytes(file_name, data)
+        return self.scan_fileobj(io.BytesIO(data), file_name)
 
-        return results
+    def scan_fileobj(self, fileobj, file_name: str):
+        """扫描文件对象
 
-    def scan_local_whl_file(self, file_path: str):
-        """扫描本地的whl文件"""
+        .tar.gz以流模式读取，文件对象无需支持seek；.whl需要可seek的文件对象
 
-        _, file_name = os.path.split(file_path)
-        file_base_name, _ = os.path.splitext(file_name)
-        whl_root_dir = os.path.join(prs_utils.TMP_PATH, file_base_name)
+        :param fileobj: 以二进制模式读取的文件对象
+        :param file_name: 文件名，用于判断文件类型，并作为结果中的文件标识
+        :return: 与scan_local_dir结构相同的检测结果，压缩包损坏时返回None
+        """
+        if file_name.endswith(".py"):
+            return self.scan_py_bytes(file_name, fileobj.read())
+        if file_name.endswith(".tar.gz"):
+            iter_members = prs_archive.iter_tar_gz_members
+            root_name = file_name[:-len(".tar.gz")]
+        elif file_name.endswith(".whl"):
+            iter_members = prs_archive.iter_zip_members
+            root_name = file_name[:-len(".whl")]
+        else:
+            LOGGER.error(f"scanner does not support file type: {file_name}")
+            return None
+        return self._scan_archive(fileobj, file_name, iter_members, root_name)
 
+    def _scan_archive(self, fileobj, file_name: str, iter_members, root_name: str):
+        """扫描压缩包成员
+
+        成员映射到TMP_PATH/root_name下的虚拟路径，与解压到该目录后扫描得到的文件路径一致，
+        文件规则作用于虚拟路径，只保留被选中成员的内容；进行跨模块分析时，未被选中的python成员在第一遍遍历中只保留导入引用，
+        待检测文件直接或间接导入的模块在第二遍遍历中读取，未被导入的模块不保留内容
+        """
+        begin_time = time.time()
+        root_dir = os.path.join(prs_utils.TMP_PATH, root_name)
+        self.file_matcher.clear_cache()
+        all_paths = []
+        selected = set()
+        references = {}     # 未被选中的python成员路径 -> 导入引用
+
+        def select(name):
+            member_path = os.path.join(root_dir, *name.split("/"))
+            all_paths.append(member_path)
+            member_dir, member_file_name = os.path.split(member_path)
+            if self._file_need_scan(member_dir, member_file_name):
+                selected.add(member_path)
+                return True
+            return self.package_flag and member_file_name.endswith(".py")
+
+        archive = prs_archive.seekable_fileobj(fileobj) if self.package_flag else fileobj
         try:
-            whl_root_dir = prs_utils.extract_whl_to_dir(file_path, prs_utils.TMP_PATH)
+            start = archive.tell() if archive is fileobj and self.package_flag else 0
+            modules = {}
+            for name, data in iter_members(archive, select):
+                member_path = os.path.join(root_dir, *name.split("/"))
+                if member_path in selected:
+                    modules[member_path] = data
+                else:
+                    references[member_path] = prs_package.scan_imports(data)[0]
+            file_paths = list(modules)
+            module_paths = file_paths + list(references)
+            if references:
+                graph = prs_package.import_graph(
+                    module_paths, file_paths,
+                    lambda path: references[path] if path in references else prs_package.scan_imports(modules[path])[0])
+                imported = {graph.paths[name] for name in graph.order} - selected
+                if imported:
+                    archive.seek(start)
+                    modules.update((os.path.join(root_dir, *name.split("/")), data) for name, data in iter_members(
+                        archive, lambda name: os.path.join(root_dir, *name.split("/")) in imported))
         except Exception as e:
-            LOGGER.error(f"scanner extract whl file {file_path} failed with: {e}")
-            try:
-                shutil.rmtree(whl_root_dir)
-            except Exception as e2:
-                return None
+            LOGGER.error(f"scanner read archive {file_name} failed with: {e}")
             return None
-
-        results = self.scan_local_dir(whl_root_dir)
-        # 检测后删除解压出的内容
-        shutil.rmtree(whl_root_dir)
+        finally:
+            if archive is not fileobj:
+                archive.close()
+
+        sources = [(path, modules[path]) for path in file_paths]
+        results = self._new_project_results(prs_archive.parse_import_name_from_paths(all_paths))
+        self._scan_project(results, root_dir, file_paths, "scan_py_bytes", sources,
+                           modules=(module_paths, *self._source_module_readers(modules.get, file_paths)))
+        results["total_time"] = time.time() - begin_time
 
         return results
 
     def scan_local_dir(self, dir_path: str):
         """扫描本地的项目文件夹"""
         begin_time = time.time()
-        results = {
-            "import_name": self.parse_import_name(dir_path),
-            "scanned_files": [],
-            "metrics": {"total": {"files": 0, "lines": 0, "cnt": 0, "low": 0, "medium": 0, "high": 0}},
-            "issues": {}
-        }
+        results = self._new_project_results(self.parse_import_name(dir_path))
 
+        self.file_matcher.clear_cache()
+        file_paths = []
+        module_paths = []
         for home, dirs, files in os.walk(dir_path):
+            # 跳过不可能命中文件规则的子目录，其中的模块也不参与跨模块分析
+            self.file_matcher.prune_dirs(home, dirs)
             for filename in files:
                 if self._file_need_scan(home, filename):
-                    file_path = os.path.join(home, filename)
-                    result = self.scan_local_py_file(file_path)
-
-                    # 处理检测结果
-                    results["scanned_files"].append(file_path)
-                    for key, value in result["metrics"]["total"].items():
-                        results["metrics"]["total"][key] += value
-                    results["metrics"][file_path] = result["metrics"]
-                    results["issues"][file_path] = result["issues"][file_path]
+                    file_paths.append(os.path.join(home, filename))
+                if filename.endswith(".py"):
+                    module_paths.append(os.path.join(home, filename))
 
+        self._scan_project(results, dir_path, file_paths, "scan_local_py_file", [(path,) for path in file_paths],
+                           modules=(module_paths, *self._source_module_readers(self._read_file, file_paths)))
         results["total_time"] = time.time() - begin_time
 
         return results
 
+    @staticmethod
+    def _new_metrics_total(files: int):
+        """检测结果中的统计数据，prefiltered为被预过滤跳过的文件数，cache_hits/cache_misses为缓存命中/未命中的文件数，
+        partial为解析失败、超出预算而未完整分析的文件数，
+        triage_clean为被词法级分诊判定无问题的文件数，deep为进行AST污点分析(规则求值)的文件数，
+        fact_hits/fact_misses为事实库命中/未命中的文件数，summary_hits/summary_misses为模块摘要缓存命中/未命中的模块数
+        """
+        return {"files": files, "lines": 0, "cnt": 0, "low": 0, "medium": 0, "high": 0,
+                "prefiltered": 0, "cache_hits": 0, "cache_misses": 0, "partial": 0,
+                "triage_clean": 0, "deep": 0, "fact_hits": 0, "fact_misses": 0,
+                "summary_hits": 0, "summary_misses": 0}
+
+    @staticmethod
+    def _new_tier_time():
+        """分级检测各级的耗时(秒)，triage为词法级分诊，deep为AST解析与污点分析"""
+        return {"triage": 0.0, "deep": 0.0}
+
+    @staticmethod
+    def _new_project_results(import_name: List):
+        return {
+            "import_name": import_name,
+            "scanned_files": [],
+            "metrics": {"total": PypiScanner._new_metrics_total(files=0)},
+            "issues": {},
+            "partial": {},
+            "tier_time": PypiScanner._new_tier_time()
+        }
+
+    def _scan_project(self, results: dict, root: str, file_paths: List, method: str, args_list: List,
+                      modules: Tuple = None):
+        """扫描项目中的全部文件并合并结果，项目预算在此期间生效
+
+        :param root: 项目根目录，记录到事实库中，重新检测事实库时按项目分组
+        :param modules: (项目中全部python文件的路径, read_module, load_facts)，开启跨模块分析时，
+            在扫描前为导入了项目内模块的文件生成PackageContext，read_module/load_facts见prs_package.PackageBuilder
+        """
+        # 项目根目录、预算与模块摘要在创建进程池前设置，worker通过fork继承
+        self._project_root = root
+        if self.budget is not None:
+            self._package_guard = self.budget.package_guard()
+        try:
+            if self.package_flag and modules is not None:
+                self._package_facts = {}
+                self._package_contexts = self._summarize_modules(results, file_paths, *modules)
+            self._merge_file_results(results, file_paths, self._scan_many(method, args_list),
+                                     package_guard=self._package_guard)
+        finally:
+            self._project_root = None
+            self._package_guard = None
+            self._package_contexts = None
+            self._package_facts = None
+
+    def _source_module_readers(self, read_source, file_paths: List):
+        """从源码读取模块的导入引用与事实，待检测文件的事实保留到检测时使用，无需再次解析
+
+        :param read_source: 文件路径 -> 文件内容，读取失败时返回None
+        :return: (read_module, load_facts)
+        """
+        selected = set(file_paths)
+
+        def read_module(path):
+            data = read_source(path)
+            if data is None:
+                return None
+            references, aliases = prs_package.scan_imports(data)
+            verdict, _ = self.module_triage(data)
+            return hashlib.sha256(data).hexdigest(), references, aliases, verdict == prs_triage.VERDICT_DEEP
+
+        def load_facts(path):
+            data = read_source(path)
+            if data is None:
+                return None, "read failed"
+            sha256 = hashlib.sha256(data).hexdigest()
+            if self.fact_store is not None:
+                facts = self.fact_store.get(sha256)
+                if facts is not None:
+                    return facts, None
+            facts, reason = self._run_budgeted(None, "_extract", path, data)
+            # 未被选中的模块只保存事实，不记录文件，重新检测事实库时只能使用被选中的模块
+            if self.fact_store is not None and facts is not None and reason is None:
+                self.fact_store.put(sha256, facts)
+            if path in selected and self.fact_store is None:
+                self._package_facts[path] = (sha256, facts, reason)
+            return facts, reason
+
+        return read_module, load_facts
+
+    def _stored_module_readers(self, records: List):
+        """从事实库读取模块的导入引用与事实
+
+        :param records: 事实库中的(文件路径, 内容sha256, 代码行数)
+        :return: (read_module, load_facts)
+        """
+        hashes = {file_path: sha256 for file_path, sha256, _ in records}
+
+        def read_module(path):
+            facts = self.fact_store.get(hashes[path])
+            if facts is None:
+                return None
+            return hashes[path], facts.imports, facts.import_aliases, True
+
+        def load_facts(path):
+            facts = self.fact_store.get(hashes[path])
+            return facts, None if facts is not None else "facts not stored"
+
+        return read_module, load_facts
+
+    def _summarize_modules(self, results: dict, file_paths: List, module_paths: List, read_module, load_facts):
+        """使用PackageBuilder按项目内部导入图生成模块摘要，并记录摘要缓存的命中情况
+
+        :return: 待检测文件路径 -> prs_package.PackageContext
+        """
+        begin_time = time.time()
+        builder = prs_package.PackageBuilder(
+            rule_index=self.rule_index,
+            fingerprint=self.rules_fingerprint,
+            read_module=read_module,
+            load_facts=load_facts,
+            cache=self.cache,
+            guard=(lambda: self.budget.file_guard(self._package_guard)) if self.budget is not None else None,
+        )
+        contexts = builder.build(module_paths, file_paths, package_guard=self._package_guard)
+        results["metrics"]["total"]["summary_hits"] += builder.summary_hits
+        results["metrics"]["total"]["summary_misses"] += builder.summary_misses
+        results["tier_time"]["deep"] += time.time() - begin_time
+        return contexts
+
+    @staticmethod
+    def _read_file(file_path: str):
+        """读取文件内容，失败时返回None"""
+        try:
+            with open(file_path, "rb") as f:
+                return f.read()
+        except OSError as e:
+            LOGGER.warning(f"read module {file_path} failed with: {e}")
+            return None
+
+    @staticmethod
+    def _merge_file_results(results: dict, file_paths: List, file_results: Iterable,
+                            package_guard: prs_budget.BudgetGuard = None):
+        """按文件顺序将单个文件的检测结果合并入项目检测结果
+
+        每个文件开始前检查项目预算，超出时停止扫描(并行扫描时结束进程池)，剩余文件标记为partial
+        """
+        file_results = iter(file_results)
+        for idx, file_path in enumerate(file_paths):
+            if package_guard is not None:
+                try:
+                    package_guard.check()
+                except prs_budget.BudgetExceeded as e:
+                    LOGGER.warning(f"{e.reason}, skip {len(file_paths) - idx} files")
+                    for skipped_path in file_paths[idx:]:
+                        results["partial"][skipped_path] = f"{e.reason}, not scanned"
+                    results["metrics"]["total"]["partial"] += len(file_paths) - idx
+                    if hasattr(file_results, "close"):
+                        file_results.close()
+                    return
+            result = next(file_results)
+            results["scanned_files"].append(file_path)
+            for key, value in result["metrics"]["total"].items():
+                results["metrics"]["total"][key] += value
+            results["metrics"][file_path] = result["metrics"]
+            results["issues"][file_path] = result["issues"][file_path]
+            results["partial"].update(result["partial"])
+            for key, value in result["tier_time"].items():
+                results["tier_time"][key] += value
+
+    def _scan_many(self, method: str, args_list: List):
+        """依次返回以args_list中各组参数调用self.<method>的扫描结果
+
+        jobs大于1且任务数多于1时将任务分发到进程池并行扫描，worker通过fork继承已加载的规则，
+        无需重新加载；imap保证结果顺序与args_list一致。不支持fork的平台退化为串行扫描
+        """
+        if self.jobs <= 1 or len(args_list) <= 1:
+            return (getattr(self, method)(*args) for args in args_list)
+        import multiprocessing
+
+        if "fork" not in multiprocessing.get_all_start_methods():
+            LOGGER.warning("parallel scanning requires fork start method, fall back to serial scanning")
+            return (getattr(self, method)(*args) for args in args_list)
+        return self._scan_many_parallel(method, args_list)
+
+    def _scan_many_parallel(self, method: str, args_list: List):
+        """使用进程池并行扫描"""
+        import multiprocessing
+
+        processes = min(self.jobs, len(args_list))
+        chunksize = max(1, len(args_list) // (processes * 4))
+        with multiprocessing.get_context("fork").Pool(processes=processes,
+                                                      initializer=_init_scan_worker,
+                                                      initargs=(self,)) as pool:
+            yield from pool.imap(_scan_in_worker, [(method, args) for args in args_list], chunksize=chunksize)
+
     def scan_local_py_file(self, file_path: str):
         """扫描本地的单个python文件"""
         if self.print_flag:
             print("Scanning file:", file_path)
 
-        begin_time = time.time()
+        # 读取文件，一次遍历完成哈希、统计数据与预过滤的计算
+        ingestion = prs_ingestion.ingest_file(file_path, prefilter=self.prefilter if self.prefilter_flag else None)
+        return self._scan_ingestion(file_path, ingestion)
 
-        results = {
-            "metrics": {"total": {"files": 1, "lines": 0, "cnt": 0, "low": 0, "medium": 0, "high": 0}},
-            "issues": {}
+    def scan_py_bytes(self, file_path: str, data: bytes):
+        """扫描内存中的单个python文件内容
+
+        :param file_path: 文件路径，仅作为结果中的文件标识
+        :param data: .py文件内容
+        """
+        if self.print_flag:
+            print("Scanning file:", file_path)
+
+        ingestion = prs_ingestion.ingest_bytes(file_path, data, prefilter=self.prefilter if self.prefilter_flag else None)
+        return self._scan_ingestion(file_path, ingestion)
+
+    @staticmethod
+    def _new_file_results():
+        return {
+            "metrics": {"total": PypiScanner._new_metrics_total(files=1)},
+            "issues": {},
+            "partial": {},
+            "tier_time": PypiScanner._new_tier_time()
         }
 
-        with open(file_path, "rb") as f:
-            fdata = f.read()
+    def _scan_ingestion(self, file_path: str, ingestion: prs_ingestion.FileIngestion):
+        """对读取阶段的结果进行AST解析与污点分析"""
+        begin_time = time.time()
 
-        # 计算文件统计数据
-        metrics = self._parse_metrics(file_path, fdata)
-        results["metrics"]["total"]["lines"] += metrics["lines"]
+        results = self._new_file_results()
+        # 导入了项目内模块的文件，检测结果还依赖于这些模块的摘要
+        context = self._package_contexts.get(file_path) if self._package_contexts else None
+        fingerprint = self.rules_fingerprint if context is None else f"{self.rules_fingerprint}:{context.digest}"
+        package_sinks = context.sink_names if context is not None else ()
 
-        # 解析AST，使用TaintNodeVisitor分析AST
-        node = self._parse_ast(fdata=fdata)
-        node_visitor = prs_node_visitor.TaintNodeVisitor(
-            rules=self.rules,
-            filepath=file_path,
-        )
-        node_visitor.generic_visit(node)
+        try:
+            results["metrics"]["total"]["lines"] += ingestion.code_lines
+
+            # 使用事实库时保存全部被选中文件的事实，规则集变化后无需源码即可重新求值
+            facts = None
+            fact_reason = None
+            if self.fact_store is not None:
+                tier_begin = time.time()
+                facts, fact_reason = self._load_facts(file_path, ingestion, results)
+                results["tier_time"]["deep"] += time.time() - tier_begin
+
+            # 文件中未出现任何sink标识符，不可能命中规则，跳过AST解析；导入的项目内函数中存在sink时交由分诊判断
+            if not package_sinks and ingestion.prefilter_hits is not None and not ingestion.prefilter_hits:
+                LOGGER.debug(f"file clean by prefilter: {file_path}")
+                results["metrics"]["total"]["prefiltered"] += 1
+                results["issues"][file_path] = []
+                results["metrics"][file_path] = results["metrics"].copy()
+                results["total_time"] = time.time() - begin_time
+                return results
+
+            # 内容与规则集均未变化的文件直接使用缓存的检测结果
+            result = None
+            reason = None
+            if self.cache is not None:
+                result = self.cache.get(ingestion.sha256, fingerprint, file_path)
+                results["metrics"]["total"]["cache_hits" if result is not None else "cache_misses"] += 1
+
+            # 第一级: 词法级分诊，代码中不可能调用任何sink函数的文件无需AST分析
+            if result is None and self.triage_flag:
+                tier_begin = time.time()
+                verdict, _ = self.triage(ingestion.data, package_sinks)
+                results["tier_time"]["triage"] += time.time() - tier_begin
+                if verdict == prs_triage.VERDICT_CLEAN:
+                    LOGGER.debug(f"file clean by triage: {file_path}")
+                    results["metrics"]["total"]["triage_clean"] += 1
+                    result = []
+                    if self.cache is not None:
+                        self.cache.put(ingestion.sha256, fingerprint, result)
+
+            # 第二级: 解析AST并使用TaintNodeVisitor分析，使用事实库时对事实求值
+            if result is None:
+                tier_begin = time.time()
+                extracted = self._package_facts.pop(file_path, None) if self._package_facts else None
+                if self.fact_store is not None:
+                    result, reason = self._evaluate_facts(file_path, facts, fact_reason, context)
+                elif extracted is not None and extracted[0] == ingestion.sha256:
+                    result, reason = self._evaluate_facts(file_path, extracted[1], extracted[2], context)
+                else:
+                    result, reason = self._analyze_data(file_path, ingestion.data, context)
+                results["tier_time"]["deep"] += time.time() - tier_begin
+                results["metrics"]["total"]["deep"] += 1
+                # 只缓存完整的检测结果
+                if self.cache is not None and reason is None:
+                    self.cache.put(ingestion.sha256, fingerprint, result)
+        finally:
+            ingestion.close()
+
+        self._add_file_result(results, file_path, result, reason)
+        results["total_time"] = time.time() - begin_time
+
+        return results
+
+    @staticmethod
+    def _add_file_result(results: dict, file_path: str, result: List, reason: str = None):
+        """将单个文件的issue列表及未完整分析的原因加入results"""
+        if reason is not None:
+            LOGGER.warning(f"file {file_path} partially scanned: {reason}")
+            results["partial"][file_path] = reason
+            results["metrics"]["total"]["partial"] += 1
 
         # 将文件扫描结果加入results
-        result = node_visitor.results
         results["issues"][file_path] = result
         for issue in result:
             results["metrics"]["total"]["cnt"] += 1
@@ -253,10 +707,179 @@ class PypiScanner:
                 results["metrics"]["total"]["low"] += 1
 
         results["metrics"][file_path] = results["metrics"].copy()
+
+    def scan_fact_store(self, path_prefix: str = ""):
+        """不读取源码，使用事实库中保存的事实按当前规则集重新检测路径以path_prefix开头的文件
+
+        事实未保存(解析失败、超出预算)的文件标记为partial；
+        文件按扫描时所属的项目分组，每个项目分别生成模块摘要与检测结果，不同项目中同名的模块互不影响
+
+        :return: 项目根目录 -> 与scan_local_dir结构相同的检测结果
+        """
+        project_results = {}
+        for root, records in self.fact_store.iter_projects(path_prefix):
+            begin_time = time.time()
+            file_paths = [file_path for file_path, _, _ in records]
+            results = self._new_project_results(prs_archive.parse_import_name_from_paths(file_paths))
+            self._scan_project(results, root, file_paths, "_scan_stored_facts", records,
+                               modules=(file_paths, *self._stored_module_readers(records)))
+            results["total_time"] = time.time() - begin_time
+            project_results[root] = results
+
+        return project_results
+
+    def _scan_stored_facts(self, file_path: str, sha256: str, lines: int):
+        """使用事实库中保存的事实检测单个文件"""
+        begin_time = time.time()
+
+        results = self._new_file_results()
+        results["metrics"]["total"]["lines"] += lines
+        context = self._package_contexts.get(file_path) if self._package_contexts else None
+        fingerprint = self.rules_fingerprint if context is None else f"{self.rules_fingerprint}:{context.digest}"
+
+        result = None
+        reason = None
+        if self.cache is not None:
+            result = self.cache.get(sha256, fingerprint, file_path)
+            results["metrics"]["total"]["cache_hits" if result is not None else "cache_misses"] += 1
+
+        if result is None:
+            facts = self.fact_store.get(sha256)
+            results["metrics"]["total"]["fact_hits" if facts is not None else "fact_misses"] += 1
+            tier_begin = time.time()
+            result, reason = self._evaluate_facts(file_path, facts, None if facts is not None else "facts not stored",
+                                                  context)
+            results["tier_time"]["deep"] += time.time() - tier_begin
+            results["metrics"]["total"]["deep"] += 1
+            if self.cache is not None and reason is None:
+                self.cache.put(sha256, fingerprint, result)
+
+        self._add_file_result(results, file_path, result, reason)
         results["total_time"] = time.time() - begin_time
 
         return results
 
+    def _run_budgeted(self, default, method: str, file_path: str, data, **kwargs):
+        """在文件预算下执行self.method(file_path, data, guard=guard, **kwargs)
+
+        设置了预算时，开启isolate_flag则在子进程中执行，超时后结束子进程；
+        当前进程存在其他线程时不直接fork，交由以forkserver启动的隔离worker执行
+
+        :param method: 以预算检查器为guard参数，返回(结果, 未完整分析的原因)的方法名
+        :param default: 子进程被结束时返回的结果
+        """
+        func = getattr(self, method)
+        if self.budget is None:
+            return func(file_path, data, **kwargs)
+        guard = self.budget.file_guard(self._package_guard)
+        if not (self.isolate_flag and prs_budget.isolation_supported()):
+            return func(file_path, data, guard=guard, **kwargs)
+
+        # ast.parse无法在进程内中止，由父进程在截止时间后结束子进程
+        timeout = guard.remaining_time()
+        if timeout is not None:
+            timeout += prs_budget.ISOLATE_GRACE_TIME
+        try:
+            if threading.active_count() == 1:
+                return prs_budget.run_isolated(lambda: func(file_path, data, guard=guard, **kwargs), timeout=timeout)
+            if self._isolated_worker is None:
+                self._isolated_worker = prs_budget.IsolatedWorker(self)
+            return self._isolated_worker.run(method, (file_path, bytes(data)), dict(kwargs, guard=guard),
+                                             timeout=timeout)
+        except prs_budget.BudgetExceeded as e:
+            return default, e.reason
+
+    def _analyze_data(self, file_path: str, data, package: prs_package.PackageContext = None):
+        """解析并分析单个文件的内容
+
+        :return: (issue列表, 未完整分析的原因)，完整分析时原因为None
+        """
+        return self._run_budgeted([], "_analyze", file_path, data, package=package)
+
+    def _analyze(self, file_path: str, data, guard: prs_budget.BudgetGuard = None,
+                 package: prs_package.PackageContext = None):
+        """解析AST并使用TaintNodeVisitor分析，解析失败或超出预算时返回已发现的issue及原因"""
+        try:
+            node = self._parse_ast(fdata=data)
+        except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+            return [], f"parse failed: {type(e).__name__}: {e}"
+
+        node_visitor = prs_node_visitor.TaintNodeVisitor(
+            rules=self.rules,
+            rule_index=self.rule_index,
+            filepath=file_path,
+            guard=guard,
+            package=package,
+        )
+        try:
+            if guard is not None:
+                guard.check()
+            node_visitor.generic_visit(node)
+        except prs_budget.BudgetExceeded as e:
+            return node_visitor.results, e.reason
+        except MemoryError:
+            return node_visitor.results, "analysis failed: MemoryError"
+        return node_visitor.results, node_visitor.evaluator.partial
+
+    def _load_facts(self, file_path: str, ingestion: prs_ingestion.FileIngestion, results: dict):
+        """从事实库获取文件的事实，不存在时解析AST抽取事实，只保存完整抽取的事实
+
+        :return: (事实, 未完整抽取的原因)，解析失败时事实为None
+        """
+        self.fact_store.record_file(file_path, ingestion.sha256, ingestion.code_lines, project=self._project_root)
+        facts = self.fact_store.get(ingestion.sha256)
+        if facts is not None:
+            results["metrics"]["total"]["fact_hits"] += 1
+            return facts, None
+
+        results["metrics"]["total"]["fact_misses"] += 1
+        facts, reason = self._run_budgeted(None, "_extract", file_path, ingestion.data)
+        if facts is not None and reason is None:
+            self.fact_store.put(ingestion.sha256, facts)
+        return facts, reason
+
+    def _extract(self, file_path: str, data, guard: prs_budget.BudgetGuard = None):
+        """解析AST并抽取文件事实，解析失败或超出预算时返回已抽取的事实及原因"""
+        try:
+            node = self._parse_ast(fdata=data)
+        except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+            return None, f"parse failed: {type(e).__name__}: {e}"
+
+        node_visitor = prs_node_visitor.TaintNodeVisitor(rule_index=self.rule_index, filepath=file_path, guard=guard)
+        try:
+            if guard is not None:
+                guard.check()
+            node_visitor.extract(node)
+        except prs_budget.BudgetExceeded as e:
+            return node_visitor.facts, e.reason
+        except MemoryError:
+            return node_visitor.facts, "analysis failed: MemoryError"
+        return node_visitor.facts, None
+
+    def _evaluate_facts(self, file_path: str, facts: prs_facts.FileFacts, reason: str = None,
+                        package: prs_package.PackageContext = None):
+        """使用当前规则集对文件事实求值
+
+        :param reason: 事实未完整抽取的原因，未完整抽取的事实规模已受抽取预算限制，求值时不再检查预算
+        :param package: 文件可见的项目内模块摘要
+        :return: (issue列表, 未完整分析的原因)
+        """
+        if facts is None:
+            return [], reason
+        guard = None
+        if reason is None and self.budget is not None:
+            guard = self.budget.file_guard(self._package_guard)
+
+        evaluator = prs_evaluator.FactEvaluator(rule_index=self.rule_index, filepath=file_path, guard=guard,
+                                                package=package)
+        try:
+            evaluator.evaluate(facts)
+        except prs_budget.BudgetExceeded as e:
+            return evaluator.results, e.reason
+        except MemoryError:
+            return evaluator.results, "analysis failed: MemoryError"
+        return evaluator.results, reason or evaluator.partial
+
     @staticmethod
     def parse_import_name(dir_path: str):
         """根据项目文件夹的组织形式解析project的import name
@@ -281,28 +904,7 @@ class PypiScanner:
 
     def _file_need_scan(self, file_dir, file_name):
         """根据self.file_rules检查文件是否需要被检测"""
-        file_path = os.path.join(file_dir, file_name)
-        if not file_name.endswith(".py"):
-            return False
-        for match in self.file_rules["file_dir"]["match"]:
-            if file_dir == match:
-                return True
-        for regex in self.file_rules["file_dir"]["regex"]:
-            if regex.search(file_dir):
-                return True
-        for match in self.file_rules["file_name"]["match"]:
-            if file_name == match:
-                return True
-        for regex in self.file_rules["file_name"]["regex"]:
-            if regex.search(file_name):
-                return True
-        for match in self.file_rules["file_path"]["match"]:
-            if file_path == match:
-                return True
-        for regex in self.file_rules["file_path"]["regex"]:
-            if regex.search(file_path):
-                return True
-        return False
+        return self.file_matcher.need_scan(file_dir, file_name)
 
     @staticmethod
     def _parse_metrics(file_path, fdata):
@@ -311,13 +913,8 @@ class PypiScanner:
             "lines": 0
         }
 
-        lines = fdata.splitlines()
-
-        def proc(line):
-            tmp = line.strip()
-            return bool(tmp and not tmp.startswith(b"#"))
-
-        metrics["lines"] += sum(proc(line) for line in lines)
+        _, code_lines = prs_ingestion.count_lines(fdata)
+        metrics["lines"] += code_lines
 
         return metrics
 
@@ -332,12 +929,25 @@ class PypiScanner:
 
         return node
 
-    def print_results_beautiful(self, results: dict):
+    @staticmethod
+    def print_results_beautiful(results: dict):
         """在命令行模式下美观打印结果"""
         print("Scan finished")
         print("Total time used:", results["total_time"])
         print("Totally scanned files:", results["metrics"]["total"]["files"],
               ", lines:", results["metrics"]["total"]["lines"])
+        print("Skipped by prefilter:", results["metrics"]["total"].get("prefiltered", 0),
+              ", cache hits:", results["metrics"]["total"].get("cache_hits", 0),
+              ", cache misses:", results["metrics"]["total"].get("cache_misses", 0))
+        if "tier_time" in results:
+            print("Cleared by triage:", results["metrics"]["total"]["triage_clean"],
+                  ", time:", results["tier_time"]["triage"],
+                  ", deep analyzed:", results["metrics"]["total"]["deep"],
+                  ", time:", results["tier_time"]["deep"])
+        if results.get("partial"):
+            print("Partially scanned files:", len(results["partial"]))
+            for file_path, reason in results["partial"].items():
+                print("\t" + file_path + ":", reason)
         print("Totally found issues:", results["metrics"]["total"]["cnt"], ", low:", results["metrics"]["total"]["low"],
               ", medium:", results["metrics"]["total"]["medium"], ", high:", results["metrics"]["total"]["high"])
         if results["metrics"]["total"]["cnt"] == 0:
@@ -354,9 +964,10 @@ class PypiScanner:
                           ", medium:", results["metrics"][file_path]["total"]["medium"],
                           ", high:", results["metrics"][file_path]["total"]["high"])
                     for issue in issues:
-                        self._print_issue_beautiful(issue)
+                        PypiScanner._print_issue_beautiful(issue)
 
-    def _print_issue_beautiful(self, issue: dict):
+    @staticmethod
+    def _print_issue_beautiful(issue: dict):
         """美观打印issue"""
         print("Issue:")
         print("\tid:".expandtabs(4), issue["id"])
@@ -378,3 +989,17 @@ class PypiScanner:
         print("\t\tsinked at:".expandtabs(4), issue["sink"][issue["sink"]["accordance"]])
         print("\t\tlineno:".expandtabs(4), issue["sink"]["lineno"], ", col offset:", issue["sink"]["col_offset"])
         print("\t\tend lineno:".expandtabs(4), issue["sink"]["end_lineno"], ", end col offset:", issue["sink"]["end_col_offset"])
+
+
+# 并行扫描时worker进程中使用的scanner，fork后与主进程共享已加载的规则
+_WORKER_SCANNER = None
+
+
+def _init_scan_worker(scanner: PypiScanner):
+    global _WORKER_SCANNER
+    _WORKER_SCANNER = scanner
+
+
+def _scan_in_worker(task):
+    method, args = task
+    return getattr(_WORKER_SCANNER, method)(*args)
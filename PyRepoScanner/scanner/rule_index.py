@@ -0,0 +1,192 @@
+"""
+规则索引
+
+在规则集加载完成后一次性构建:
+- 按函数全称/属性全称组织预先生成的taint与sink模板，使TaintNodeVisitor对每个节点只需一次字典查找即可完成污点标记
+- 将非00开头的组合规则编译为以sink id/type为键的匹配计划，污点检测时只访问与节点sink相关的组合规则
+- 将accordance为literal的taint规则中的正则合并为一个正则，对文件中的全部字符串常量一次匹配
+"""
+
+
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+
+LITERAL_GROUP = "_literal"     # 合并literal正则时各规则正则的分组名前缀
+
+
+def _intern_template(template):
+    """intern模板中的字符串字段，使同一规则生成的所有taint/sink共享字符串对象"""
+    return {key: sys.intern(value) if isinstance(value, str) else value for key, value in template.items()}
+
+
+@dataclass
+class IndexEntry:
+    """同一函数/属性全称下的taint与sink模板
+
+    模板为构造prs_issue.Taint/prs_issue.Sink所需的规则字段，字符串字段均已intern，
+    节点位置信息(lineno等)在标记时补充
+    """
+    taints: List = field(default_factory=lambda: [])
+    sinks: List = field(default_factory=lambda: [])
+
+
+@dataclass
+class CompositeRule:
+    """编译后的组合规则(非00开头，由taints和sinks共同构成)
+
+    matches[sink_order]为该sink规则下可接受的taint表:
+    (accordance, value) -> [(taint_order, severity, confidence), ...]，
+    severity/confidence已取taint规则与sink规则中的较大值
+    """
+    id: str
+    name: str
+    template: str
+    order: int
+    taint_accordances: Tuple = ()
+    matches: List = field(default_factory=lambda: [])
+
+
+@dataclass
+class CompositeSink:
+    """匹配计划中的一条sink规则"""
+    rule: CompositeRule
+    sink_order: int
+
+
+@dataclass
+class RuleIndex:
+    """按accordance对规则集建立的索引"""
+    rules: dict = None
+    functions: Dict = field(default_factory=lambda: dict())     # function -> IndexEntry
+    attributes: Dict = field(default_factory=lambda: dict())    # attribute -> IndexEntry
+    composite_sinks: Dict = field(default_factory=lambda: dict())   # (accordance, value) -> [CompositeSink, ...]
+    sink_accordances: Tuple = ()
+    literals: List = field(default_factory=lambda: [])          # literal taint模板，下标对应合并正则中的分组
+    literal_regex: Any = None                                   # 合并后的literal正则，没有literal规则时为None
+
+    def __post_init__(self):
+        self.build()
+
+    def build(self):
+        """遍历规则集构建索引
+
+        保持规则集及规则内taint/sink的原有顺序，以保证标记顺序与逐条匹配时一致
+        """
+        self.functions = {}
+        self.attributes = {}
+        self.composite_sinks = {}
+        self.sink_accordances = ()
+        self.literals = []
+        self.literal_regex = None
+        if not self.rules:
+            return
+
+        patterns = []
+        for order, (_id, rule) in enumerate(self.rules.items()):
+            # 00开头的规则预留给敏感函数分类规则，其余为taint-sink组合规则
+            if not _id.startswith("00"):
+                self._compile_composite_rule(_id, rule, order)
+                continue
+
+            rule_type = rule["type"] if "type" in rule else ""
+            if "taints" in rule:
+                for taint_rule in rule["taints"]:
+                    accordance = taint_rule["accordance"]
+                    if accordance == "function":
+                        self.functions.setdefault(taint_rule["function"], IndexEntry()).taints.append(_intern_template({
+                            "id": _id,
+                            "accordance": accordance,
+                            "type": rule_type,
+                            "function": taint_rule["function"],
+                            "position": taint_rule["position"] if "position" in taint_rule else None,
+                            "keyword": taint_rule["keyword"] if "keyword" in taint_rule else None,
+                        }))
+                    # attribute仅污染返回值
+                    elif accordance == "attribute" and taint_rule.get("position") == "ret":
+                        self.attributes.setdefault(taint_rule["attribute"], IndexEntry()).taints.append(_intern_template({
+                            "id": _id,
+                            "accordance": accordance,
+                            "type": rule_type,
+                            "attribute": taint_rule["attribute"],
+                            "position": "ret",
+                        }))
+                    # literal匹配字符串常量，污染常量本身
+                    elif accordance == "literal":
+                        patterns.append(taint_rule["literal"])
+                        self.literals.append(_intern_template({
+                            "id": _id,
+                            "accordance": accordance,
+                            "type": rule_type,
+                        }))
+            if "sinks" in rule:
+                for sink_rule in rule["sinks"]:
+                    if sink_rule["accordance"] == "function":
+                        self.functions.setdefault(sink_rule["function"], IndexEntry()).sinks.append(_intern_template({
+                            "id": _id,
+                            "accordance": sink_rule["accordance"],
+                            "function": sink_rule["function"],
+                            "type": rule_type,
+                            "position": sink_rule["position"] if "position" in sink_rule else None,
+                            "keyword": sink_rule["keyword"] if "keyword" in sink_rule else None,
+                        }))
+
+        # 各正则作为命名分组合并，匹配时由lastgroup得到命中的规则
+        if patterns:
+            self.literal_regex = re.compile("|".join(f"(?P<{LITERAL_GROUP}{idx}>{pattern})"
+                                                     for idx, pattern in enumerate(patterns)))
+
+    def match_literals(self, values) -> Dict:
+        """以合并后的正则匹配字符串常量，每个字符串只扫描一次
+
+        :param values: 字符串常量列表
+        :return: 命中的常量下标 -> [(literal taint模板, 命中的文本), ...]
+        """
+        hits = {}
+        regex = self.literal_regex
+        if regex is None:
+            return hits
+        for idx, value in enumerate(values):
+            for match in regex.finditer(value):
+                template = self.literals[int(match.lastgroup[len(LITERAL_GROUP):])]
+                hits.setdefault(idx, {}).setdefault((template["id"], match.group()), (template, match.group()))
+        return {idx: list(matches.values()) for idx, matches in hits.items()}
+
+    def _compile_composite_rule(self, _id, rule, order):
+        """将组合规则编译进匹配计划"""
+        if "taints" not in rule or "sinks" not in rule:
+            return
+
+        composite_rule = CompositeRule(
+            id=_id,
+            name=rule["name"] if "name" in rule else "",
+            template=rule["template"] if "template" in rule else "",
+            order=order,
+            taint_accordances=tuple(dict.fromkeys(taint_rule["accordance"] for taint_rule in rule["taints"])),
+        )
+
+        sink_accordances = list(self.sink_accordances)
+        for sink_order, sink_rule in enumerate(rule["sinks"]):
+            accordance = sink_rule["accordance"]
+            taint_table = {}
+            for taint_order, taint_rule in enumerate(rule["taints"]):
+                taint_accordance = taint_rule["accordance"]
+                if taint_accordance not in taint_rule:
+                    continue
+                taint_table.setdefault((taint_accordance, taint_rule[taint_accordance]), []).append((
+                    taint_order,
+                    max(taint_rule["severity"], sink_rule["severity"]),
+                    max(taint_rule["confidence"], sink_rule["confidence"]),
+                ))
+            composite_rule.matches.append(taint_table)
+
+            if accordance not in sink_rule:
+                continue
+            self.composite_sinks.setdefault((accordance, sink_rule[accordance]), []).append(
+                CompositeSink(rule=composite_rule, sink_order=sink_order)
+            )
+            if accordance not in sink_accordances:
+                sink_accordances.append(accordance)
+        self.sink_accordances = tuple(sink_accordances)
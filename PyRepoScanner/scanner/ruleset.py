@@ -0,0 +1,174 @@
+"""
+规则集编译产物
+
+由prs compile将YAML规则与文件规则校验后，连同规则索引、预过滤器、文件规则匹配器等加载后的结构一并序列化为带版本号的二进制文件，
+构造scanner时只需读取一次pickle即可，无需逐个yaml.safe_load并重新构建索引，构造scanner本身不会生成产物；
+产物头部记录了版本号与源规则文件内容的摘要，源规则变化时产物自动失效。
+产物为pickle，只读取当前用户所有且其他用户不可写的产物，且在反序列化前校验头部，不对过期或来源不明的产物执行pickle.load
+"""
+
+
+import os
+import re
+import pickle
+import hashlib
+import logging
+from typing import List
+
+
+LOGGER = logging.getLogger()
+ARTIFACT_VERSION = 6            # 产物中的数据结构变化时递增
+ARTIFACT_SUFFIX = ".prsc"
+ARTIFACT_MAGIC = b"PRSC"
+ACCORDANCES = ("function", "attribute", "type", "id", "literal")
+
+
+def default_artifact_path(rule_path: str) -> str:
+    """规则路径对应的默认产物路径，e.g. ./rules -> ./rules.prsc"""
+    return os.path.normpath(rule_path) + ARTIFACT_SUFFIX
+
+
+def list_rule_files(rule_path: str) -> List:
+    """按PypiScanner.load_rules的加载顺序返回规则文件列表"""
+    if os.path.isdir(rule_path):
+        return [os.path.join(rule_path, file_name) for file_name in os.listdir(rule_path)
+                if os.path.isfile(os.path.join(rule_path, file_name))]
+    if os.path.isfile(rule_path):
+        return [rule_path]
+    return []
+
+
+def source_digest(rule_path: str, file_rules_path: str = None) -> str:
+    """计算源规则文件(含加载顺序)与文件规则的摘要"""
+    digest = hashlib.sha256(f"{ARTIFACT_VERSION}".encode())
+    for rule_file in list_rule_files(rule_path):
+        digest.update(os.path.basename(rule_file).encode() + b"\0")
+        with open(rule_file, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    digest.update(b"\0file_rules\0")
+    if file_rules_path is not None and os.path.isfile(file_rules_path):
+        with open(file_rules_path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def validate_rules(rules: dict) -> List:
+    """校验已加载的规则集
+
+    :return: 错误信息列表，为空说明校验通过
+    """
+    errors = []
+    literals = []
+    for _id, rule in rules.items():
+        is_composite = not _id.startswith("00")
+        if is_composite and ("taints" not in rule or "sinks" not in rule):
+            errors.append(f"rule {_id}: composite rule requires both taints and sinks")
+        for kind in ("taints", "sinks"):
+            entries = rule.get(kind, [])
+            if not isinstance(entries, list):
+                errors.append(f"rule {_id}: {kind} should be a list")
+                continue
+            for idx, entry in enumerate(entries):
+                where = f"rule {_id}: {kind}[{idx}]"
+                if not isinstance(entry, dict) or entry.get("accordance") not in ACCORDANCES:
+                    errors.append(f"{where}: accordance should be one of {', '.join(ACCORDANCES)}")
+                    continue
+                if entry["accordance"] not in entry:
+                    errors.append(f"{where}: missing {entry['accordance']}")
+                elif entry["accordance"] == "literal":
+                    literals.append((where, entry["literal"]))
+                if is_composite:
+                    for key in ("severity", "confidence"):
+                        if not isinstance(entry.get(key), int):
+                            errors.append(f"{where}: {key} should be an integer")
+    # literal正则在规则索引中合并为一个正则，不能使用编号反向引用，命名分组不能重名
+    for where, pattern in literals:
+        try:
+            re.compile(pattern)
+        except (re.error, TypeError) as e:
+            errors.append(f"{where}: invalid literal regex {pattern!r}: {e}")
+        else:
+            if re.search(r"\\[1-9]", pattern):
+                errors.append(f"{where}: literal regex {pattern!r} should not use numbered backreferences")
+    if literals and not errors:
+        try:
+            re.compile("|".join(f"(?:{pattern})" for _, pattern in literals))
+        except re.error as e:
+            errors.append(f"literal regexes can not be combined: {e}")
+    return errors
+
+
+def validate_file_rules(file_rules_path: str) -> List:
+    """校验文件规则，规则结构见PypiScanner.load_file_rules
+
+    :return: 错误信息列表，为空说明校验通过
+    """
+    if file_rules_path is None:
+        return []
+    import yaml
+
+    try:
+        with open(file_rules_path, "r") as f:
+            file_rules = yaml.safe_load(f.read())
+    except Exception as e:
+        return [f"file rules {file_rules_path}: {e}"]
+
+    errors = []
+    if not isinstance(file_rules, dict):
+        return [f"file rules {file_rules_path}: should be a mapping"]
+    for location, entries in file_rules.items():
+        if location not in ("file_dir", "file_name", "file_path"):
+            errors.append(f"file rules: unknown location {location}")
+            continue
+        for idx, entry in enumerate(entries or []):
+            if not isinstance(entry, dict) or not ("match" in entry or "regex" in entry):
+                errors.append(f"file rules: {location}[{idx}] requires match or regex")
+                continue
+            if "regex" in entry:
+                try:
+                    re.compile(entry["regex"])
+                except re.error as e:
+                    errors.append(f"file rules: {location}[{idx}] invalid regex {entry['regex']!r}: {e}")
+    return errors
+
+
+def _artifact_header(digest: str) -> bytes:
+    return ARTIFACT_MAGIC + f" {ARTIFACT_VERSION} {digest}\n".encode()
+
+
+def _trusted_artifact(artifact_path: str) -> bool:
+    """产物是否由当前用户所有且其他用户不可写，不支持文件属主的平台上不做检查"""
+    if not hasattr(os, "getuid"):
+        return True
+    stat = os.stat(artifact_path)
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+def save_artifact(artifact_path: str, digest: str, data: dict):
+    """写入产物，先写临时文件再替换，避免并发读取到不完整的产物"""
+    tmp_path = f"{artifact_path}.{os.getpid()}.tmp"
+    with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644), "wb") as f:
+        f.write(_artifact_header(digest))
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, artifact_path)
+
+
+def load_artifact(artifact_path: str, digest: str):
+    """读取产物，产物不存在、不可信、版本不符或源规则已变化时返回None
+
+    头部与版本号、摘要一致时才反序列化，过期的产物不会被pickle.load
+    """
+    if not os.path.isfile(artifact_path):
+        return None
+    try:
+        if not _trusted_artifact(artifact_path):
+            LOGGER.warning(f"rules artifact {artifact_path} is ignored, it should be owned by the current user "
+                           f"and not writable by others")
+            return None
+        with open(artifact_path, "rb") as f:
+            if f.readline() != _artifact_header(digest):
+                return None
+            return pickle.load(f)
+    except Exception as e:
+        LOGGER.warning(f"load rules artifact {artifact_path} failed with: {e}")
+        return None
@@ -0,0 +1,70 @@
+"""
+TaintNodeVisitor使用的作用域链与变量记录
+"""
+
+
+class Variable:
+    """变量表中的一条变量记录
+
+    - taints: 变量携带的taint，以dict作为有序集合
+    - value: 变量被静态赋值时的常量值
+    - variable: 变量指向的其他变量/模块/函数全称
+    - position, keyword: 函数形参的位置与关键字
+    - serial: 创建taints时所在作用域的求值序号，与作用域当前序号不同时taints为多个变量表共享，修改前需要复制
+    """
+    __slots__ = ("taints", "value", "variable", "position", "keyword", "serial")
+
+    def __init__(self, taints=None, value=None, variable=None, position=None, keyword=None, serial=0):
+        self.taints = taints if taints is not None else {}
+        self.value = value
+        self.variable = variable
+        self.position = position
+        self.keyword = keyword
+        self.serial = serial
+
+    def copy(self):
+        """浅拷贝变量记录，拷贝结果与原变量共享taints"""
+        return Variable(self.taints, self.value, self.variable, self.position, self.keyword, self.serial)
+
+    def __repr__(self):
+        return f"Variable(taints={list(self.taints)}, value={self.value!r}, variable={self.variable!r}, " \
+               f"position={self.position!r}, keyword={self.keyword!r})"
+
+
+class Scope:
+    """命名空间(模块/类/函数)对应的作用域
+
+    通过parent指针组成作用域链，变量查找沿链向上进行；
+    同名子作用域只创建一次，重复定义的类/函数共享同一变量表
+    """
+    __slots__ = ("name", "qualname", "parent", "variables", "children", "serial")
+
+    def __init__(self, name: str, parent: "Scope" = None):
+        self.name = name
+        self.qualname = name if parent is None else f"{parent.qualname}.{name}"
+        self.parent = parent
+        self.variables = {}     # 变量名 -> Variable
+        self.children = {}      # 子作用域名 -> Scope
+        self.serial = 0         # 按控制流图求值时当前基本块的求值序号
+
+    def child(self, name: str):
+        """获取名为name的子作用域，不存在时创建"""
+        scope = self.children.get(name)
+        if scope is None:
+            scope = self.children[name] = Scope(name, self)
+        return scope
+
+    def lookup(self, var: str):
+        """从当前作用域开始沿作用域链向上查找变量所在的作用域
+
+        :return: Scope / None
+        """
+        scope = self
+        while scope is not None:
+            if var in scope.variables:
+                return scope
+            scope = scope.parent
+        return None
+
+    def __repr__(self):
+        return f"Scope({self.qualname!r})"
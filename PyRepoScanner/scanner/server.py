@@ -0,0 +1,247 @@
+"""
+常驻扫描服务
+
+prs serve启动后常驻一个已加载规则的PypiScanner(及可选的进程池)，通过Unix domain socket接收扫描请求，
+省去每次prs scan的解释器启动、模块导入与规则加载开销。
+
+协议为每行一个JSON对象，同一连接上可依次发送多个请求:
+- {"method": "scan_local_file", "path": "...", "cwd": "..."}: 扫描客户端所在工作目录下的路径
+- {"method": "scan_bytes", "file_name": "...", "data": "<base64>"}: 扫描文件内容
+- {"method": "ping"}
+响应为{"status": "ok", "results": ...}或{"status": "error", "error": "..."}，
+results与scan_local_file的返回值相同
+"""
+
+
+import os
+import json
+import queue
+import functools
+import base64
+import signal
+import socket
+import logging
+import threading
+import traceback
+import socketserver
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+
+LOGGER = logging.getLogger()
+DEFAULT_SOCKET_PATH = "./prs.sock"
+
+
+def execute_request(scanner, request: dict) -> dict:
+    """使用scanner执行单个请求"""
+    method = request.get("method")
+    if method == "ping":
+        return {"status": "ok", "results": None}
+
+    try:
+        if method == "scan_local_file":
+            # 相对路径按客户端的工作目录解析，不切换服务进程的工作目录；
+            # 结果中的路径还原为客户端传入的形式，与客户端直接扫描时一致
+            path = request["path"]
+            real_path = os.path.normpath(os.path.join(request.get("cwd") or "", path))
+            if not os.path.exists(real_path):
+                return {"status": "error", "error": f"invalid local file path, file not exists: {path}"}
+            results = _display_paths(scanner.scan_local_file(real_path), real_path, path)
+        elif method == "scan_bytes":
+            results = scanner.scan_bytes(base64.b64decode(request["data"]), request["file_name"])
+        else:
+            return {"status": "error", "error": f"unknown method: {method}"}
+    except (Exception, SystemExit) as e:
+        LOGGER.error(f"scan server execute {method} failed with: {traceback.format_exc()}")
+        return {"status": "error", "error": f"{type(e).__name__}: {e}"}
+
+    if results is None:
+        return {"status": "error", "error": "scanner returned no results"}
+    return {"status": "ok", "results": results}
+
+
+def _display_paths(value, real_path: str, shown_path: str):
+    """将检测结果中的real_path及其下的路径替换为客户端传入的shown_path形式"""
+    if real_path == shown_path:
+        return value
+    real_prefix = os.path.join(real_path, "")
+    shown_prefix = os.path.join(shown_path, "")
+
+    def convert(item):
+        if isinstance(item, str):
+            if item == real_path:
+                return shown_path
+            if item.startswith(real_prefix):
+                return shown_prefix + item[len(real_prefix):]
+            return item
+        if isinstance(item, dict):
+            return {convert(key): convert(sub_item) for key, sub_item in item.items()}
+        if isinstance(item, list):
+            return [convert(sub_item) for sub_item in item]
+        return item
+
+    return convert(value)
+
+
+# worker进程中使用的scanner，fork后与主进程共享已加载的规则
+_WORKER_SCANNER = None
+
+
+def _init_server_worker(scanner):
+    global _WORKER_SCANNER
+    _WORKER_SCANNER = scanner
+    # Ctrl-C由服务进程统一处理
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _execute_in_worker(request: dict):
+    return execute_request(_WORKER_SCANNER, request)
+
+
+def _dispatch_error(e: BaseException) -> dict:
+    """进程池中的worker异常退出、服务关闭时被取消等情况"""
+    detail = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+    LOGGER.error(f"scan server dispatch failed with: {detail}")
+    return {"status": "error", "error": f"{type(e).__name__}: {e}"}
+
+
+def _set_response(future: Future, pool_future: Future):
+    """进程池中的请求完成后设置其响应"""
+    try:
+        response = pool_future.result()
+    except BaseException as e:
+        response = _dispatch_error(e)
+    future.set_result(response)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {"status": "error", "error": f"invalid request: {e}"}
+            else:
+                response = self.server.scan_server.submit(request).result()
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+@dataclass
+class ScanServer:
+    """常驻扫描服务
+
+    连接处理线程只负责收发数据，请求统一放入队列，由调度线程依次取出：
+    jobs大于1时每个请求单独提交到常驻进程池，完成后立即响应，互不等待；否则在调度线程中依次执行
+    """
+    scanner: Any
+    socket_path: str = DEFAULT_SOCKET_PATH
+    jobs: int = 1
+    _queue: Any = field(default_factory=lambda: queue.Queue(), repr=False)
+    _pool: Any = field(default=None, repr=False)
+    _server: Any = field(default=None, repr=False)
+    _dispatcher: Any = field(default=None, repr=False)
+
+    def submit(self, request: dict) -> Future:
+        future = Future()
+        self._queue.put((request, future))
+        return future
+
+    def _dispatch(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            request, future = item
+            if self._pool is None:
+                future.set_result(execute_request(self.scanner, request))
+                continue
+            try:
+                pool_future = self._pool.submit(_execute_in_worker, request)
+            except Exception as e:
+                future.set_result(_dispatch_error(e))
+            else:
+                pool_future.add_done_callback(functools.partial(_set_response, future))
+
+    def start(self):
+        """创建socket并启动调度线程，随后可调用serve_forever处理请求"""
+        if os.path.exists(self.socket_path):
+            if ping(self.socket_path):
+                raise RuntimeError(f"scan server is already running on {self.socket_path}")
+            os.unlink(self.socket_path)
+
+        if self.jobs > 1:
+            import multiprocessing
+
+            self._pool = ProcessPoolExecutor(max_workers=self.jobs, mp_context=multiprocessing.get_context("fork"),
+                                             initializer=_init_server_worker, initargs=(self.scanner,))
+            # 进程池在首次提交任务时才fork出worker，在创建调度线程与连接处理线程之前预先启动，
+            # 避免在多线程的进程中fork
+            for future in [self._pool.submit(_execute_in_worker, {"method": "ping"}) for _ in range(self.jobs)]:
+                future.result()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+        self._server = _UnixServer(self.socket_path, _RequestHandler)
+        self._server.scan_server = self
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """停止serve_forever，可在其他线程中调用"""
+        self._server.shutdown()
+
+    def close(self):
+        self._queue.put(None)
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+            self._dispatcher = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+def request(socket_path: str, payload: dict, timeout: float = None) -> dict:
+    """向扫描服务发送单个请求并返回响应"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        with sock.makefile("rwb") as f:
+            f.write(json.dumps(payload).encode() + b"\n")
+            f.flush()
+            line = f.readline()
+    if not line:
+        return {"status": "error", "error": "scan server closed the connection"}
+    return json.loads(line)
+
+
+def ping(socket_path: str) -> bool:
+    """检查扫描服务是否可用"""
+    try:
+        return request(socket_path, {"method": "ping"}, timeout=5)["status"] == "ok"
+    except (OSError, ValueError):
+        return False
+
+
+def scan_local_file(socket_path: str, file_path: str) -> dict:
+    """通过扫描服务扫描本地路径，路径相对于当前工作目录"""
+    return request(socket_path, {"method": "scan_local_file", "path": file_path, "cwd": os.getcwd()})
+
+
+def scan_bytes(socket_path: str, data: bytes, file_name: str) -> dict:
+    """通过扫描服务扫描文件内容"""
+    return request(socket_path, {"method": "scan_bytes", "file_name": file_name,
+                                 "data": base64.b64encode(data).decode()})
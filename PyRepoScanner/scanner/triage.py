@@ -0,0 +1,169 @@
+"""
+分级检测的第一级: 词法级分诊
+
+对通过符号预过滤的文件，以一个组合正则表达式完成词法切分(字符串字面量、注释、带点的名称)，提取词法级事实:
+- 标识符: 代码中出现的全部标识符(不含注释与字符串中的内容)
+- 字符串单词: 字符串字面量中出现的单词，__import__("os")、importlib.import_module("os")等动态导入以此引入模块名
+- 调用名: 紧跟"("的带点名称，e.g. os.system
+
+TaintNodeVisitor只在ast.Call节点上标记sink，调用的函数全称由属性链、import别名与变量表拼接而成，
+其末级标识符必然以标识符形式出现在代码中(调用处、from ... import或赋值的右侧)，
+其余各级可能来自标识符或动态导入的字符串。
+解码函数(decoder.DECODERS)的结果在AST分析中被静态求出: 解码出的源码作为载荷递归检测，解码出的字符串可能成为
+__import__(name)等动态导入的模块名，而这样的模块名不会以单词形式出现在字符串字面量中，
+因此解码函数与sink函数同等对待，出现解码调用时同样需要AST分析。
+只有某个sink函数或解码函数的末级标识符出现在标识符中、其余各级出现在标识符或字符串单词中时，
+文件才需要进入第二级的AST污点分析，否则判定为确定无问题(clean)。
+调用名仅用于报告，不作为判定依据: f = os.system; f(cmd)这类别名调用的调用处不包含sink函数名
+"""
+
+
+import re
+import ast
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, Set
+
+import PyRepoScanner.scanner.decoder as prs_decoder
+import PyRepoScanner.scanner.prefilter as prs_prefilter
+import PyRepoScanner.scanner.rule_index as prs_rule_index
+
+
+VERDICT_CLEAN = "clean"
+VERDICT_DEEP = "deep"
+
+_QUOTED = (r"""(?:'''[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*'''|\"\"\"[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*\"\"\"|"""
+           r"""'[^'\\\n]*(?:\\.[^'\\\n]*)*'|"[^"\\\n]*(?:\\.[^"\\\n]*)*")""")
+_STRING = rf"""(?:[rRbBuUfF]{{0,2}}{_QUOTED})"""
+# 注释必须匹配到行尾，避免重复匹配时对"####"等注释的回溯
+_GAP = r"""(?:[ \t\f\r\n]|\\\r?\n|#[^\n]*(?![^\n]))*"""
+_NAME = r"""(?:[^\W\d]\w*)"""
+# 相邻的字符串字面量(在AST中合并为一个常量) | 注释 | 带点的名称及其后的"("
+TOKEN_REGEX = re.compile(rf"""({_STRING}(?:{_GAP}{_STRING})*)|#[^\n]*|({_NAME}(?:[ \t]*\.[ \t]*{_NAME})*)([ \t]*\()?""",
+                         re.DOTALL)
+STRING_REGEX = re.compile(rf"""([rRbBuUfF]{{0,2}})({_QUOTED})""", re.DOTALL)
+WORD_REGEX = re.compile(_NAME)
+DOT_REGEX = re.compile(r"[ \t]*\.[ \t]*")
+
+
+@dataclass
+class TokenFacts:
+    """文件的词法级事实"""
+    names: Set = field(default_factory=lambda: set())       # 标识符
+    strings: Set = field(default_factory=lambda: set())     # 字符串字面量中的单词
+    calls: Set = field(default_factory=lambda: set())       # 带点的调用名
+
+
+def _string_value(prefix: str, quoted: str) -> str:
+    """返回字符串字面量的内容
+
+    含转义的字符串(如"\\x6fs")按字面量求值，f-string与无法求值的字符串返回引号内的原始内容
+    """
+    quote = quoted[:3] if quoted[:3] in ("'''", '"""') else quoted[0]
+    body = quoted[len(quote):-len(quote)]
+    if "\\" not in body or "r" in prefix or "f" in prefix:
+        return body
+    try:
+        value = ast.literal_eval(prefix + quoted)
+    except (ValueError, SyntaxError, MemoryError):
+        return body
+    return value if isinstance(value, str) else body
+
+
+def _add_string_run(facts: TokenFacts, run: str):
+    """提取相邻字符串字面量中的单词
+
+    分别提取每个字面量及其拼接结果中的单词；f-string中的表达式会被解析为AST，其中的单词同时作为标识符
+    """
+    values = []
+    for prefix, quoted in STRING_REGEX.findall(run):
+        prefix = prefix.lower()
+        value = _string_value(prefix, quoted)
+        words = WORD_REGEX.findall(value)
+        facts.strings.update(words)
+        if "f" in prefix:
+            facts.names.update(words)
+        values.append(value)
+    if len(values) > 1:
+        facts.strings.update(WORD_REGEX.findall("".join(values)))
+
+
+def extract_token_facts(data) -> TokenFacts:
+    """提取文件的词法级事实
+
+    :param data: 文件内容(bytes或支持buffer协议的对象)
+    """
+    text = bytes(data).decode("utf-8", errors="ignore")
+    # Python会对标识符做NFKC规范化(如全角的ｅｘｅｃ等同于exec)
+    if prs_prefilter.NON_ASCII_REGEX.search(data) is not None:
+        text = unicodedata.normalize("NFKC", text)
+
+    facts = TokenFacts()
+    for run, name, call in TOKEN_REGEX.findall(text):
+        if name:
+            if "." in name:
+                parts = DOT_REGEX.split(name)
+                facts.names.update(parts)
+                if call:
+                    facts.calls.add(".".join(parts))
+            else:
+                facts.names.add(name)
+        elif run:
+            _add_string_run(facts, run)
+    return facts
+
+
+@dataclass
+class TokenTriage:
+    """词法级分诊器
+
+    以文件内容为参数调用，返回(判定结果, 可能调用的sink函数与解码函数集合)，判定结果为VERDICT_CLEAN或VERDICT_DEEP；
+    extra_names为项目内函数体中存在sink的函数名，出现在标识符中时同样需要AST分析
+    """
+    functions: Set = field(default_factory=lambda: set())   # sink函数与解码函数全称(判断模块时还包括taint函数/属性全称)
+    literal_regex: Any = None                               # 判断模块时的合并literal正则，文件内容中有命中时需要AST分析
+    _by_leaf: Dict = field(default_factory=lambda: dict(), repr=False)  # 末级标识符 -> [(函数全称, 其余各级), ...]
+
+    def __post_init__(self):
+        for function in sorted(self.functions):
+            parts = function.split(".")
+            self._by_leaf.setdefault(parts[-1], []).append((function, tuple(parts[:-1])))
+
+    @classmethod
+    def from_rule_index(cls, rule_index: prs_rule_index.RuleIndex, taints: bool = False):
+        """从规则索引中收集全部sink函数与解码函数
+
+        :param taints: 是否同时收集带有taint的函数与属性，用于判断模块能否产生非空的导出摘要
+        """
+        functions = {function for function, entry in rule_index.functions.items()
+                     if entry.sinks or taints and entry.taints}
+        functions.update(prs_decoder.DECODERS)
+        if taints:
+            functions.update(attribute for attribute, entry in rule_index.attributes.items() if entry.taints)
+            return cls(functions=functions, literal_regex=rule_index.literal_regex)
+        return cls(functions=functions)
+
+    def possible_sinks(self, facts: TokenFacts) -> Set:
+        """根据词法级事实返回可能被调用的sink函数与解码函数
+
+        importlib.import_module(name, package)会拼接两个参数，模块名可能不以单词形式出现在字符串中，
+        出现import_module时保守地只检查末级标识符
+        """
+        hits = set()
+        check_prefix = "import_module" not in facts.names
+        for leaf in facts.names.intersection(self._by_leaf):
+            for function, prefix in self._by_leaf[leaf]:
+                if not check_prefix or all(part in facts.names or part in facts.strings for part in prefix):
+                    hits.add(function)
+        return hits
+
+    def __call__(self, data, extra_names=()):
+        facts = extract_token_facts(data)
+        hits = self.possible_sinks(facts)
+        if extra_names:
+            hits.update(facts.names.intersection(extra_names))
+        # 字符串常量可能命中literal规则，对文件内容整体匹配一次，注释中的命中同样保守地判定为需要AST分析
+        if not hits and self.literal_regex is not None and \
+                self.literal_regex.search(data.decode("utf-8", "replace") if isinstance(data, bytes) else data):
+            return VERDICT_DEEP, hits
+        return (VERDICT_DEEP if hits else VERDICT_CLEAN), hits
@@ -8,8 +8,6 @@ import shutil
 import tarfile
 import tempfile
 import zipfile
-import requests
-import email.message
 
 
 # TMP_PATH = tempfile.gettempdir() if tempfile.gettempdir() else "tmp"
@@ -47,6 +45,9 @@ def download_file_to_dir(url: str, dir_path: str, file_name: str = None):
         "Connection": "close",
         "User-Agent": random.choice(USER_AGENTS)
     }
+    # requests只在下载时使用，延迟导入以免拖慢scanner等模块的加载
+    import requests
+
     # GET pypi index file
     resp = requests.get(url, headers=headers)
     with open(available_file_path, "wb") as f:
@@ -159,6 +160,8 @@ def extract_whl_to_dir(source_path: str, dest_path: str):
 
 def parse_content_type(header: str) -> str:
     """copied from PEP691 document, no real use"""
+    import email.message
+
     m = email.message.Message()
     m["content-type"] = header
     return m.get_content_type()
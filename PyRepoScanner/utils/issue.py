@@ -34,9 +34,12 @@ class CONFIDENCE:
             return "low"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Taint:
-    """存放taint信息"""
+    """存放taint信息
+
+    不可变且可哈希，节点/变量/常量上的taint集合以其为键去重
+    """
     id: str
     accordance: str
     type: str = None
@@ -44,17 +47,21 @@ class Taint:
     attribute: str = None
     position: str = None
     keyword: str = None
+    literal: str = None
     lineno: int = -1
     col_offset: int = -1
     end_lineno: int = -1
     end_col_offset: int = -1
 
-    def __eq__(self, other):
-        if isinstance(other, Taint):
-            return self.__dict__ == other.__dict__
-        return False
+    def dict(self):
+        """literal只出现在literal规则生成的taint中，其他taint的dict不包含该字段"""
+        result = {name: getattr(self, name) for name in self.__slots__}
+        if self.literal is None:
+            del result["literal"]
+        return result
+
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Sink:
     """存放sink信息，仅存放ast.Call function对应的具体sink"""
     id: str
@@ -68,13 +75,11 @@ class Sink:
     end_lineno: int = 0
     end_col_offset: int = 0
 
-    def __eq__(self, other):
-        if isinstance(other, Sink):
-            return self.__dict__ == other.__dict__
-        return False
+    def dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Issue:
     """用于存放一条检测结果"""
     id: str
@@ -88,15 +93,26 @@ class Issue:
 
     def __eq__(self, other):
         if isinstance(other, Issue):
-            return self.dict() == other.dict()
+            return self.astuple() == other.astuple()
         elif isinstance(other, dict):
             return self.dict() == other
         return False
 
+    def __hash__(self):
+        return hash(self.astuple())
+
+    def astuple(self):
+        return (self.id, self.name, self.taint, self.sink,
+                self.severity, self.confidence, self.msg, self.file_path)
+
     def dict(self):
-        issue_dict = self.__dict__
-        if isinstance(issue_dict["taint"], Taint):
-            issue_dict["taint"] = self.taint.__dict__
-        if isinstance(issue_dict["sink"], Sink):
-            issue_dict["sink"] = self.sink.__dict__
-        return issue_dict
+        return {
+            "id": self.id,
+            "name": self.name,
+            "taint": self.taint.dict() if isinstance(self.taint, Taint) else self.taint,
+            "sink": self.sink.dict() if isinstance(self.sink, Sink) else self.sink,
+            "severity": self.severity,
+            "confidence": self.confidence,
+            "msg": self.msg,
+            "file_path": self.file_path,
+        }
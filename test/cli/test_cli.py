@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+
+PACKAGE_ROOT = os.path.abspath("../..")
+IMPORT_TIME_BUDGET = 0.3        # 导入CLI与scanner的耗时上限(秒)
+HEAVY_MODULES = ["minio", "urllib3", "pymongo", "requests", "bs4", "arrow", "xmlrpc", "astpretty", "yaml"]
+
+
+def test_import_time():
+    code = (
+        "import sys, time\n"
+        "begin = time.perf_counter()\n"
+        "import PyRepoScanner.cli.cli\n"
+        "import PyRepoScanner.scanner.pypi.scanner\n"
+        "print(time.perf_counter() - begin)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", code], cwd=PACKAGE_ROOT,
+                            capture_output=True, text=True, check=True).stdout.splitlines()
+    assert output[1] == ""
+    assert float(output[0]) < IMPORT_TIME_BUDGET
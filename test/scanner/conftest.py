@@ -0,0 +1,38 @@
+import io
+import shutil
+import tarfile
+import pytest
+
+
+@pytest.fixture
+def make_tar_gz():
+    """返回tar.gz构造函数: (成员名 -> 文本内容, 写入路径) -> tar.gz内容，写入路径为None时只返回内容"""
+    def make(files: dict, path=None):
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+            for name, content in files.items():
+                data = content.encode()
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        if path is not None:
+            with open(path, "wb") as f:
+                f.write(buf.getvalue())
+        return buf.getvalue()
+    return make
+
+
+@pytest.fixture
+def py_file_rules(tmp_path):
+    """只选取.py文件的文件规则，返回规则文件路径"""
+    file_rules = tmp_path / "file_rules.yml"
+    file_rules.write_text("file_name:\n  - regex: \"\\\\.py$\"\n")
+    return str(file_rules)
+
+
+@pytest.fixture
+def example_project(tmp_path):
+    """将example目录复制到临时目录中作为待扫描项目"""
+    project = tmp_path / "project"
+    shutil.copytree("../../example", project)
+    return project
@@ -0,0 +1,57 @@
+import io
+import os
+import zipfile
+import PyRepoScanner.scanner.archive as prs_archive
+import PyRepoScanner.utils.basic_tools as prs_utils
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+
+FILES = {
+    "demo-1.0/setup.py": "import os\nos.system(input())\n",
+    "demo-1.0/demo/__init__.py": "import os\nos.system('ls')\n",
+    "demo-1.0/demo/sub/__init__.py": "",
+    "demo-1.0/demo/utils.py": "import os\nos.system('ls')\n",
+    "demo-1.0/other/__init__.py": "import os\n",
+}
+
+
+def _zip_bytes(files: dict):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        for name, content in files.items():
+            z.writestr(name, content)
+    return buf.getvalue()
+
+
+def test_normalize_member_name():
+    assert prs_archive.normalize_member_name("./a/b.py") == "a/b.py"
+    assert prs_archive.normalize_member_name("/a//b.py") == "a/b.py"
+    assert prs_archive.normalize_member_name("a/../../b.py") is None
+
+
+def test_parse_import_name_from_paths():
+    paths = [os.path.join("root", *name.split("/")) for name in FILES]
+    assert prs_archive.parse_import_name_from_paths(paths) == ["demo", "other"]
+
+
+def test_scan_archive_bytes(tmp_path, monkeypatch, make_tar_gz):
+    monkeypatch.setattr(prs_utils, "TMP_PATH", str(tmp_path))
+    scanner = PypiScanner("../../rules", file_rules_path="../../file_rules.yml")
+
+    tgz_results = scanner.scan_bytes(make_tar_gz(FILES), "demo-1.0.tar.gz")
+    root_dir = os.path.join(str(tmp_path), "demo-1.0")
+    assert tgz_results["import_name"] == ["demo", "other"]
+    assert tgz_results["scanned_files"] == [os.path.join(root_dir, *name.split("/"))
+                                            for name in FILES if not name.endswith("utils.py")]
+    assert tgz_results["metrics"]["total"]["cnt"] > 0
+    # 压缩包内容不会被解压到磁盘
+    assert os.listdir(str(tmp_path)) == []
+
+    # whl的成员位于包根目录下
+    whl_results = scanner.scan_bytes(_zip_bytes(FILES), "demo-1.0-py3-none-any.whl")
+    whl_root_dir = os.path.join(str(tmp_path), "demo-1.0-py3-none-any")
+    assert whl_results["scanned_files"] == [path.replace(root_dir, whl_root_dir, 1)
+                                            for path in tgz_results["scanned_files"]]
+    assert whl_results["metrics"]["total"]["cnt"] == tgz_results["metrics"]["total"]["cnt"]
+
+    assert scanner.scan_bytes(b"not an archive", "broken-1.0.tar.gz") is None
@@ -0,0 +1,39 @@
+import json
+import PyRepoScanner.scanner.batch as prs_batch
+import PyRepoScanner.utils.basic_tools as prs_utils
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+
+def test_batch_scan(tmp_path, monkeypatch, make_tar_gz):
+    monkeypatch.setattr(prs_utils, "TMP_PATH", str(tmp_path))
+    archive_dir = tmp_path / "archives"
+    archive_dir.mkdir()
+    for i in range(3):
+        make_tar_gz({f"pkg{i}-1.0/setup.py": "import os\nos.system(input())\n"},
+                    archive_dir / f"pkg{i}-1.0.tar.gz")
+    (archive_dir / "broken-1.0.tar.gz").write_bytes(b"not a tar file")
+
+    archives = prs_batch.collect_archives([str(archive_dir)])
+    assert len(archives) == 4
+
+    scanner = PypiScanner("../../rules", file_rules_path="../../file_rules.yml")
+    output = tmp_path / "out.ndjson"
+    stats = prs_batch.batch_scan(scanner, archives, str(output), jobs=2)
+    assert stats == {"total": 4, "skipped": 0, "ok": 3, "error": 1}
+
+    records = {r["archive"]: r for r in map(json.loads, output.read_text().splitlines())}
+    assert set(records) == set(archives)
+    for archive, record in records.items():
+        if "broken" in archive:
+            assert record["status"] == "error"
+        else:
+            assert record["results"]["metrics"]["total"]["cnt"] > 0
+
+    # 模拟中断时写入的不完整记录，再次运行时只扫描未完成的文件
+    lines = output.read_text().splitlines()
+    unfinished = json.loads(lines[-1])["archive"]
+    output.write_text("\n".join(lines[:-1]) + "\n" + lines[-1][:10])
+    stats = prs_batch.batch_scan(scanner, archives, str(output), jobs=2)
+    assert stats == {"total": 4, "skipped": 3, "ok": int("broken" not in unfinished),
+                     "error": int("broken" in unfinished)}
+    assert len(output.read_text().splitlines()) == 4
@@ -0,0 +1,89 @@
+import time
+import pytest
+import threading
+import PyRepoScanner.scanner.budget as prs_budget
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+
+# 每行一次os.system调用，节点数远大于检查间隔
+LARGE_SOURCE = ("import os\n" + "".join(f"v{i} = os.system('x{i}')\n" for i in range(2000))).encode()
+
+
+def test_budget_guard():
+    guard = prs_budget.ScanBudget(file_nodes=100).file_guard()
+    guard.check(100)
+    with pytest.raises(prs_budget.BudgetExceeded):
+        guard.check(101)
+
+    package_guard = prs_budget.ScanBudget(package_time=0).package_guard()
+    with pytest.raises(prs_budget.BudgetExceeded, match="package time"):
+        package_guard.check()
+    # 文件的截止时间不晚于项目的截止时间
+    file_guard = prs_budget.ScanBudget(file_time=60).file_guard(package_guard)
+    assert file_guard.deadline == package_guard.deadline
+    assert prs_budget.current_rss() > 0
+
+
+def test_run_isolated():
+    assert prs_budget.run_isolated(lambda: {"a": [1, 2]}) == {"a": [1, 2]}
+    with pytest.raises(ZeroDivisionError):
+        prs_budget.run_isolated(lambda: 1 / 0)
+
+    begin_time = time.time()
+    with pytest.raises(prs_budget.BudgetExceeded):
+        prs_budget.run_isolated(lambda: time.sleep(30), timeout=0.2)
+    assert time.time() - begin_time < 5
+
+
+def test_scan_parse_error():
+    scanner = PypiScanner("../../rules")
+    results = scanner.scan_py_bytes("setup.py", b"import os\nos.system(1\n")
+    assert results["issues"]["setup.py"] == []
+    assert results["partial"]["setup.py"].startswith("parse failed: SyntaxError")
+    assert results["metrics"]["total"]["partial"] == 1
+
+
+def test_scan_file_node_budget():
+    complete = PypiScanner("../../rules").scan_py_bytes("setup.py", LARGE_SOURCE)
+    assert complete["partial"] == {}
+
+    scanner = PypiScanner("../../rules", budget=prs_budget.ScanBudget(file_nodes=2000))
+    results = scanner.scan_py_bytes("setup.py", LARGE_SOURCE)
+    assert "node budget" in results["partial"]["setup.py"]
+    # 保留中止前已发现的issue
+    assert 0 < results["metrics"]["total"]["cnt"] < complete["metrics"]["total"]["cnt"]
+
+
+def test_scan_file_time_budget_isolated():
+    scanner = PypiScanner("../../rules", budget=prs_budget.ScanBudget(file_time=0), isolate_flag=True)
+    results = scanner.scan_py_bytes("setup.py", LARGE_SOURCE)
+    assert "time budget" in results["partial"]["setup.py"]
+
+
+def test_scan_isolated_in_thread():
+    # 存在其他线程时不直接fork，由forkserver启动的隔离worker执行
+    results = {}
+    for file_time in (60, 0):
+        scanner = PypiScanner("../../rules", budget=prs_budget.ScanBudget(file_time=file_time), isolate_flag=True)
+        thread = threading.Thread(target=lambda: results.update({file_time: scanner.scan_py_bytes("setup.py", LARGE_SOURCE)}))
+        thread.start()
+        thread.join()
+        assert scanner._isolated_worker is not None
+        scanner._isolated_worker.close()
+    assert results[60]["partial"] == {}
+    assert results[60]["metrics"]["total"]["cnt"] == PypiScanner("../../rules").scan_py_bytes(
+        "setup.py", LARGE_SOURCE)["metrics"]["total"]["cnt"]
+    assert "time budget" in results[0]["partial"]["setup.py"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_scan_package_budget(tmp_path, jobs):
+    for name in ("a", "b", "c"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "__init__.py").write_bytes(LARGE_SOURCE)
+    scanner = PypiScanner("../../rules", budget=prs_budget.ScanBudget(package_time=0), jobs=jobs)
+    results = scanner.scan_local_dir(str(tmp_path))
+    assert results["scanned_files"] == []
+    assert len(results["partial"]) == 3
+    assert results["metrics"]["total"]["partial"] == len(results["partial"])
+    assert all(reason.endswith("not scanned") for reason in results["partial"].values())
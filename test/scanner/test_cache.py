@@ -0,0 +1,38 @@
+import PyRepoScanner.scanner.cache as prs_cache
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+
+def test_scan_cache(tmp_path):
+    cache = prs_cache.ScanCache(str(tmp_path / "cache.db"), max_size=400)
+    issues = [{"id": "1000", "msg": "x" * 100, "file_path": "a.py"}]
+    assert cache.get("sha", "rules", "b.py") is None
+    cache.put("sha", "rules", issues)
+    assert cache.get("sha", "rules", "b.py") == [{"id": "1000", "msg": "x" * 100, "file_path": "b.py"}]
+    assert cache.get("sha", "other-rules", "b.py") is None
+
+    # 超出上限时淘汰最久未访问的记录
+    cache.put("sha2", "rules", issues)
+    cache.get("sha", "rules", "a.py")
+    cache.put("sha3", "rules", issues)
+    assert cache.get("sha", "rules", "a.py") is not None
+    assert cache.get("sha2", "rules", "a.py") is None
+    assert cache.get("sha3", "rules", "a.py") is not None
+    cache.close()
+
+
+def test_ruleset_fingerprint():
+    assert prs_cache.ruleset_fingerprint({"0001": {"id": "0001"}}) == prs_cache.ruleset_fingerprint({"0001": {"id": "0001"}})
+    assert prs_cache.ruleset_fingerprint({"0001": {"id": "0001"}}) != prs_cache.ruleset_fingerprint({})
+
+
+def test_scan_with_cache(tmp_path):
+    file_path = "../../example/1002_execute_from_network.py"
+    scanner = PypiScanner("../../rules", cache_path=str(tmp_path / "cache.db"))
+    first = scanner.scan_local_py_file(file_path)
+    second = scanner.scan_local_py_file(file_path)
+    assert first["metrics"]["total"]["cache_misses"] == 1
+    assert second["metrics"]["total"]["cache_hits"] == 1
+    assert first["metrics"]["total"]["cnt"] > 0
+    assert first["issues"] == second["issues"]
+    for key in ("cnt", "low", "medium", "high", "lines"):
+        assert first["metrics"]["total"][key] == second["metrics"]["total"][key]
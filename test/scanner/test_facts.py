@@ -0,0 +1,58 @@
+import ast
+import json
+import shutil
+import PyRepoScanner.scanner.facts as prs_facts
+from PyRepoScanner.scanner.node_visitor import TaintNodeVisitor
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+
+def test_facts_round_trip(tmp_path):
+    with open("../../example/1000_execute.py") as f:
+        tree = ast.parse(f.read())
+    facts = TaintNodeVisitor(rules={}, filepath="1000_execute.py").extract(tree)
+    assert facts.events and facts.functions
+    assert prs_facts.FileFacts.from_bytes(facts.to_bytes()) == facts
+
+    store = prs_facts.FactStore(str(tmp_path / "facts.db"))
+    assert store.get("sha") is None
+    store.put("sha", facts)
+    store.record_file("/a/b/1000_execute.py", "sha", 10)
+    store.record_file("/a/c/x.py", "other", 1)
+    assert store.get("sha") == facts
+    assert store.iter_files("/a/b/") == [("/a/b/1000_execute.py", "sha", 10)]
+    assert len(store.iter_files()) == 2
+    # 未指定项目的文件自成一个项目
+    store.record_file("/a/c/y.py", "sha", 10, project="/a/c")
+    store.record_file("/a/c/z.py", "sha", 10, project="/a/c")
+    assert [(project, len(records)) for project, records in store.iter_projects("/a/")] == \
+        [("/a/b/1000_execute.py", 1), ("/a/c/x.py", 1), ("/a/c", 2)]
+
+
+def test_scan_with_facts(tmp_path, monkeypatch, py_file_rules, example_project):
+    facts_path = str(tmp_path / "facts.db")
+
+    plain = PypiScanner("../../rules", file_rules_path=py_file_rules).scan_local_dir(str(example_project))
+    first = PypiScanner("../../rules", file_rules_path=py_file_rules,
+                        facts_path=facts_path).scan_local_dir(str(example_project))
+    second = PypiScanner("../../rules", file_rules_path=py_file_rules,
+                         facts_path=facts_path).scan_local_dir(str(example_project))
+    assert json.dumps(first["issues"]) == json.dumps(plain["issues"])
+    assert json.dumps(second["issues"]) == json.dumps(plain["issues"])
+    assert first["metrics"]["total"]["fact_misses"] > 0 and first["metrics"]["total"]["fact_hits"] == 0
+    assert second["metrics"]["total"]["fact_hits"] == first["metrics"]["total"]["fact_misses"]
+
+    # 源码删除后仍可使用保存的事实按新规则集重新检测
+    shutil.rmtree(example_project)
+    reeval = PypiScanner("../../rules", file_rules_path=py_file_rules,
+                         facts_path=facts_path).scan_fact_store(str(example_project))
+    assert list(reeval) == [str(example_project)]
+    assert reeval[str(example_project)]["issues"] == plain["issues"]
+    assert reeval[str(example_project)]["import_name"] == plain["import_name"]
+    rules = tmp_path / "rules"
+    shutil.copytree("../../rules", rules, ignore=shutil.ignore_patterns("1000_*"))
+    # PypiScanner.rules为类属性，在同一进程中累积加载过的规则
+    monkeypatch.setattr(PypiScanner, "rules", {})
+    subset = PypiScanner(str(rules), file_rules_path=py_file_rules,
+                         facts_path=facts_path).scan_fact_store(str(example_project))[str(example_project)]
+    subset_ids = {issue["id"] for issues in subset["issues"].values() for issue in issues}
+    assert "1000" not in subset_ids and "1001" in subset_ids
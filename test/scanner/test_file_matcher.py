@@ -0,0 +1,55 @@
+import os
+import re
+import PyRepoScanner.scanner.file_matcher as prs_file_matcher
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+
+def _file_rules(file_dir=(), file_name=(), file_path=(), name_regex=()):
+    return {
+        "file_dir": {"match": list(file_dir), "regex": []},
+        "file_name": {"match": list(file_name), "regex": [re.compile(r) for r in name_regex]},
+        "file_path": {"match": list(file_path), "regex": []},
+    }
+
+
+def test_combine_regexes():
+    regexes = prs_file_matcher.combine_regexes([re.compile(r"^test_"), re.compile(r"_test\.py$"),
+                                                re.compile(r"(a)\1"), re.compile(r"(?i)^SETUP")])
+    assert len(regexes) == 3
+    assert regexes[0].search("test_a.py") and regexes[0].search("a_test.py")
+    assert not regexes[0].search("aa.py")
+
+
+def test_need_scan():
+    matcher = prs_file_matcher.FileRuleMatcher.compile(_file_rules(file_name=["setup.py"], name_regex=[r"^conf"]))
+    assert matcher.need_scan("pkg", "setup.py")
+    assert matcher.need_scan("pkg", "conftest.py")
+    assert not matcher.need_scan("pkg", "setup.cfg")
+    assert not matcher.need_scan("pkg", "main.py")
+
+    path = os.path.join("pkg", "src", "main.py")
+    matcher = prs_file_matcher.FileRuleMatcher.compile(_file_rules(file_dir=[os.path.join("pkg", "bin")],
+                                                                   file_path=[path]))
+    assert matcher.need_scan(os.path.join("pkg", "bin"), "run.py")
+    assert matcher.need_scan(os.path.join("pkg", "src"), "main.py")
+    assert not matcher.need_scan(os.path.join("pkg", "src"), "other.py")
+
+
+def test_prune_dirs():
+    matcher = prs_file_matcher.FileRuleMatcher.compile(_file_rules(file_path=[os.path.join("pkg", "src", "main.py")]))
+    dirs = ["src", "docs", "tests"]
+    matcher.prune_dirs("pkg", dirs)
+    assert dirs == ["src"]
+
+    # 存在file_name规则时任何目录都可能命中
+    matcher = prs_file_matcher.FileRuleMatcher.compile(_file_rules(file_name=["setup.py"]))
+    dirs = ["src", "docs"]
+    matcher.prune_dirs("pkg", dirs)
+    assert dirs == ["src", "docs"]
+
+
+def test_scanner_file_need_scan():
+    scanner = PypiScanner("../../rules", file_rules_path="../../file_rules.yml")
+    assert scanner._file_need_scan("pkg", "setup.py")
+    assert scanner._file_need_scan("pkg", "__init__.py")
+    assert not scanner._file_need_scan("pkg", "utils.py")
@@ -0,0 +1,19 @@
+import hashlib
+import PyRepoScanner.scanner.ingestion as prs_ingestion
+
+
+def test_count_lines():
+    data = b"import os\r\n\r\n# comment\n    \x0c\n  os.system('ls')  # run\rx = 1"
+    assert prs_ingestion.count_lines(data) == (len(data.splitlines()), 3)
+    assert prs_ingestion.count_lines(b"") == (0, 0)
+
+
+def test_ingest_file():
+    ingestion = prs_ingestion.ingest_file("../../example/1000_execute.py")
+    with open("../../example/1000_execute.py", "rb") as f:
+        data = f.read()
+    assert ingestion.sha256 == hashlib.sha256(data).hexdigest()
+    assert ingestion.size == len(data)
+    assert ingestion.prefilter_hits is None
+    ingestion.close()
+    assert ingestion.data is None
@@ -41,3 +41,42 @@ def test_visit_Assign():
         node = ast.parse(f.read())
         tnv.generic_visit(node)
         print(tnv.variables)
+
+
+def test_visit_deeply_nested():
+    from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+    # exec(x + 1 + 1 + ... + 1)，嵌套深度远超默认递归限制
+    loc = {"lineno": 1, "col_offset": 0, "end_lineno": 1, "end_col_offset": 0}
+    expr = ast.Name(id="x", ctx=ast.Load(), **loc)
+    for _ in range(5000):
+        expr = ast.BinOp(left=expr, op=ast.Add(), right=ast.Constant(value=1, **loc), **loc)
+    call = ast.Call(func=ast.Name(id="exec", ctx=ast.Load(), **loc), args=[expr], keywords=[], **loc)
+    node = ast.Module(body=[ast.Expr(value=call, **loc)], type_ignores=[])
+
+    tnv = prs_node_visitor.TaintNodeVisitor(rules=PypiScanner("../../rules").rules)
+    tnv.generic_visit(node)
+    assert [issue["id"] for issue in tnv.results] == ["1000"]
+    assert tnv.depth == 0
+
+
+def test_scope_chain():
+    tnv = prs_node_visitor.TaintNodeVisitor()
+    node = ast.parse("x = 1\nclass A:\n    def f(self, c):\n        y = x\n")
+    tnv.generic_visit(node)
+    assert tnv.scope.qualname == ""
+    f_scope = tnv.scope.child("A").child("f")
+    assert f_scope.lookup("x") is tnv.scope
+    assert f_scope.variables["y"].value == 1
+    assert f_scope.variables["c"].position == 1
+    assert set(tnv.variables) == {"", ".A", ".A.f"}
+
+
+def test_release_node_state():
+    from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+    tnv = prs_node_visitor.TaintNodeVisitor(rules=PypiScanner("../../rules").rules)
+    node = ast.parse("import base64\nexec(base64.b64decode('cHJpbnQoMSk='))\n")
+    tnv.generic_visit(node)
+    assert [issue["id"] for issue in tnv.results] == ["1000", "1001"]
+    assert not tnv.evaluator.node_taints and not tnv.evaluator.node_sinks and not tnv.evaluator.node_args
+    assert not tnv._arg_nids and not tnv._stack
+    assert not any(hasattr(n, "_prs_taints") for n in ast.walk(node))
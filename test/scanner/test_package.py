@@ -0,0 +1,114 @@
+import PyRepoScanner.scanner.archive as prs_archive
+import PyRepoScanner.scanner.package as prs_package
+import PyRepoScanner.utils.basic_tools as prs_utils
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+
+def _write_project(root):
+    (root / "pkg").mkdir(parents=True)
+    (root / "setup.py").write_text(
+        "import os\n"
+        "from pkg.utils import PAYLOAD, run\n"
+        "from pkg import helpers\n"
+        "os.system(PAYLOAD)\n"
+        "run(helpers.CMD)\n"
+    )
+    (root / "pkg" / "__init__.py").write_text("")
+    (root / "pkg" / "utils.py").write_text(
+        "import base64, os\n"
+        "PAYLOAD = base64.b64decode('bHM=')\n"
+        "def run(cmd):\n"
+        "    os.system(cmd)\n"
+    )
+    (root / "pkg" / "helpers.py").write_text("from .utils import *\nCMD = PAYLOAD\n")
+
+
+def test_scan_imports():
+    references, aliases = prs_package.scan_imports(
+        b"import os, a.b as c\nfrom . import x as y\nfrom .m import (\n    p,  # comment\n    q as r,\n)\nfrom n import *\n"
+    )
+    assert references == ["os", "a.b", "x", "m", "m.p", "m.q", "n"]
+    assert aliases == {"c": "a.b", "y": "x", "p": "m.p", "r": "m.q", "*": "n.*"}
+
+
+def test_module_names():
+    names = prs_package.module_names(["/p/setup.py", "/p/pkg/__init__.py", "/p/pkg/sub/__init__.py",
+                                      "/p/pkg/sub/mod.py", "/p/pkg/utils.py"])
+    assert names == {"/p/setup.py": "setup", "/p/pkg/__init__.py": "pkg", "/p/pkg/sub/__init__.py": "pkg.sub",
+                     "/p/pkg/sub/mod.py": "pkg.sub.mod", "/p/pkg/utils.py": "pkg.utils"}
+
+
+def test_scan_package(tmp_path):
+    project = tmp_path / "project"
+    _write_project(project)
+    setup_path = str(project / "setup.py")
+
+    isolated = PypiScanner("../../rules", package_flag=False).scan_local_dir(str(project))
+    assert {(issue["id"], issue["sink"]["lineno"]) for issue in isolated["issues"][setup_path]} == {("1000", 4)}
+
+    # 解码后的模块级变量、函数内的sink以及经from ... import *的再导出均通过模块摘要连接到setup.py
+    scanner = PypiScanner("../../rules", cache_path=str(tmp_path / "cache.db"))
+    first = scanner.scan_local_dir(str(project))
+    found = {(issue["id"], issue["sink"]["lineno"]) for issue in first["issues"][setup_path]}
+    assert {("1001", 4), ("1001", 5)} <= found
+    assert first["metrics"]["total"]["summary_misses"] > 0 and first["metrics"]["total"]["summary_hits"] == 0
+
+    # 内容未变化的模块直接使用缓存的摘要
+    second = scanner.scan_local_dir(str(project))
+    assert second["issues"] == first["issues"]
+    assert second["metrics"]["total"]["summary_hits"] == first["metrics"]["total"]["summary_misses"]
+    assert second["metrics"]["total"]["summary_misses"] == 0
+
+    # 被导入模块变化后，依赖其摘要的文件重新检测
+    (project / "pkg" / "utils.py").write_text("import os\nPAYLOAD = 'ls'\ndef run(cmd):\n    pass\n")
+    third = scanner.scan_local_dir(str(project))
+    assert "1001" not in {issue["id"] for issue in third["issues"][setup_path]}
+
+
+def test_scan_fact_store_projects(tmp_path, monkeypatch, make_tar_gz, py_file_rules):
+    monkeypatch.setattr(prs_utils, "TMP_PATH", str(tmp_path))
+    setup = "import base64\nfrom pkg.utils import run\nrun(base64.b64decode(input()))\n"
+    run_bodies = {"a": "    os.system(cmd)\n", "b": "    print(cmd)\n"}
+    scanner = PypiScanner("../../rules", file_rules_path=py_file_rules, facts_path=str(tmp_path / "facts.db"))
+    direct = {}
+    for name, body in run_bodies.items():
+        direct[str(tmp_path / f"{name}-1.0")] = scanner.scan_bytes(make_tar_gz({
+            f"{name}-1.0/setup.py": setup,
+            f"{name}-1.0/pkg/__init__.py": "",
+            f"{name}-1.0/pkg/utils.py": "import os\ndef run(cmd):\n" + body,
+        }), f"{name}-1.0.tar.gz")
+    a_setup = str(tmp_path / "a-1.0" / "a-1.0" / "setup.py")
+    a_issues = direct[str(tmp_path / "a-1.0")]["issues"][a_setup]
+    assert ("1001", 3) in {(issue["id"], issue["sink"]["lineno"]) for issue in a_issues}
+
+    # 两个项目中同名的pkg.utils互不影响，重新检测事实库的结果按项目给出，与直接扫描一致
+    stored = scanner.scan_fact_store()
+    assert list(stored) == list(direct)
+    for root, results in stored.items():
+        assert results["issues"] == direct[root]["issues"]
+        assert results["import_name"] == direct[root]["import_name"] == ["pkg"]
+
+
+def test_scan_archive_reads_imported_modules(tmp_path, monkeypatch, make_tar_gz):
+    monkeypatch.setattr(prs_utils, "TMP_PATH", str(tmp_path))
+    project = tmp_path / "src"
+    _write_project(project)
+    files = {f"demo-1.0/{path.relative_to(project).as_posix()}": path.read_text()
+             for path in project.rglob("*.py")}
+    files["demo-1.0/pkg/unused.py"] = "import os\nos.system('ls')\n"
+    iter_tar_gz_members = prs_archive.iter_tar_gz_members
+    read = []
+
+    def counting_iter(fileobj, select):
+        for name, data in iter_tar_gz_members(fileobj, select):
+            read.append(name)
+            yield name, data
+
+    monkeypatch.setattr(prs_archive, "iter_tar_gz_members", counting_iter)
+    results = PypiScanner("../../rules").scan_bytes(make_tar_gz(files), "demo-1.0.tar.gz")
+    setup_path = str(tmp_path / "demo-1.0" / "demo-1.0" / "setup.py")
+    found = {(issue["id"], issue["sink"]["lineno"]) for issue in results["issues"][setup_path]}
+    assert {("1001", 4), ("1001", 5)} <= found
+    # 第一遍遍历读取全部python成员的导入引用，第二遍只读取setup.py导入的模块，未被导入的模块不会再次读取
+    assert read.count("demo-1.0/pkg/utils.py") == read.count("demo-1.0/pkg/helpers.py") == 2
+    assert read.count("demo-1.0/pkg/unused.py") == 1
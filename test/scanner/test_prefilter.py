@@ -0,0 +1,56 @@
+import re
+import PyRepoScanner.scanner.decoder as prs_decoder
+import PyRepoScanner.scanner.prefilter as prs_prefilter
+import PyRepoScanner.scanner.rule_index as prs_rule_index
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+
+def test_build_trie_pattern():
+    words = ["check_call", "check_output", "call", "exec", "execv"]
+    regex = re.compile(r"\b" + prs_prefilter.build_trie_pattern(words) + r"\b")
+    for word in words:
+        assert regex.fullmatch(word)
+    assert not regex.search("checks callback executor")
+
+
+def test_prefilter():
+    prefilter = prs_prefilter.SymbolPrefilter(symbols={"system", "exec", "Popen"})
+    assert prefilter(b"import os\nos.system('ls')\nexec(x)") == {"system", "exec"}
+    assert prefilter(b"print(systematic, executor)") == set()
+    # 全角标识符经NFKC规范化后等同于exec
+    assert prefilter("ｅｘｅｃ(x)".encode()) == {"exec"}
+    assert prs_prefilter.SymbolPrefilter()(b"exec(x)") == set()
+
+
+def test_from_rule_index():
+    index = prs_rule_index.RuleIndex({"0001": {"id": "0001", "type": "execution", "sinks": [
+        {"accordance": "function", "function": "os.system"},
+        {"accordance": "function", "function": "exec"},
+    ]}})
+    symbols = prs_prefilter.SymbolPrefilter.from_rule_index(index).symbols
+    assert {"system", "exec", "b64decode", "fromhex"} <= symbols
+    assert symbols - {"system", "exec"} == {function.rsplit(".", 1)[-1] for function in prs_decoder.DECODERS}
+
+
+def test_scan_prefiltered_file(tmp_path):
+    clean_file = tmp_path / "clean.py"
+    clean_file.write_text("import os\n\nprint(os.getcwd())\n")
+    scanner = PypiScanner("../../rules")
+    results = scanner.scan_local_py_file(str(clean_file))
+    assert results["issues"][str(clean_file)] == []
+    assert results["metrics"]["total"]["prefiltered"] == 1
+    assert results["metrics"]["total"]["lines"] == 2
+
+    results = scanner.scan_local_py_file("../../example/1000_execute.py")
+    assert results["metrics"]["total"]["prefiltered"] == 0
+    assert results["issues"]["../../example/1000_execute.py"]
+
+
+def test_scan_decoded_payload(tmp_path):
+    # 文件中只有对常量的解码调用，解码出的载荷在AST分析中检测，默认参数下不能被预过滤跳过
+    payload_file = tmp_path / "payload.py"
+    payload_file.write_text('import base64\ncode = base64.b64decode("aW1wb3J0IG9zCm9zLnN5c3RlbShpbnB1dCgpKQo=")\n')
+    results = PypiScanner("../../rules").scan_local_py_file(str(payload_file))
+    assert results["metrics"]["total"]["prefiltered"] == 0
+    assert results["metrics"]["total"]["triage_clean"] == 0
+    assert results["issues"][str(payload_file)]
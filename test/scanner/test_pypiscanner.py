@@ -1,4 +1,5 @@
 import os
+import json
 import astpretty
 from PyRepoScanner.scanner.pypi.scanner import PypiScanner
 
@@ -26,3 +27,13 @@ def test_scan_local_file():
 def test_getattr():
     s = getattr(os, "getcwd")
     print(s())
+
+
+def test_scan_local_dir_parallel(py_file_rules):
+    serial = PypiScanner("../../rules", file_rules_path=py_file_rules).scan_local_dir("../../example")
+    parallel = PypiScanner("../../rules", file_rules_path=py_file_rules, jobs=4).scan_local_dir("../../example")
+    for results in (serial, parallel):
+        results.pop("total_time")
+        results.pop("tier_time")
+    assert serial["metrics"]["total"]["cnt"] > 0
+    assert json.dumps(serial) == json.dumps(parallel)
@@ -0,0 +1,37 @@
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+import PyRepoScanner.scanner.rule_index as prs_rule_index
+
+
+def test_build_rule_index():
+    scanner = PypiScanner("../../rules")
+    index = scanner.rule_index
+    assert "os.system" in index.functions
+    assert index.functions["os.system"].sinks[0]["id"] == "0001"
+    assert index.functions["base64.b64decode"].taints[0]["type"] == "decoder"
+    assert "os.environ" in index.attributes
+
+
+def test_empty_rule_index():
+    index = prs_rule_index.RuleIndex()
+    assert index.functions == {}
+    assert index.attributes == {}
+
+
+def test_composite_rule_plan():
+    scanner = PypiScanner("../../rules")
+    plan = scanner.rule_index.composite_sinks[("id", "0001")]
+    assert sorted(plan_sink.rule.id for plan_sink in plan) == ["1000", "1001", "1002"]
+    for plan_sink in plan:
+        if plan_sink.rule.id == "1001":
+            assert plan_sink.rule.matches[plan_sink.sink_order][("id", "0003")] == [(0, 10, 10)]
+
+
+def test_literal_rules():
+    scanner = PypiScanner("../../rules")
+    index = scanner.rule_index
+    assert index.literals and all(template["id"] == "0008" for template in index.literals)
+    hits = index.match_literals(["https://discord.com/api/webhooks/123/abc-DEF", "utf-8", "127.0.0.1",
+                                 "http://45.61.136.7:8080/x", "version 1.2.3", "expyuzz4wqqyqhjn.onion"])
+    assert sorted(hits) == [0, 3, 5]
+    assert [text for _, text in hits[3]] == ["45.61.136.7"]
+    assert prs_rule_index.RuleIndex().match_literals(["45.61.136.7"]) == {}
@@ -0,0 +1,52 @@
+import os
+import shutil
+import PyRepoScanner.scanner.cache as prs_cache
+import PyRepoScanner.scanner.ruleset as prs_ruleset
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+
+def test_validate_rules():
+    assert prs_ruleset.validate_rules({"0001": {"id": "0001", "sinks": [{"accordance": "function", "function": "eval"}]}}) == []
+    errors = prs_ruleset.validate_rules({
+        "0001": {"id": "0001", "sinks": [{"accordance": "function"}]},
+        "1000": {"id": "1000", "taints": [{"accordance": "type", "type": "*", "severity": 1}]},
+    })
+    assert len(errors) == 3
+    errors = prs_ruleset.validate_rules({
+        "0008": {"id": "0008", "taints": [{"accordance": "literal", "literal": "(a"},
+                                          {"accordance": "literal", "literal": r"(b)\1"}]},
+    })
+    assert len(errors) == 2
+
+
+def test_rules_artifact(tmp_path, monkeypatch):
+    rule_path = str(tmp_path / "rules")
+    shutil.copytree("../../rules", rule_path)
+    artifact_path = prs_ruleset.default_artifact_path(rule_path)
+
+    # 构造scanner不生成产物，产物由prs compile写入
+    compiled = PypiScanner(rule_path, file_rules_path="../../file_rules.yml", artifact_flag=False)
+    assert not os.path.exists(artifact_path)
+    assert compiled.save_rules_artifact()
+    loaded = PypiScanner(rule_path, file_rules_path="../../file_rules.yml")
+    assert loaded.load_rules_artifact()
+    assert loaded.rule_index.functions.keys() == compiled.rule_index.functions.keys()
+    assert loaded.rules_fingerprint == compiled.rules_fingerprint
+    assert loaded.scan_local_py_file("../../example/1000_execute.py")["issues"] == \
+        compiled.scan_local_py_file("../../example/1000_execute.py")["issues"]
+
+    # 其他用户可写的产物不被读取
+    os.chmod(artifact_path, 0o666)
+    assert not loaded.load_rules_artifact()
+    os.chmod(artifact_path, 0o644)
+    assert loaded.load_rules_artifact()
+
+    # 缓存版本变化后，从产物加载的规则集指纹随之变化，旧的缓存结果不会被使用
+    monkeypatch.setattr(prs_cache, "CACHE_VERSION", prs_cache.CACHE_VERSION + 1)
+    assert loaded.load_rules_artifact()
+    assert loaded.rules_fingerprint != compiled.rules_fingerprint
+
+    # 源规则变化后产物失效
+    with open(os.path.join(rule_path, "1000_execute.yml"), "a") as f:
+        f.write("\n# changed\n")
+    assert not loaded.load_rules_artifact()
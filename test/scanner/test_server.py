@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import PyRepoScanner.scanner.server as prs_server
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+
+FILES = ["../../example/1000_execute.py", "../../example/1001_execute_from_decoder.py",
+         "../../example/1002_execute_from_network.py", "../../example/os-system.py"]
+
+
+def _strip_time(results):
+    results.pop("total_time", None)
+    results.pop("tier_time", None)
+    return results
+
+
+def _run_server(jobs):
+    scanner = PypiScanner("../../rules")
+    # unix socket路径长度有限，使用较短的临时目录
+    socket_dir = tempfile.mkdtemp(prefix="prs")
+    server = prs_server.ScanServer(scanner=scanner, socket_path=os.path.join(socket_dir, "prs.sock"), jobs=jobs)
+    server.start()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return scanner, server, thread, socket_dir
+
+
+def _stop_server(server, thread, socket_dir):
+    server.shutdown()
+    thread.join()
+    shutil.rmtree(socket_dir)
+
+
+def test_scan_server():
+    scanner, server, thread, socket_dir = _run_server(jobs=1)
+    try:
+        assert prs_server.ping(server.socket_path)
+        for file_path in FILES:
+            response = prs_server.scan_local_file(server.socket_path, file_path)
+            assert response["status"] == "ok"
+            assert _strip_time(response["results"]) == _strip_time(scanner.scan_local_file(file_path))
+
+        with open(FILES[0], "rb") as f:
+            response = prs_server.scan_bytes(server.socket_path, f.read(), "setup.py")
+        assert response["status"] == "ok"
+        assert response["results"]["metrics"]["total"]["cnt"] > 0
+
+        response = prs_server.scan_local_file(server.socket_path, "not-exists.py")
+        assert response["status"] == "error"
+    finally:
+        _stop_server(server, thread, socket_dir)
+    assert not os.path.exists(server.socket_path)
+
+
+def test_scan_server_concurrent_requests():
+    scanner, server, thread, socket_dir = _run_server(jobs=2)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(executor.map(lambda path: prs_server.scan_local_file(server.socket_path, path), FILES * 4))
+        for file_path, response in zip(FILES * 4, responses):
+            assert response["status"] == "ok"
+            assert _strip_time(response["results"]) == _strip_time(scanner.scan_local_file(file_path))
+    finally:
+        _stop_server(server, thread, socket_dir)
+
+
+def test_execute_request_cwd():
+    scanner = PypiScanner("../../rules")
+    cwd = os.getcwd()
+    example_dir = os.path.abspath("../../example")
+    response = prs_server.execute_request(scanner, {"method": "scan_local_file", "path": "1000_execute.py",
+                                                    "cwd": example_dir})
+    # 路径按客户端的工作目录解析，服务进程的工作目录不变，结果中保留客户端传入的路径
+    assert os.getcwd() == cwd
+    assert response["status"] == "ok" and list(response["results"]["issues"]) == ["1000_execute.py"]
+
+    response = prs_server.execute_request(scanner, {"method": "scan_local_file", "path": "../example/",
+                                                    "cwd": os.path.abspath("..")})
+    direct = scanner.scan_local_dir("../../example/")
+    assert sorted(response["results"]["issues"]) == \
+        sorted(path.replace("../../example/", "../example/", 1) for path in direct["issues"])
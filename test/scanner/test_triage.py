@@ -0,0 +1,59 @@
+import json
+import PyRepoScanner.scanner.triage as prs_triage
+from PyRepoScanner.scanner.pypi.scanner import PypiScanner
+
+
+def test_extract_token_facts():
+    facts = prs_triage.extract_token_facts(
+        b"import os as o  # subprocess.call\n"
+        b"x = 'hello' \\\n    '\\x6fs'\n"
+        b"y = f'{o.path.join(x)}'\n"
+        b"__import__('req' 'uests').get(1)\n"
+        b"o.system (x)\n"
+    )
+    # 注释中的内容不作为标识符
+    assert "subprocess" not in facts.names and "call" not in facts.names
+    assert {"os", "o", "system", "get", "__import__"} <= facts.names
+    # 相邻字符串拼接，转义求值
+    assert {"helloos", "requests"} <= facts.strings
+    # f-string中的表达式
+    assert {"path", "join"} <= facts.names
+    assert "o.system" in facts.calls
+
+
+def test_token_triage():
+    triage = prs_triage.TokenTriage({"os.system", "requests.get", "exec"})
+    assert triage(b"d = {}\nd.get('requests')\n")[0] == prs_triage.VERDICT_DEEP
+    assert triage(b"d = {}\nd.get(1)  # requests\n") == (prs_triage.VERDICT_CLEAN, set())
+    assert triage(b"s = 'os.system'\nsystem = 1\n")[0] == prs_triage.VERDICT_DEEP
+    assert triage(b"print('os.system')\n")[0] == prs_triage.VERDICT_CLEAN
+    assert triage(b"from os import system as run\nrun('ls')\n") == (prs_triage.VERDICT_DEEP, {"os.system"})
+    assert triage(b"f = __import__('\\x6fs').system\n") == (prs_triage.VERDICT_DEEP, {"os.system"})
+
+
+def test_token_triage_decoder():
+    # 解码出的模块名不出现在字符串字面量中，出现解码调用时需要AST分析
+    triage = prs_triage.TokenTriage.from_rule_index(PypiScanner("../../rules").rule_index)
+    source = b"import base64\nname = base64.b64decode('b3M=').decode()\n__import__(name).system(input())\n"
+    verdict, hits = triage(source)
+    assert verdict == prs_triage.VERDICT_DEEP and "base64.b64decode" in hits and "os.system" not in hits
+    assert triage(b"d = {}\nprint(d.get(1).decode())\n") == (prs_triage.VERDICT_CLEAN, set())
+
+
+def test_scan_decoded_module_name(tmp_path):
+    path = tmp_path / "dynamic.py"
+    path.write_text("import base64\nname = base64.b64decode('b3M=').decode()\n__import__(name).system(input())\n")
+    results = PypiScanner("../../rules").scan_local_py_file(str(path))
+    assert results["metrics"]["total"]["triage_clean"] == 0
+    assert ("1000", 3) in {(issue["id"], issue["sink"]["lineno"]) for issue in results["issues"][str(path)]}
+
+
+def test_scan_with_triage(py_file_rules, example_project):
+    (example_project / "benign.py").write_text("import json\nconfig = json.loads('{}')\nprint(config.get('run'))\n")
+    tiered = PypiScanner("../../rules", file_rules_path=py_file_rules).scan_local_dir(str(example_project))
+    deep = PypiScanner("../../rules", file_rules_path=py_file_rules, triage_flag=False).scan_local_dir(str(example_project))
+    assert tiered["metrics"]["total"]["triage_clean"] > 0
+    assert deep["metrics"]["total"]["triage_clean"] == 0
+    assert tiered["metrics"]["total"]["deep"] + tiered["metrics"]["total"]["triage_clean"] \
+        == deep["metrics"]["total"]["deep"]
+    assert json.dumps(tiered["issues"]) == json.dumps(deep["issues"])
@@ -43,3 +43,24 @@ def test_SEVERITY():
     )
 
     print(i == j)
+
+
+def test_hashable_issue():
+    taint = prs_issue.Taint(id="0003", accordance="function", function="base64.b64decode", position="ret")
+    sink = prs_issue.Sink(id="0001", accordance="function", function="exec", position=0)
+    i = prs_issue.Issue(id="1001", name="exec", taint=taint, sink=sink)
+    j = prs_issue.Issue(id="1001", name="exec", taint=taint, sink=sink)
+
+    assert len({i, j}) == 1
+    assert i == j.dict()
+    assert i.dict()["taint"] == {
+        "id": "0003", "accordance": "function", "type": None, "function": "base64.b64decode",
+        "attribute": None, "position": "ret", "keyword": None,
+        "lineno": -1, "col_offset": -1, "end_lineno": -1, "end_col_offset": -1,
+    }
+
+
+def test_literal_taint_dict():
+    taint = prs_issue.Taint(id="0008", accordance="literal", type="suspicious-literal", literal="45.61.136.7")
+    assert taint.dict()["literal"] == "45.61.136.7"
+    assert "literal" not in prs_issue.Taint(id="0000", accordance="type", type="input").dict()